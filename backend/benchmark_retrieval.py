@@ -0,0 +1,325 @@
+"""
+Retrieval Benchmark for SurakshaSetu Legal RAG System
+Runs a labelled question set through retrieval only (no LLM calls) and reports
+recall@k, MRR, type precision, index build time, latency percentiles and peak memory.
+With --index-types it also sweeps the ANN index types (flat / HNSW / IVF-PQ) over
+their search parameters to chart recall vs latency vs index size.
+Results are saved as JSON so runs from different commits can be compared.
+
+Usage:
+    python benchmark_retrieval.py
+    python benchmark_retrieval.py --k 1 3 5 10 --repeat 20 --output results.json
+    python benchmark_retrieval.py --compare baseline.json
+    python benchmark_retrieval.py --index-types flat hnsw ivfpq --ef-search 16 64 256 --nprobe 1 4 16
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Dict, Any, List
+
+import numpy as np
+
+import faiss
+
+from combined_backend import Config, ImprovedGraphRAGSystem, compute_file_hash, create_embedder, dense_index_type
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(HERE, "RAG_SurakshaSetu_FULL.json")
+DEFAULT_QUERIES = os.path.join(HERE, "benchmark_queries.json")
+
+def git_commit() -> str:
+    """Short hash of the current commit, or 'unknown' outside a git checkout"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=HERE, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def chunk_law_number(chunk: Dict[str, Any]) -> str:
+    """Law identifier of a chunk (chunk_key is '<law_number>:<type>:<ordinal>')"""
+    return chunk['chunk_key'].split(':', 1)[0]
+
+def is_relevant(chunk: Dict[str, Any], item: Dict[str, Any]) -> bool:
+    expected_laws = {str(n) for n in item["expected_law_numbers"]}
+    if chunk_law_number(chunk) not in expected_laws:
+        return False
+    return not item["expected_types"] or chunk['type'] in item["expected_types"]
+
+def score_question(chunks: List[Dict[str, Any]], item: Dict[str, Any]) -> Dict[str, float]:
+    """recall (share of expected laws found), reciprocal rank and type precision"""
+    expected_laws = {str(n) for n in item["expected_law_numbers"]}
+    found_laws = {chunk_law_number(c) for c in chunks if is_relevant(c, item)}
+    
+    reciprocal_rank = 0.0
+    for rank, chunk in enumerate(chunks, start=1):
+        if is_relevant(chunk, item):
+            reciprocal_rank = 1.0 / rank
+            break
+    
+    if item["expected_types"]:
+        type_hits = sum(1 for c in chunks if c['type'] in item["expected_types"])
+        type_precision = type_hits / len(chunks) if chunks else 0.0
+    else:
+        type_precision = None
+    
+    return {
+        "recall": len(found_laws & expected_laws) / len(expected_laws),
+        "reciprocal_rank": reciprocal_rank,
+        "type_precision": type_precision
+    }
+
+def percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    values = np.array(samples_ms)
+    return {
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "p99": round(float(np.percentile(values, 99)), 3),
+        "mean": round(float(values.mean()), 3),
+        "samples": len(samples_ms)
+    }
+
+def time_queries(system, questions: List[Dict[str, Any]], k: int, repeat: int,
+                 search_params: Dict[str, int] = None) -> List[float]:
+    latencies_ms = []
+    for _ in range(repeat):
+        for item in questions:
+            start = time.perf_counter()
+            system._retrieve(item["question"], k, search_params)
+            latencies_ms.append((time.perf_counter() - start) * 1000)
+    return latencies_ms
+
+def run_index_sweep(args, embedder, questions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Build one index per --index-types entry and measure recall, MRR, overlap
+    with exact (flat) top-k and latency for each search-parameter setting.
+    """
+    k = max(args.k)
+    configured_type, cache_enabled = Config.INDEX_TYPE, Config.INDEX_CACHE_ENABLED
+    # Sweep builds must not overwrite the persisted artifact
+    Config.INDEX_CACHE_ENABLED = False
+    exact = None
+    sweep = {}
+    
+    try:
+        for index_type in args.index_types:
+            Config.INDEX_TYPE = index_type
+            print(f"🔧 Building {index_type} index...")
+            start = time.perf_counter()
+            system = ImprovedGraphRAGSystem(args.corpus, embedder, None)
+            build_s = time.perf_counter() - start
+            
+            if index_type == "hnsw":
+                settings = [{"ef_search": ef} for ef in args.ef_search]
+            elif index_type == "ivfpq":
+                settings = [{"nprobe": nprobe} for nprobe in args.nprobe]
+            else:
+                settings = [None]
+            
+            runs = []
+            for params in settings:
+                retrieved = [system._retrieve(item["question"], k, params)[0] for item in questions]
+                scores = [score_question(chunks, item) for chunks, item in zip(retrieved, questions)]
+                ids = [{c['id'] for c in chunks} for chunks in retrieved]
+                if exact is None and index_type == "flat":
+                    exact = ids
+                overlap = (
+                    round(float(np.mean([len(a & b) / len(b) if b else 1.0 for a, b in zip(ids, exact)])), 4)
+                    if exact is not None else None
+                )
+                runs.append({
+                    "search_params": params,
+                    f"recall@{k}": round(float(np.mean([s["recall"] for s in scores])), 4),
+                    "mrr": round(float(np.mean([s["reciprocal_rank"] for s in scores])), 4),
+                    "exact_overlap": overlap,
+                    "latency_ms": percentiles(time_queries(system, questions, k, args.repeat, params))
+                })
+            
+            sweep[index_type] = {
+                "built_type": dense_index_type(system.faiss_index),
+                "index_build_seconds": round(build_s, 3),
+                "index_bytes": int(faiss.serialize_index(system.faiss_index).nbytes),
+                "runs": runs
+            }
+    finally:
+        Config.INDEX_TYPE, Config.INDEX_CACHE_ENABLED = configured_type, cache_enabled
+    
+    return sweep
+
+def run_benchmark(args) -> Dict[str, Any]:
+    with open(args.queries, 'r', encoding='utf-8') as f:
+        questions = json.load(f)["questions"]
+    
+    Config.INDEX_CACHE_ENABLED = args.use_cache
+    tracemalloc.start()
+    
+    print(f"🔧 Loading embedding model {Config.EMBEDDING_MODEL} ({Config.EMBEDDING_BACKEND})...")
+    start = time.perf_counter()
+    embedder = create_embedder(Config.EMBEDDING_BACKEND)
+    model_load_s = time.perf_counter() - start
+    
+    print(f"🔧 Building index from {args.corpus}...")
+    start = time.perf_counter()
+    system = ImprovedGraphRAGSystem(args.corpus, embedder, None)
+    index_build_s = time.perf_counter() - start
+    
+    # Warm-up so the first timed query does not pay lazy initialisation
+    system._retrieve(questions[0]["question"], max(args.k))
+    
+    quality = {}
+    per_question = []
+    for k in args.k:
+        recalls, rrs, type_precisions = [], [], []
+        for item in questions:
+            chunks, _, _ = system._retrieve(item["question"], k)
+            scores = score_question(chunks, item)
+            recalls.append(scores["recall"])
+            rrs.append(scores["reciprocal_rank"])
+            if scores["type_precision"] is not None:
+                type_precisions.append(scores["type_precision"])
+            
+            if k == max(args.k):
+                per_question.append({
+                    "question": item["question"],
+                    "retrieved": [c['chunk_key'] for c in chunks],
+                    **scores
+                })
+        
+        quality[f"k={k}"] = {
+            "recall": round(float(np.mean(recalls)), 4),
+            "mrr": round(float(np.mean(rrs)), 4),
+            "type_precision": round(float(np.mean(type_precisions)), 4) if type_precisions else None
+        }
+    
+    k_latency = max(args.k)
+    latencies_ms = time_queries(system, questions, k_latency, args.repeat)
+    
+    # BM25 on its own, to keep the sparse side's cost visible
+    sparse_ms = []
+    if system.bm25 is not None:
+        for _ in range(args.repeat):
+            for item in questions:
+                start = time.perf_counter()
+                system.bm25.search(item["question"], k_latency * 2)
+                sparse_ms.append((time.perf_counter() - start) * 1000)
+    
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    index_sweep = run_index_sweep(args, embedder, questions) if args.index_types else None
+    
+    return {
+        "meta": {
+            "timestamp": time.time(),
+            "git_commit": git_commit(),
+            "corpus": os.path.abspath(args.corpus),
+            "corpus_hash": compute_file_hash(args.corpus),
+            "embedding_model": Config.EMBEDDING_MODEL,
+            "embedding_backend": Config.EMBEDDING_BACKEND,
+            "num_chunks": len(system.chunks_with_meta),
+            "num_questions": len(questions),
+            "index_type": dense_index_type(system.faiss_index),
+            "index_from_cache": system.loaded_from_cache
+        },
+        "build": {
+            "model_load_seconds": round(model_load_s, 3),
+            "index_build_seconds": round(index_build_s, 3)
+        },
+        "quality": quality,
+        "latency_ms": {f"k={k_latency}": percentiles(latencies_ms)},
+        "sparse_latency_ms": percentiles(sparse_ms) if sparse_ms else None,
+        "memory": {
+            # ru_maxrss is KiB on Linux, bytes on macOS
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 if sys.platform != "darwin" else 1024 * 1024), 1),
+            "python_heap_peak_mb": round(python_peak / (1024 * 1024), 1)
+        },
+        "index_sweep": index_sweep,
+        "per_question": per_question
+    }
+
+def print_report(results: Dict[str, Any]):
+    print("\n" + "=" * 80)
+    print("Retrieval Benchmark Results".center(80))
+    print("=" * 80)
+    meta = results["meta"]
+    print(f"Commit: {meta['git_commit']}   Chunks: {meta['num_chunks']}   Questions: {meta['num_questions']}")
+    print(f"Model load: {results['build']['model_load_seconds']}s   Index build: {results['build']['index_build_seconds']}s"
+          f"{' (from cache)' if meta['index_from_cache'] else ''}")
+    print(f"Peak RSS: {results['memory']['peak_rss_mb']} MB   Python heap peak: {results['memory']['python_heap_peak_mb']} MB")
+    print("\n" + "-" * 80)
+    for k, q in results["quality"].items():
+        print(f"{k:>6}  recall={q['recall']:.3f}  mrr={q['mrr']:.3f}  type_precision={q['type_precision']}")
+    for k, lat in results["latency_ms"].items():
+        print(f"\nLatency ({k}): p50={lat['p50']}ms  p95={lat['p95']}ms  p99={lat['p99']}ms  mean={lat['mean']}ms")
+    if results.get("sparse_latency_ms"):
+        lat = results["sparse_latency_ms"]
+        print(f"BM25 only: p50={lat['p50']}ms  p95={lat['p95']}ms  p99={lat['p99']}ms")
+    if results.get("index_sweep"):
+        print("\n" + "-" * 80)
+        print("Index sweep (recall vs latency vs size)")
+        for index_type, entry in results["index_sweep"].items():
+            print(f"\n{index_type} (built as {entry['built_type']}): build={entry['index_build_seconds']}s  "
+                  f"size={entry['index_bytes'] / (1024 * 1024):.2f} MB")
+            for run in entry["runs"]:
+                recall_key = next(key for key in run if key.startswith("recall@"))
+                lat = run["latency_ms"]
+                print(f"   {str(run['search_params'] or 'default'):<20} {recall_key}={run[recall_key]:.3f}  "
+                      f"mrr={run['mrr']:.3f}  exact_overlap={run['exact_overlap']}  "
+                      f"p50={lat['p50']}ms  p95={lat['p95']}ms")
+    print("=" * 80)
+
+def compare(results: Dict[str, Any], baseline_path: str):
+    """Print metric deltas against an earlier results file"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    
+    print(f"\n📊 Compared with {baseline['meta']['git_commit']} ({baseline_path}):")
+    for k, q in results["quality"].items():
+        old = baseline["quality"].get(k)
+        if old is None:
+            continue
+        for metric in ("recall", "mrr"):
+            print(f"   {k} {metric}: {old[metric]:.3f} → {q[metric]:.3f} ({q[metric] - old[metric]:+.3f})")
+    for k, lat in results["latency_ms"].items():
+        old = baseline["latency_ms"].get(k)
+        if old is None:
+            continue
+        for p in ("p50", "p95", "p99"):
+            print(f"   latency {k} {p}: {old[p]}ms → {lat[p]}ms ({lat[p] - old[p]:+.3f}ms)")
+    old_build = baseline["build"]["index_build_seconds"]
+    new_build = results["build"]["index_build_seconds"]
+    print(f"   index build: {old_build}s → {new_build}s ({new_build - old_build:+.3f}s)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval quality and latency")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="Corpus JSON file")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES, help="Labelled question set")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10], help="k values for recall@k / MRR")
+    parser.add_argument("--repeat", type=int, default=10, help="Passes over the question set for latency")
+    parser.add_argument("--use-cache", action="store_true", help="Load the persisted index instead of rebuilding")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to save results JSON")
+    parser.add_argument("--compare", help="Earlier results JSON to diff against")
+    parser.add_argument("--index-types", nargs="+", choices=["flat", "hnsw", "ivfpq"],
+                        help="Also sweep these dense index types (put flat first to get exact_overlap)")
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128, 256], help="HNSW efSearch values to sweep")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32], help="IVF nprobe values to sweep")
+    args = parser.parse_args()
+    
+    results = run_benchmark(args)
+    print_report(results)
+    
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"💾 Results saved to {args.output}")
+    
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
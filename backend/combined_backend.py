@@ -1,31 +1,99 @@
 """
 Combined FastAPI Backend for SurakshaSetu - Legal RAG System
 Runs on port 3000 and includes testing functionality
-Preserves all original RAG + LangGraph code without modifications
+Hybrid FAISS + BM25 retrieval over a registry of legal corpora, with
+pluggable embedding and LLM backends, streamed answers, answer caching,
+persisted index artifacts, metrics and request tracing
 """
 
-from fastapi import FastAPI, HTTPException, UploadFile, File
+# Measured first so /info can report how long importing this module took
+import time
+MODULE_IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, UploadFile, File, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
-from contextlib import asynccontextmanager
+from contextlib import aclosing, asynccontextmanager, contextmanager
 import os
 import json
-import time
+import asyncio
 import re
-import numpy as np
-from sentence_transformers import SentenceTransformer
-import faiss
+import hashlib
+import shutil
+import tempfile
+import threading
+import random
+import heapq
+import mmap
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.managers import BaseManager
+import importlib
+import math
+import contextvars
+import uuid
 
-# Updated import - use google.genai instead of deprecated google.generativeai
 try:
-    import google.genai as genai
-    from google.genai import types
-    USING_NEW_SDK = True
+    import fcntl  # cross-process file locks (POSIX only)
 except ImportError:
-    import google.generativeai as genai
-    USING_NEW_SDK = False
-    print("⚠️ Using deprecated google.generativeai. Please upgrade to google-genai package")
+    fcntl = None
+
+# Seconds spent importing each deferred heavy dependency, reported in /info
+IMPORT_TIMES = {}
+
+class LazyModule:
+    """
+    Stand-in for a heavy module that is imported on first attribute access,
+    so the process can answer /health before numpy/faiss are loaded.
+    """
+    
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+    
+    def load_module(self):
+        if self._module is None:
+            start = time.perf_counter()
+            self._module = importlib.import_module(self._name)
+            IMPORT_TIMES[self._name] = round(time.perf_counter() - start, 3)
+        return self._module
+    
+    def __getattr__(self, attr: str):
+        return getattr(self.load_module(), attr)
+
+np = LazyModule("numpy")
+faiss = LazyModule("faiss")
+
+# Gemini SDK: imported by load_gemini_sdk() when the gemini backend is created
+genai = None
+types = None
+USING_NEW_SDK = None  # None until load_gemini_sdk() has run
+
+def load_gemini_sdk():
+    """Import the Gemini SDK once; returns the module, or None if none is installed"""
+    global genai, types, USING_NEW_SDK
+    if USING_NEW_SDK is not None:
+        return genai
+    
+    start = time.perf_counter()
+    # Updated import - use google.genai instead of deprecated google.generativeai
+    try:
+        import google.genai as sdk
+        from google.genai import types as sdk_types
+        genai, types, USING_NEW_SDK = sdk, sdk_types, True
+    except ImportError:
+        try:
+            import google.generativeai as sdk
+            genai, USING_NEW_SDK = sdk, False
+            print("⚠️ Using deprecated google.generativeai. Please upgrade to google-genai package")
+        except ImportError:
+            # Only the stub LLM backend is usable without a Gemini SDK
+            USING_NEW_SDK = False
+    IMPORT_TIMES["gemini_sdk"] = round(time.perf_counter() - start, 3)
+    return genai
 
 # Configuration
 class Config:
@@ -33,40 +101,175 @@ class Config:
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "INSERT API KEY HERE")
     GEMINI_MODEL = "gemini-2.0-flash-lite"  # Updated model name
     EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+    # "torch" (sentence-transformers), "onnx" or "onnx-int8" (exported by export_onnx_embedder.py)
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+    ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR")  # None = backend/onnx/<EMBEDDING_MODEL>/
+    ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))  # 0 = onnxruntime default
+    # EMBEDDING_BACKEND=remote: embed through a shared embedding server (see serve_workers.py)
+    EMBED_SERVER_ADDRESS = os.getenv("EMBED_SERVER_ADDRESS", "127.0.0.1:3100")
+    EMBED_SERVER_AUTHKEY = os.getenv("EMBED_SERVER_AUTHKEY", "")
+    EMBED_SERVER_BACKEND = os.getenv("EMBED_SERVER_BACKEND", "torch")  # backend the server runs
+    EMBED_SERVER_THREADS = int(os.getenv("EMBED_SERVER_THREADS", "4"))  # concurrent encodes on the server
     MAX_RETRIES = 10
     RETRY_DELAY = 2
-    JSON_DATA_PATH = None
+    RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "30"))  # cap on one (jittered) backoff
+    # LLM rate governor: provider quotas (0 = unlimited) and adaptive concurrency bounds
+    LLM_RPM = float(os.getenv("LLM_RPM", "0"))
+    LLM_TPM = float(os.getenv("LLM_TPM", "0"))
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+    LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+    LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "512"))  # for the tokens/min estimate
+    LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")  # "gemini" or "stub"
+    # Stub backend knobs (load testing without an API key)
+    LLM_STUB_LATENCY_MS = float(os.getenv("LLM_STUB_LATENCY_MS", "300"))
+    LLM_STUB_ERROR_RATE = float(os.getenv("LLM_STUB_ERROR_RATE", "0"))
+    LLM_STUB_RATE_LIMIT_RATE = float(os.getenv("LLM_STUB_RATE_LIMIT_RATE", "0"))
+    LLM_STUB_SEED = int(os.getenv("LLM_STUB_SEED", "0"))
+    JSON_DATA_PATH = os.getenv("JSON_DATA_PATH")  # loaded as the "default" corpus at startup when set
+    BUILD_WORKERS = int(os.getenv("BUILD_WORKERS", "1"))  # concurrent background corpus builds
+    EMBED_PROGRESS_BATCH = int(os.getenv("EMBED_PROGRESS_BATCH", "512"))  # texts per progress update
+    # Multi-worker mode: corpus versions published here are loaded by every worker
+    SHARED_STATE_DIR = os.getenv("SHARED_STATE_DIR")
+    RELOAD_POLL_SECONDS = float(os.getenv("RELOAD_POLL_SECONDS", "2"))
+    # Persisted FAISS index + chunk store, written next to the corpus JSON
+    INDEX_CACHE_ENABLED = os.getenv("INDEX_CACHE_ENABLED", "1") != "0"
+    INDEX_CACHE_DIR = os.getenv("INDEX_CACHE_DIR")  # None = "<json_path>.index/"
+    INDEX_MMAP = os.getenv("INDEX_MMAP", "1") != "0"
+    NORMALIZE_TEXT = os.getenv("NORMALIZE_TEXT", "1") != "0"  # clean PDF artefacts before chunking
+    # Hybrid retrieval: BM25 fused with dense results by reciprocal rank
+    HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "1") != "0"
+    RRF_K = int(os.getenv("RRF_K", "60"))
+    BM25_K1 = float(os.getenv("BM25_K1", "1.5"))
+    BM25_B = float(os.getenv("BM25_B", "0.75"))
+    # Dense index type: "flat" (exact), "hnsw" or "ivfpq" (approximate, for large corpora)
+    INDEX_TYPE = os.getenv("INDEX_TYPE", "flat")
+    HNSW_M = int(os.getenv("HNSW_M", "32"))
+    HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+    HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))  # default, overridable per request
+    IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))  # 0 = 4 * sqrt(num_chunks)
+    IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))  # default, overridable per request
+    PQ_M = int(os.getenv("PQ_M", "16"))  # sub-quantizers; must divide the embedding dimension
+    PQ_NBITS = int(os.getenv("PQ_NBITS", "8"))
+    # Async query pipeline
+    QUERY_WORKERS = int(os.getenv("QUERY_WORKERS", "4"))  # threads for embedding + FAISS search
+    QUERY_TIMEOUT = float(os.getenv("QUERY_TIMEOUT", "60"))  # seconds per /query request
+    QUERY_BATCHING = os.getenv("QUERY_BATCHING", "1") != "0"
+    QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", "5"))
+    QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", "32"))
+    # Semantic answer cache in front of the LLM call
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") != "0"
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1024"))
+    ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))  # seconds
+    ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))  # cosine floor
+    # Request tracing: finished traces are appended here as JSONL (unset = not exported)
+    TRACE_FILE = os.getenv("TRACE_FILE")
+    TRACE_FILE_MAX_MB = float(os.getenv("TRACE_FILE_MAX_MB", "100"))  # rotated to <TRACE_FILE>.1 past this
 
 # Global instances
 app_state = {
     "embedder": None,
-    "gemini_client": None,
-    "graphrag_system": None
+    "llm_backend": None,
+    "corpora": None,  # CorpusRegistry of named ImprovedGraphRAGSystems
+    "query_executor": None,
+    "answer_cache": None,
+    "trace_exporter": None,
+    "llm_governor": None,  # process-wide LLMRateGovernor
+    "loader": None,  # background task that makes the server ready
+    "reload_watcher": None,  # follows corpus reloads from other workers (SHARED_STATE_DIR)
+    "startup": {
+        "state": "starting",  # starting → loading models → loading corpus → ready | failed
+        "error": None,
+        "module_import_seconds": None,
+        "time_to_live_seconds": None,
+        "time_to_ready_seconds": None
+    }
 }
 
+async def load_models():
+    """
+    Readiness: load the embedder and LLM backend (and the JSON_DATA_PATH
+    corpus, if set) off the event loop while /health already answers.
+    """
+    startup = app_state["startup"]
+    try:
+        startup["state"] = "loading models"
+        print(f"🔧 Loading embedding model ({Config.EMBEDDING_BACKEND})...")
+        embedder = await run_in_threadpool(create_embedder, Config.EMBEDDING_BACKEND)
+        # First encode pays one-off initialisation; keep it off the first query
+        await run_in_threadpool(embedder.encode, ["warm-up"])
+        await run_in_threadpool(np.load_module)
+        await run_in_threadpool(faiss.load_module)
+        app_state["embedder"] = embedder
+        print("✅ Embedding model loaded!")
+        
+        print(f"🔧 Setting up LLM backend ({Config.LLM_BACKEND})...")
+        app_state["llm_backend"] = await run_in_threadpool(create_llm_backend, Config.LLM_BACKEND)
+        print(f"LLM backend configured: {app_state['llm_backend'].name}")
+        
+        registry = app_state["corpora"]
+        startup["state"] = "loading corpus"
+        # Corpora other workers already serve come first: their artifacts are on disk
+        synced = registry.sync_from_shared(app_state["embedder"], app_state["llm_backend"])
+        await asyncio.gather(*synced, return_exceptions=True)
+        if Config.JSON_DATA_PATH and registry.get(DEFAULT_CORPUS) is None and not registry.is_building(DEFAULT_CORPUS):
+            await registry.start_build(
+                DEFAULT_CORPUS, Config.JSON_DATA_PATH, app_state["embedder"], app_state["llm_backend"]
+            )
+        if registry.shared_state is not None:
+            app_state["reload_watcher"] = asyncio.create_task(watch_shared_corpora())
+        
+        startup["state"] = "ready"
+        startup["time_to_ready_seconds"] = round(time.perf_counter() - MODULE_IMPORT_STARTED, 3)
+        print(f"✅ Server ready in {startup['time_to_ready_seconds']}s")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        import traceback
+        print(f"❌ Startup failed:\n{traceback.format_exc()}")
+        startup.update(state="failed", error=str(e))
+
 # Lifespan context manager
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager for startup and shutdown"""
-    # Startup
+    # Startup: only cheap setup here so the process is live immediately;
+    # models and the index load in the background (see /ready)
     print("🚀 Starting Combined FastAPI server on port 3000...")
-    print("🔧 Loading embedding model...")
-    app_state["embedder"] = SentenceTransformer(Config.EMBEDDING_MODEL)
-    print("✅ Embedding model loaded!")
-    
-    print("🔧 Setting up Gemini API...")
-    if USING_NEW_SDK:
-        app_state["gemini_client"] = genai.Client(api_key=Config.GEMINI_API_KEY)
-    else:
-        genai.configure(api_key=Config.GEMINI_API_KEY)
-        app_state["gemini_client"] = genai.GenerativeModel(Config.GEMINI_MODEL)
-    print("Gemini API configured!")
-    print("Server ready on http://localhost:3000")
+    app_state["query_executor"] = ThreadPoolExecutor(
+        max_workers=Config.QUERY_WORKERS,
+        thread_name_prefix="rag-query"
+    )
+    app_state["corpora"] = CorpusRegistry(
+        ThreadPoolExecutor(max_workers=Config.BUILD_WORKERS, thread_name_prefix="corpus-build"),
+        shared_state=SharedCorpusState(Config.SHARED_STATE_DIR) if Config.SHARED_STATE_DIR else None
+    )
+    if Config.ANSWER_CACHE_ENABLED:
+        app_state["answer_cache"] = SemanticAnswerCache(
+            max_entries=Config.ANSWER_CACHE_MAX_ENTRIES,
+            ttl=Config.ANSWER_CACHE_TTL,
+            similarity=Config.ANSWER_CACHE_SIMILARITY
+        )
+    app_state["llm_governor"] = LLMRateGovernor(
+        rpm=Config.LLM_RPM,
+        tpm=Config.LLM_TPM,
+        max_concurrency=Config.LLM_MAX_CONCURRENCY,
+        min_concurrency=Config.LLM_MIN_CONCURRENCY
+    )
+    if Config.TRACE_FILE:
+        app_state["trace_exporter"] = TraceExporter(Config.TRACE_FILE, int(Config.TRACE_FILE_MAX_MB * 1024 * 1024))
+    app_state["loader"] = asyncio.create_task(load_models())
+    app_state["startup"]["time_to_live_seconds"] = round(time.perf_counter() - MODULE_IMPORT_STARTED, 3)
+    print("Server live on http://localhost:3000 (models loading in the background, see /ready)")
     
     yield
     
     # Shutdown
     print("🛑 Shutting down server...")
+    app_state["loader"].cancel()
+    if app_state["reload_watcher"] is not None:
+        app_state["reload_watcher"].cancel()
+    app_state["query_executor"].shutdown(wait=False, cancel_futures=True)
+    app_state["corpora"].executor.shutdown(wait=False, cancel_futures=True)
 
 # Initialize FastAPI app with lifespan
 app = FastAPI(
@@ -85,11 +288,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def count_requests(request: Request, call_next):
+    """Count requests per route template (not raw path, to keep label cardinality bounded)"""
+    try:
+        response = await call_next(request)
+    except Exception:
+        status = 500
+        raise
+    else:
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUESTS.inc(
+            path=route.path if route is not None else "unmatched",
+            method=request.method,
+            status=status
+        )
+
 # Request/Response Models
 class QueryRequest(BaseModel):
     """Request model for querying the RAG system"""
     question: str
-    k: int = 5
+    k: int = Field(5, ge=1, le=50)  # chunks to retrieve; out of range is a 422, not a crash
+    corpus: str = "default"  # registry name, e.g. "central_acts" or "state_rules"
+    nprobe: Optional[int] = None  # IVF lists probed (ivfpq index)
+    ef_search: Optional[int] = None  # HNSW candidate list size (hnsw index)
+    debug: bool = False  # return per-stage timings, chunk ids/scores and prompt tokens
 
 class QueryResponse(BaseModel):
     """Response model for query results"""
@@ -97,178 +323,2162 @@ class QueryResponse(BaseModel):
     sources: Optional[List[str]] = None
     query_type: Optional[str] = None
     chunks_retrieved: Optional[int] = None
+    trace_id: Optional[str] = None
+    debug: Optional[Dict[str, Any]] = None  # only when the request set debug
 
 class ConfigRequest(BaseModel):
     """Request model for setting JSON path"""
     json_path: str
+    corpus: str = "default"
+    wait: bool = True  # False = return immediately and build in the background
+
+class StatusResponse(BaseModel):
+    """Response model for system status"""
+    status: str
+    message: str
+    json_loaded: bool
+    model_loaded: bool
+
+# ============================================================================
+# METRICS (Prometheus text exposition at /metrics)
+# ============================================================================
+
+# Upper bounds (seconds) shared by all latency histograms: sub-ms searches up to slow LLM calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def format_labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+def format_metric_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class CounterMetric:
+    """Monotonic counter, optionally split by labels"""
+    
+    kind = "counter"
+    
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+    
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        if not values and not self.labels:
+            values[()] = 0.0
+        return [(self.name, self.labels, key, value) for key, value in sorted(values.items())]
+
+class HistogramMetric:
+    """Cumulative-bucket latency histogram, optionally split by labels"""
+    
+    kind = "histogram"
+    
+    def __init__(self, name: str, help_text: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._series = {}  # label values -> [bucket counts..., sum]
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-1] += value
+    
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+    
+    def samples(self):
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        rows = []
+        for key, values in sorted(series.items()):
+            for bound, count in zip(self.buckets, values):
+                rows.append((f"{self.name}_bucket", self.labels + ("le",), key + (format_metric_value(bound),), count))
+            rows.append((f"{self.name}_sum", self.labels, key, values[-1]))
+            rows.append((f"{self.name}_count", self.labels, key, values[len(self.buckets) - 1]))
+        return rows
+
+class GaugeMetric:
+    """Gauge read at scrape time from `collect()` -> {label values: value}"""
+    
+    kind = "gauge"
+    
+    def __init__(self, name: str, help_text: str, collect, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.collect = collect
+    
+    def samples(self):
+        return [(self.name, self.labels, key, value) for key, value in sorted(self.collect().items())]
+
+class MetricsRegistry:
+    """All metrics of this process, rendered in Prometheus text format"""
+    
+    def __init__(self):
+        self._metrics = []
+    
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+    
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample_name, label_names, label_values, value in metric.samples():
+                lines.append(f"{sample_name}{format_labels(label_names, label_values)} {format_metric_value(value)}")
+        return "\n".join(lines) + "\n"
+
+def corpus_gauge(field: str):
+    """Collector for one per-corpus gauge over the registry status"""
+    def collect():
+        registry = app_state["corpora"]
+        if registry is None:
+            return {}
+        return {(status["name"],): status[field] for status in registry.all_status()}
+    return collect
+
+def governor_gauge(field: str):
+    """Collector for one LLM rate governor stat"""
+    def collect():
+        governor = app_state["llm_governor"]
+        return {(): governor.stats()[field]} if governor is not None else {}
+    return collect
+
+def index_vectors():
+    registry = app_state["corpora"]
+    if registry is None:
+        return {}
+    vectors = {}
+    for name in registry.names():
+        system = registry.get(name)
+        if system is not None:
+            vectors[(name,)] = system.faiss_index.ntotal
+    return vectors
+
+METRICS = MetricsRegistry()
+HTTP_REQUESTS = METRICS.register(CounterMetric(
+    "rag_http_requests_total", "HTTP requests by route and status code", ("path", "method", "status")
+))
+QUERY_ERRORS = METRICS.register(CounterMetric(
+    "rag_query_errors_total", "Failed queries by kind (rate_limit, llm_error, retrieval_error, timeout, shed)", ("kind",)
+))
+# Embedding and search run once per micro-batch, so those stages are observed per batch
+STAGE_SECONDS = METRICS.register(HistogramMetric(
+    "rag_stage_seconds", "Latency of each query stage (analysis, embedding, search, prompt_build, llm)", ("stage",)
+))
+LLM_RETRIES = METRICS.register(CounterMetric(
+    "rag_llm_retries_total", "LLM calls retried after a rate limit"
+))
+LLM_BACKOFF_SECONDS = METRICS.register(CounterMetric(
+    "rag_llm_backoff_seconds_total", "Seconds spent waiting between LLM retries"
+))
+METRICS.register(GaugeMetric(
+    "rag_index_chunks", "Chunks in the serving version of each corpus", corpus_gauge("num_chunks"), ("corpus",)
+))
+METRICS.register(GaugeMetric(
+    "rag_index_vectors", "Vectors in the dense index of each corpus", index_vectors, ("corpus",)
+))
+METRICS.register(GaugeMetric(
+    "rag_llm_concurrency_limit", "Current adaptive limit on concurrent LLM calls", governor_gauge("concurrency_limit")
+))
+METRICS.register(GaugeMetric(
+    "rag_llm_in_flight", "LLM calls in progress", governor_gauge("in_flight")
+))
+METRICS.register(GaugeMetric(
+    "rag_llm_queue_depth", "Requests waiting for the LLM rate governor", governor_gauge("waiting")
+))
+METRICS.register(GaugeMetric(
+    "rag_corpus_version", "Serving version of each corpus (increments on every swap)", corpus_gauge("version"), ("corpus",)
+))
+
+# ============================================================================
+# TRACING (per-request spans, JSONL export)
+# ============================================================================
+
+# Trace of the request being served and its innermost open span. Copied into
+# tasks the request creates; worker threads (run_in_executor) don't see them.
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    """One timed step of a request, e.g. retrieval or a single LLM attempt"""
+    
+    def __init__(self, trace, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = dict(attributes)
+        self.start = time.perf_counter()
+        self.duration = None
+        self.error = None
+    
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ms": round((self.start - self.trace.start) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "error": self.error,
+            "attributes": self.attributes
+        }
+
+class Trace:
+    """
+    All spans of one request. The trace id goes back to the client
+    (X-Trace-Id) so a slow answer can be found in the trace file. `verbose`
+    traces also record details that cost extra work, like the prompt's
+    token count.
+    """
+    
+    def __init__(self, name: str, verbose: bool = False, trace_id: Optional[str] = None, **attributes):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.name = name
+        self.verbose = verbose
+        self.attributes = dict(attributes)
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.status = None
+        self.spans = []
+    
+    def find(self, name: str) -> Optional[Span]:
+        return next((span for span in self.spans if span.name == name), None)
+    
+    def stage_timings(self) -> Dict[str, float]:
+        """Milliseconds per top-level span, plus the total so far"""
+        timings = {}
+        for span in self.spans:
+            if span.parent_id is None and span.duration is not None:
+                timings[span.name] = round(timings.get(span.name, 0.0) + span.duration * 1000, 3)
+        timings["total"] = round((time.perf_counter() - self.start) * 1000, 3)
+        return timings
+    
+    def debug_summary(self) -> Dict[str, Any]:
+        """The `debug` block of a QueryResponse"""
+        retrieval = self.find("retrieval")
+        assembly = self.find("context_assembly")
+        return {
+            "trace_id": self.trace_id,
+            "cached": self.attributes.get("cached", False),
+            "timings_ms": self.stage_timings(),
+            "chunks": retrieval.attributes.get("chunks", []) if retrieval is not None else [],
+            "prompt_tokens": assembly.attributes.get("prompt_tokens") if assembly is not None else None,
+            "llm_attempts": sum(1 for span in self.spans if span.name == "llm_attempt")
+        }
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "status": self.status,
+            "attributes": self.attributes,
+            "spans": [span.to_dict() for span in self.spans]
+        }
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+@contextmanager
+def trace_span(name: str, **attributes):
+    """Record a span in the current request's trace; yields None outside a traced request"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get()
+    span = Span(trace, name, parent.span_id if parent is not None else None, attributes)
+    trace.spans.append(span)
+    _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span.duration = time.perf_counter() - span.start
+        # Restore rather than reset(token): async generators may close in another context
+        _current_span.set(parent)
+
+class TraceExporter:
+    """Appends finished traces to a JSONL file, rotating it to `<path>.1` past max_bytes"""
+    
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+    
+    def export(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            try:
+                if os.path.getsize(self.path) > self.max_bytes:
+                    os.replace(self.path, f"{self.path}.1")
+            except OSError:
+                pass
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+def start_trace(name: str, verbose: bool = False, trace_id: Optional[str] = None, **attributes) -> Trace:
+    """Begin a trace for the current request (context); pair with finish_trace"""
+    trace = Trace(name, verbose=verbose or app_state["trace_exporter"] is not None, trace_id=trace_id, **attributes)
+    _current_trace.set(trace)
+    _current_span.set(None)
+    return trace
+
+def finish_trace(trace: Trace, status: str):
+    """Close the trace and hand it to the exporter off the event loop"""
+    trace.duration = time.perf_counter() - trace.start
+    trace.status = status
+    exporter = app_state["trace_exporter"]
+    if exporter is not None:
+        asyncio.get_running_loop().run_in_executor(None, exporter.export, trace.to_dict())
+
+# ============================================================================
+# EMBEDDING BACKENDS
+# ============================================================================
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")  # local runtimes; "remote" uses the embedding server
+ONNX_FILE = "model.onnx"
+ONNX_INT8_FILE = "model_int8.onnx"
+ONNX_META_FILE = "embedder.json"
+
+def onnx_model_dir() -> str:
+    """Where export_onnx_embedder.py writes (and the onnx backends read) the model"""
+    if Config.ONNX_MODEL_DIR:
+        return Config.ONNX_MODEL_DIR
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "onnx", Config.EMBEDDING_MODEL)
+
+class OnnxEmbedder:
+    """
+    The sentence-transformers model exported to ONNX (optionally int8
+    dynamic-quantized) and run with onnxruntime on CPU. Tokenization, mean
+    pooling and L2 normalization match the PyTorch model; encode() and
+    .tokenizer mirror SentenceTransformer so either can be the embedder.
+    """
+    
+    def __init__(self, model_dir: str, quantized: bool = False, threads: int = 0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        
+        model_path = os.path.join(model_dir, ONNX_INT8_FILE if quantized else ONNX_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"No exported embedding model at {model_path}; run `python export_onnx_embedder.py export` first"
+            )
+        with open(os.path.join(model_dir, ONNX_META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get("model") != Config.EMBEDDING_MODEL:
+            raise ValueError(f"{model_dir} holds {meta.get('model')}, not {Config.EMBEDDING_MODEL}")
+        
+        self.max_seq_length = meta["max_seq_length"]
+        self.dimension = meta["dimension"]
+        self.normalize = meta.get("normalize", True)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+    
+    def encode(self, texts, batch_size: int = 32, show_progress_bar: bool = False, **kwargs):
+        """Embed a string or list of strings; returns float32 (n, dim) (or (dim,) for a string)"""
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+        
+        parts = []
+        for start in range(0, len(texts), batch_size):
+            encoded = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            feeds = {name: encoded[name].astype('int64') for name in self.input_names}
+            token_embeddings = self.session.run(None, feeds)[0]
+            
+            # Mean pooling over real (non-padding) tokens, as in the PyTorch model
+            mask = encoded["attention_mask"][..., None].astype('float32')
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if self.normalize:
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            parts.append(pooled.astype('float32'))
+        
+        embeddings = np.vstack(parts) if parts else np.zeros((0, self.dimension), dtype='float32')
+        return embeddings[0] if single else embeddings
+    
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+class EmbeddingService:
+    """
+    Server side of the shared embedding process: one model instance serving
+    every worker, with at most `threads` encodes running at once.
+    """
+    
+    def __init__(self, backend: str, threads: int):
+        self.backend = backend
+        self.embedder = create_embedder(backend)
+        self._slots = threading.BoundedSemaphore(threads)
+    
+    def encode(self, texts: List[str]):
+        with self._slots:
+            return np.asarray(self.embedder.encode(texts, show_progress_bar=False), dtype='float32')
+    
+    def token_ids(self, text: str, add_special_tokens: bool = True) -> List[int]:
+        return self.embedder.tokenizer.encode(text, add_special_tokens=add_special_tokens)
+    
+    def info(self) -> Dict[str, Any]:
+        return {"model": Config.EMBEDDING_MODEL, "backend": self.backend}
+
+class EmbeddingManager(BaseManager):
+    pass
+
+def parse_address(address: str):
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+def run_embedding_server(address: str, authkey: bytes, backend: str, threads: int):
+    """Load the model once and serve encode() to all workers until killed"""
+    service = EmbeddingService(backend, threads)
+    EmbeddingManager.register("embedder", callable=lambda: service)
+    server = EmbeddingManager(address=parse_address(address), authkey=authkey).get_server()
+    print(f"✅ Embedding server ({backend}, {threads} threads) listening on {address}")
+    server.serve_forever()
+
+class RemoteTokenizer:
+    """Tokenizer facade for RemoteEmbedder (token counting during chunking)"""
+    
+    def __init__(self, service):
+        self._service = service
+    
+    def encode(self, text: str, add_special_tokens: bool = True) -> List[int]:
+        return self._service.token_ids(text, add_special_tokens)
+
+class RemoteEmbedder:
+    """
+    Client of the shared embedding server: encode() calls go over a local
+    socket, so worker processes never load the model themselves. Manager
+    proxies keep one connection per thread, so query threads don't serialize.
+    """
+    
+    def __init__(self, address: str, authkey: bytes):
+        EmbeddingManager.register("embedder")
+        self._manager = EmbeddingManager(address=parse_address(address), authkey=authkey)
+        self._manager.connect()
+        self._service = self._manager.embedder()
+        self.tokenizer = RemoteTokenizer(self._service)
+        info = self._service.info()
+        if info["model"] != Config.EMBEDDING_MODEL or info["backend"] != Config.EMBED_SERVER_BACKEND:
+            raise ValueError(f"Embedding server runs {info}, expected {Config.EMBEDDING_MODEL} ({Config.EMBED_SERVER_BACKEND})")
+    
+    def encode(self, texts, show_progress_bar: bool = False, **kwargs):
+        single = isinstance(texts, str)
+        embeddings = self._service.encode([texts] if single else list(texts))
+        return embeddings[0] if single else embeddings
+
+def create_embedder(name: str):
+    """Instantiate the embedding backend selected by Config.EMBEDDING_BACKEND"""
+    if name == "remote":
+        return RemoteEmbedder(Config.EMBED_SERVER_ADDRESS, Config.EMBED_SERVER_AUTHKEY.encode())
+    if name == "torch":
+        # Imported here so the onnx backends never load PyTorch
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(Config.EMBEDDING_MODEL)
+    if name in ("onnx", "onnx-int8"):
+        return OnnxEmbedder(onnx_model_dir(), quantized=name == "onnx-int8", threads=Config.ONNX_THREADS)
+    raise ValueError(f"Unknown embedding backend: {name!r} (expected one of {', '.join(EMBEDDING_BACKENDS)} or remote)")
+
+def embedding_model_id() -> str:
+    """Model + runtime recorded in index manifests; int8 vectors differ slightly, so they never mix"""
+    backend = Config.EMBED_SERVER_BACKEND if Config.EMBEDDING_BACKEND == "remote" else Config.EMBEDDING_BACKEND
+    if backend == "torch":
+        return Config.EMBEDDING_MODEL
+    return f"{Config.EMBEDDING_MODEL}@{backend}"
+
+# ============================================================================
+# LLM BACKENDS
+# ============================================================================
+
+class LLMBackend:
+    """
+    Interface for text generation. Implementations raise on failure; rate
+    limits must surface as exceptions whose message contains "429" or
+    "RESOURCE_EXHAUSTED" so the retry helpers can back off.
+    """
+    name = "base"
+    
+    def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+    
+    def stream_generate(self, prompt: str):
+        """Yield text fragments as they are produced"""
+        yield self.generate(prompt)
+    
+    async def generate_async(self, prompt: str) -> str:
+        return await asyncio.to_thread(self.generate, prompt)
+    
+    async def stream_generate_async(self, prompt: str):
+        yield await self.generate_async(prompt)
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini via google-genai (or the legacy google-generativeai SDK)"""
+    name = "gemini"
+    
+    def __init__(self, api_key: str, model: str):
+        if load_gemini_sdk() is None:
+            raise RuntimeError("No Gemini SDK installed. Install google-genai or use LLM_BACKEND=stub")
+        self.model = model
+        if USING_NEW_SDK:
+            self.client = genai.Client(api_key=api_key)
+        else:
+            genai.configure(api_key=api_key)
+            self.client = genai.GenerativeModel(model)
+    
+    def generate(self, prompt: str) -> str:
+        if USING_NEW_SDK:
+            response = self.client.models.generate_content(model=self.model, contents=prompt)
+        else:
+            response = self.client.generate_content(prompt)
+        return response.text.strip()
+    
+    def stream_generate(self, prompt: str):
+        if USING_NEW_SDK:
+            stream = self.client.models.generate_content_stream(model=self.model, contents=prompt)
+        else:
+            stream = self.client.generate_content(prompt, stream=True)
+        for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+    
+    async def generate_async(self, prompt: str) -> str:
+        if USING_NEW_SDK:
+            response = await self.client.aio.models.generate_content(model=self.model, contents=prompt)
+        else:
+            response = await self.client.generate_content_async(prompt)
+        return response.text.strip()
+    
+    async def stream_generate_async(self, prompt: str):
+        if USING_NEW_SDK:
+            stream = await self.client.aio.models.generate_content_stream(model=self.model, contents=prompt)
+        else:
+            stream = await self.client.generate_content_async(prompt, stream=True)
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+
+class StubLLMBackend(LLMBackend):
+    """
+    Local deterministic stand-in for load testing: returns a templated answer
+    built from the prompt after `latency_ms`, and injects generic errors and
+    429s at the configured rates from a seeded RNG.
+    """
+    name = "stub"
+    
+    def __init__(self, latency_ms: float = 300, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, seed: int = 0):
+        self.latency = latency_ms / 1000.0
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+    
+    def _maybe_fail(self):
+        with self._lock:
+            self.calls += 1
+            roll = self._rng.random()
+        if roll < self.rate_limit_rate:
+            raise RuntimeError("429 RESOURCE_EXHAUSTED: stub rate limit injected")
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise RuntimeError("500 INTERNAL: stub error injected")
+    
+    def _render(self, prompt: str) -> str:
+        match = re.search(r"USER QUESTION: (.*)", prompt)
+        question = match.group(1).strip() if match else "(unknown question)"
+        laws = list(dict.fromkeys(re.findall(r"^Law: (.+)$", prompt, flags=re.MULTILINE)))
+        return (
+            f"📜 **Law**: {laws[0] if laws else 'Not found in context'}\n\n"
+            f"**What It Is**: Stub answer for \"{question}\" built from "
+            f"{len(laws)} law(s) in a {len(prompt)}-character prompt.\n\n"
+            f"**Key Points**:\n" + "\n".join(f"- {law}" for law in laws[:5])
+        )
+    
+    def generate(self, prompt: str) -> str:
+        self._maybe_fail()
+        time.sleep(self.latency)
+        return self._render(prompt)
+    
+    def stream_generate(self, prompt: str):
+        self._maybe_fail()
+        tokens = self._render(prompt).split(" ")
+        for i, token in enumerate(tokens):
+            time.sleep(self.latency / len(tokens))
+            yield token if i == 0 else " " + token
+    
+    async def generate_async(self, prompt: str) -> str:
+        self._maybe_fail()
+        await asyncio.sleep(self.latency)
+        return self._render(prompt)
+    
+    async def stream_generate_async(self, prompt: str):
+        self._maybe_fail()
+        tokens = self._render(prompt).split(" ")
+        for i, token in enumerate(tokens):
+            await asyncio.sleep(self.latency / len(tokens))
+            yield token if i == 0 else " " + token
+
+def create_llm_backend(name: str) -> LLMBackend:
+    """Instantiate the LLM backend selected by Config.LLM_BACKEND"""
+    if name == "gemini":
+        return GeminiBackend(Config.GEMINI_API_KEY, Config.GEMINI_MODEL)
+    if name == "stub":
+        return StubLLMBackend(
+            latency_ms=Config.LLM_STUB_LATENCY_MS,
+            error_rate=Config.LLM_STUB_ERROR_RATE,
+            rate_limit_rate=Config.LLM_STUB_RATE_LIMIT_RATE,
+            seed=Config.LLM_STUB_SEED
+        )
+    raise ValueError(f"Unknown LLM backend: {name!r} (expected 'gemini' or 'stub')")
+
+def is_rate_limit_error(error: Exception) -> bool:
+    error_msg = str(error).lower()
+    return 'resource_exhausted' in error_msg or 'rate limit' in error_msg or '429' in error_msg
+
+# ============================================================================
+# LLM RATE GOVERNOR (token buckets, adaptive concurrency, load shedding)
+# ============================================================================
+
+class LLMOverloadedError(Exception):
+    """An LLM call could not start (or be retried) before its deadline; served as 503 + Retry-After"""
+    
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1.0, retry_after)
+
+class TokenBucket:
+    """Refills `per_minute` units per minute, holding at most one minute's budget"""
+    
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+    
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (requests larger than the bucket wait for a full one)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.tokens) / self.rate)
+    
+    def take(self, amount: float):
+        self.tokens -= amount
+
+def estimate_llm_tokens(prompt) -> int:
+    """Prompt (chars/4) plus the expected answer length, charged against the tokens/min budget"""
+    return len(str(prompt)) // 4 + Config.LLM_EXPECTED_OUTPUT_TOKENS
+
+class LLMRateGovernor:
+    """
+    Process-wide admission control for LLM calls. A call starts only when
+    the requests/min and tokens/min buckets have room and fewer than
+    `limit` calls are in flight. `limit` adapts AIMD-style: +1/limit per
+    success, halved on a 429 (at most once per typical call latency).
+    Callers that cannot start before their deadline are shed immediately
+    with a Retry-After estimate instead of queueing until they time out.
+    """
+    
+    POLL_SECONDS = 0.05
+    
+    def __init__(self, rpm: float = 0, tpm: float = 0, max_concurrency: int = 8, min_concurrency: int = 1):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.max_limit = max(1, max_concurrency)
+        self.min_limit = max(1, min(min_concurrency, self.max_limit))
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.latency = 2.0  # EWMA of successful call durations, seconds
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.shed = 0
+        self.rate_limited = 0
+    
+    def _start_wait(self, tokens: int, now: float) -> float:
+        """Seconds until a call of `tokens` could start; 0 = now. Caller holds the lock."""
+        wait = 0.0
+        if self.in_flight >= int(self.limit):
+            # A slot frees roughly every latency / limit seconds
+            wait = self.latency / int(self.limit)
+        if self.requests is not None:
+            wait = max(wait, self.requests.wait_time(1, now))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_time(tokens, now))
+        return wait
+    
+    def _try_acquire(self, tokens: int, deadline: Optional[float]) -> float:
+        """Take a slot and budget (returns 0), or return how long to wait. Raises when shedding."""
+        with self._lock:
+            now = time.monotonic()
+            wait = self._start_wait(tokens, now)
+            if wait == 0.0:
+                self.in_flight += 1
+                self.admitted += 1
+                if self.requests is not None:
+                    self.requests.take(1)
+                if self.tokens is not None:
+                    self.tokens.take(tokens)
+                return 0.0
+            # Everyone already queued is ahead of us for a slot
+            expected = max(wait, self.waiting * self.latency / int(self.limit))
+            if deadline is not None and now + expected + self.latency > deadline:
+                self.shed += 1
+                QUERY_ERRORS.inc(kind="shed")
+                raise LLMOverloadedError(
+                    f"LLM capacity exhausted ({self.in_flight} in flight, {self.waiting} queued)",
+                    retry_after=expected
+                )
+            return wait
+    
+    def _release(self, outcome: str, duration: float):
+        with self._lock:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if outcome == "ok":
+                self.latency = 0.8 * self.latency + 0.2 * duration
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            elif outcome == "rate_limited":
+                self.rate_limited += 1
+                # Concurrent calls see the same 429 burst; back off once per round trip
+                if now - self._last_decrease > self.latency:
+                    self.limit = max(self.min_limit, self.limit / 2)
+                    self._last_decrease = now
+    
+    @staticmethod
+    def _outcome(error: BaseException) -> str:
+        if isinstance(error, Exception):
+            return "rate_limited" if is_rate_limit_error(error) else "error"
+        return "cancelled"
+    
+    @asynccontextmanager
+    async def slot(self, tokens: int, deadline: Optional[float] = None):
+        """Wait (asynchronously) for admission, run the call, feed its outcome back"""
+        with self._lock:
+            self.waiting += 1
+        try:
+            while True:
+                wait = self._try_acquire(tokens, deadline)
+                if wait == 0.0:
+                    break
+                await asyncio.sleep(min(wait, self.POLL_SECONDS))
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        
+        started = time.monotonic()
+        outcome = "ok"
+        try:
+            yield
+        except BaseException as e:
+            outcome = self._outcome(e)
+            raise
+        finally:
+            self._release(outcome, time.monotonic() - started)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rpm": self.requests.capacity if self.requests is not None else None,
+                "tpm": self.tokens.capacity if self.tokens is not None else None,
+                "concurrency_limit": round(self.limit, 2),
+                "max_concurrency": self.max_limit,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "latency_ewma_seconds": round(self.latency, 3),
+                "admitted": self.admitted,
+                "shed": self.shed,
+                "rate_limited": self.rate_limited
+            }
+
+@asynccontextmanager
+async def llm_slot(governor: Optional[LLMRateGovernor], prompt, deadline: Optional[float] = None):
+    """governor.slot() for one call with `prompt`, or no limit without a governor"""
+    if governor is None:
+        yield
+        return
+    async with governor.slot(estimate_llm_tokens(prompt), deadline):
+        yield
+
+def retry_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff, so concurrent 429s don't retry in lockstep"""
+    return random.uniform(0, min(Config.RETRY_MAX_DELAY, Config.RETRY_DELAY * (2 ** attempt)))
+
+def check_retry_deadline(wait_time: float, deadline: Optional[float]):
+    """Give up (503) rather than sleep past the request's deadline"""
+    if deadline is not None and time.monotonic() + wait_time >= deadline:
+        QUERY_ERRORS.inc(kind="rate_limit")
+        raise LLMOverloadedError("LLM rate limit: no time left to retry", retry_after=wait_time)
+
+async def stream_llm_with_retry(attempt, prompt, max_retries=Config.MAX_RETRIES,
+                                governor: Optional[LLMRateGovernor] = None, deadline: Optional[float] = None):
+    """
+    Yield the text fragments of one LLM call. `attempt()` starts a call and
+    returns an async iterator of fragments; each attempt runs through the
+    rate governor, and rate limits are retried with jittered exponential
+    backoff until the first fragment has been yielded. Raises
+    LLMOverloadedError when the call is shed or retries run out
+    (`deadline` is time.monotonic() based); other errors propagate.
+    """
+    for attempt_number in range(max_retries):
+        started = False
+        try:
+            async with llm_slot(governor, prompt, deadline):
+                with trace_span("llm_attempt", attempt=attempt_number + 1):
+                    async for text in attempt():
+                        started = True
+                        yield text
+            return
+        except LLMOverloadedError:
+            raise
+        except Exception as e:
+            # Text already sent to a client cannot be taken back
+            if not is_rate_limit_error(e) or started:
+                raise
+            if attempt_number == max_retries - 1:
+                QUERY_ERRORS.inc(kind="rate_limit")
+                raise LLMOverloadedError("LLM rate limit exceeded", retry_after=retry_delay(attempt_number))
+            wait_time = retry_delay(attempt_number)
+            check_retry_deadline(wait_time, deadline)
+            print(f"⚠️ Rate limit hit. Waiting {wait_time:.1f}s before retry {attempt_number + 1}/{max_retries}...")
+            LLM_RETRIES.inc()
+            LLM_BACKOFF_SECONDS.inc(wait_time)
+            with trace_span("backoff", seconds=wait_time):
+                await asyncio.sleep(wait_time)
+
+async def call_llm_with_retry_async(backend: LLMBackend, prompt, max_retries=Config.MAX_RETRIES,
+                                    governor: Optional[LLMRateGovernor] = None, deadline: Optional[float] = None):
+    """
+    Generate a complete answer through stream_llm_with_retry. Errors other
+    than rate limits come back as "Error: ..." text; queueing and backoff
+    never block the event loop.
+    """
+    async def generate():
+        yield await backend.generate_async(prompt)
+    
+    try:
+        async with aclosing(stream_llm_with_retry(generate, prompt, max_retries, governor, deadline)) as parts:
+            return "".join([text async for text in parts])
+    except LLMOverloadedError:
+        raise
+    except Exception as e:
+        print(f"❌ LLM API Error: {str(e)}")
+        QUERY_ERRORS.inc(kind="llm_error")
+        return f"Error: {str(e)}"
+
+# ============================================================================
+# CORPUS SCHEMA (field → chunk mapping)
+# ============================================================================
+
+# How each law field in the corpus JSON is turned into chunks. Modes:
+#   "text"    - string (or list of strings) → one chunk
+#   "steps"   - list of strings → one chunk with numbered steps
+#   "records" - list of objects → one chunk per object, rendered from
+#               `title_field` plus the labelled `record_fields`
+# The first matching field in TITLE_FIELDS names the law; IDENTITY_FIELDS are
+# consumed into every chunk header and never reported as unmapped.
+CORPUS_SCHEMA = {
+    "title_fields": ["title", "name"],
+    "identity_fields": ["law_number", "title", "name", "full_title_with_sections"],
+    "full_title_field": "full_title_with_sections",
+    "fields": {
+        "description": {"type": "overview", "label": "Description", "mode": "text"},
+        "protection_orders": {"type": "protection", "label": "Protection Orders", "mode": "text"},
+        "filing_process": {"type": "procedure", "label": "Filing Process", "mode": "steps"},
+        "punishments": {"type": "penalty", "label": "Punishment", "mode": "text"},
+        "case_examples": {
+            "type": "case_study", "label": "Case Example", "mode": "records",
+            "title_field": "case_name",
+            "record_fields": {
+                "background": "Background",
+                "action_taken": "Action Taken",
+                "court_order": "Court Order",
+                "outcome": "Outcome"
+            }
+        },
+        "who_can_file": {"type": "eligibility", "label": "Who Can File", "mode": "text"},
+        # Legacy corpus format (name / sections / case_studies / penalties / procedures)
+        "sections": {
+            "type": "section", "label": "Section", "mode": "records",
+            "title_field": "title",
+            "record_fields": {"section_number": "Section Number", "description": "Description"}
+        },
+        "case_studies": {
+            "type": "case_study", "label": "Case Study", "mode": "records",
+            "title_field": "case_name",
+            "record_fields": {"facts": "Facts", "outcome": "Outcome", "significance": "Significance"}
+        },
+        "penalties": {
+            "type": "penalty", "label": "Offense", "mode": "records",
+            "title_field": "offense",
+            "record_fields": {"penalty": "Penalty"}
+        },
+        "procedures": {
+            "type": "procedure", "label": "Procedure Step", "mode": "records",
+            "title_field": "step",
+            "record_fields": {"action": "Action"}
+        }
+    }
+}
+
+# Bump when chunk rendering changes without a schema change
+CHUNKER_VERSION = 2
+
+# PDF-extraction artefacts stripped from every corpus string before chunking
+TEXT_ARTIFACT_PATTERNS = [
+    (re.compile(r"__PAGE_\d+__"), " "),  # page markers
+    (re.compile(r"^\s*\?\s+"), ""),  # '?' left where a bullet glyph was
+    (re.compile(r"\s+\d+\.\s+Title of Law with Section:.*$", re.DOTALL), ""),  # title run into the next field
+]
+
+def normalize_corpus_text(text: str) -> str:
+    """
+    Strip extraction artefacts, collapse the newline-between-every-word
+    layout into single spaces and drop sentences repeated within the field.
+    """
+    for pattern, replacement in TEXT_ARTIFACT_PATTERNS:
+        text = pattern.sub(replacement, text)
+    text = " ".join(text.split())
+    
+    kept = []
+    seen = set()
+    for sentence in re.split(r"(?<=[.!?])\s+", text):
+        key = sentence.lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        kept.append(sentence)
+    return " ".join(kept)
+
+def chunker_fingerprint() -> str:
+    """Identifies the chunking pipeline; persisted indexes re-chunk when it changes"""
+    payload = json.dumps({
+        "version": CHUNKER_VERSION,
+        "schema": CORPUS_SCHEMA,
+        "normalize": Config.NORMALIZE_TEXT
+    }, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+# ============================================================================
+# SPARSE RETRIEVAL (BM25) + RECIPROCAL RANK FUSION
+# ============================================================================
+
+BM25_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "for", "from", "how",
+    "i", "if", "in", "is", "it", "me", "my", "of", "on", "or", "the", "to", "what",
+    "when", "which", "who", "with"
+}
+# Legal identifiers like "Section 498A" or "BNS 63" also index as one token
+BM25_IDENTIFIER_PREFIXES = {"section", "sec", "bns", "ipc", "bnss", "crpc", "act"}
+
+def bm25_tokenize(text: str) -> List[str]:
+    """Lowercased word tokens plus joined identifier tokens (section_498a)"""
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    tokens = [w for w in words if w not in BM25_STOPWORDS]
+    for prev, word in zip(words, words[1:]):
+        if prev in BM25_IDENTIFIER_PREFIXES and any(ch.isdigit() for ch in word):
+            tokens.append(f"{prev}_{word}")
+    return tokens
+
+class BM25Index:
+    """
+    In-process inverted index with Okapi BM25 scoring, keyed by chunk id.
+    Small enough to rebuild on every corpus update and serialized as JSON
+    next to the FAISS index.
+    """
+    VERSION = 1  # bump when bm25_tokenize changes
+    
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}  # term -> [(chunk_id, term_frequency), ...]
+        self.doc_len = {}  # chunk_id -> token count
+        self.avgdl = 0.0
+        self.idf = {}
+    
+    @classmethod
+    def from_chunks(cls, chunks: List[Dict[str, Any]], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        index = cls(k1, b)
+        for chunk in chunks:
+            tokens = bm25_tokenize(chunk['text'])
+            index.doc_len[chunk['id']] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                index.postings.setdefault(token, []).append((chunk['id'], tf))
+        index._finalize()
+        return index
+    
+    def _finalize(self):
+        n_docs = len(self.doc_len)
+        self.avgdl = sum(self.doc_len.values()) / n_docs if n_docs else 0.0
+        self.idf = {
+            term: np.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+    
+    def search(self, query: str, n: int, allowed_ids=None):
+        """Top-n (chunk_id, score) pairs, best first"""
+        scores = {}
+        for token in set(bm25_tokenize(query)):
+            idf = self.idf.get(token)
+            if idf is None:
+                continue
+            for chunk_id, tf in self.postings[token]:
+                if allowed_ids is not None and chunk_id not in allowed_ids:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[chunk_id] / self.avgdl)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(n, scores.items(), key=lambda item: item[1])
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.VERSION,
+            "k1": self.k1,
+            "b": self.b,
+            "doc_len": {str(chunk_id): length for chunk_id, length in self.doc_len.items()},
+            "postings": self.postings
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "BM25Index":
+        index = cls(data["k1"], data["b"])
+        index.doc_len = {int(chunk_id): length for chunk_id, length in data["doc_len"].items()}
+        index.postings = {term: [tuple(p) for p in docs] for term, docs in data["postings"].items()}
+        index._finalize()
+        return index
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[tuple]:
+    """Fuse ranked id lists: score(id) = sum over lists of 1 / (k + rank)"""
+    fused = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+# ============================================================================
+# METADATA FILTERS (chunk type → id selectors)
+# ============================================================================
+
+# Query-analysis flag → chunk type that answers it
+QUERY_TYPE_FILTERS = {
+    'needs_procedure': 'procedure',
+    'needs_cases': 'case_study',
+    'needs_penalties': 'penalty'
+}
+
+def chunk_type_filter(query_info: Dict[str, bool]) -> Optional[frozenset]:
+    """Chunk types a query is restricted to, or None for an unfiltered search"""
+    types = frozenset(chunk_type for flag, chunk_type in QUERY_TYPE_FILTERS.items() if query_info.get(flag))
+    return types or None
+
+class ChunkFilterIndex:
+    """
+    Precomputed chunk-type → id arrays. A type filter becomes a FAISS
+    IDSelector (and a BM25 allowed-id set) applied inside the search, so
+    the top k already has the requested type.
+    """
+    
+    def __init__(self, chunks: List[Dict[str, Any]]):
+        ids_by_type = {}
+        for chunk in chunks:
+            ids_by_type.setdefault(chunk['type'], []).append(chunk['id'])
+        self.ids_by_type = {
+            chunk_type: np.array(ids, dtype='int64') for chunk_type, ids in ids_by_type.items()
+        }
+        self._allowed = {}
+        self._lock = threading.Lock()
+    
+    def allowed(self, types: frozenset):
+        """(id set, faiss selector) for a set of chunk types; None if no chunk has them"""
+        with self._lock:
+            if types not in self._allowed:
+                parts = [self.ids_by_type[t] for t in sorted(types) if t in self.ids_by_type]
+                if parts:
+                    ids = np.concatenate(parts)
+                    # IDSelectorBatch copies the ids into its own hash set
+                    selector = faiss.IDSelectorBatch(ids.size, faiss.swig_ptr(ids))
+                    self._allowed[types] = (set(ids.tolist()), selector)
+                else:
+                    self._allowed[types] = None
+            return self._allowed[types]
+    
+    def counts(self) -> Dict[str, int]:
+        return {chunk_type: int(ids.size) for chunk_type, ids in self.ids_by_type.items()}
+
+# ============================================================================
+# DENSE INDEX TYPES (flat / HNSW / IVF-PQ)
+# ============================================================================
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+
+def ivf_nlist(num_vectors: int) -> int:
+    """Number of IVF lists: IVF_NLIST, or 4 * sqrt(n) when unset"""
+    if Config.IVF_NLIST > 0:
+        return Config.IVF_NLIST
+    return max(1, int(4 * np.sqrt(num_vectors)))
+
+def dense_index_spec(index_type: Optional[str] = None) -> Dict[str, Any]:
+    """Build parameters of the configured index type; an artifact built with others is rebuilt"""
+    index_type = index_type or Config.INDEX_TYPE
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown INDEX_TYPE '{index_type}' (expected one of {', '.join(INDEX_TYPES)})")
+    if index_type == "hnsw":
+        return {"type": "hnsw", "M": Config.HNSW_M, "ef_construction": Config.HNSW_EF_CONSTRUCTION}
+    if index_type == "ivfpq":
+        return {"type": "ivfpq", "nlist": Config.IVF_NLIST, "pq_m": Config.PQ_M, "pq_nbits": Config.PQ_NBITS}
+    return {"type": "flat"}
+
+def build_dense_index(embeddings, ids, index_type: Optional[str] = None):
+    """
+    ID-mapped FAISS index of the given type (default Config.INDEX_TYPE).
+    IVF-PQ is trained on the embeddings first; with too few vectors to train
+    the coarse quantizer and PQ codebooks it falls back to a flat index.
+    """
+    index_type = dense_index_spec(index_type)["type"]
+    num_vectors, dimension = embeddings.shape
+    
+    if index_type == "hnsw":
+        inner = faiss.IndexHNSWFlat(dimension, Config.HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        inner.hnsw.efConstruction = Config.HNSW_EF_CONSTRUCTION
+        inner.hnsw.efSearch = Config.HNSW_EF_SEARCH
+    elif index_type == "ivfpq":
+        nlist = ivf_nlist(num_vectors)
+        if dimension % Config.PQ_M != 0:
+            print(f"⚠️ PQ_M={Config.PQ_M} does not divide dimension {dimension}, using a flat index")
+            return build_dense_index(embeddings, ids, "flat")
+        if num_vectors < max(nlist, 2 ** Config.PQ_NBITS):
+            print(f"⚠️ {num_vectors} vectors are too few to train IVF{nlist},PQ{Config.PQ_M}x{Config.PQ_NBITS}, using a flat index")
+            return build_dense_index(embeddings, ids, "flat")
+        quantizer = faiss.IndexFlatIP(dimension)
+        inner = faiss.IndexIVFPQ(quantizer, dimension, nlist, Config.PQ_M, Config.PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+        start = time.time()
+        inner.train(embeddings)
+        inner.nprobe = Config.IVF_NPROBE
+        print(f"🔧 Trained IVF{nlist},PQ{Config.PQ_M}x{Config.PQ_NBITS} on {num_vectors} vectors in {time.time() - start:.2f}s")
+    else:
+        inner = faiss.IndexFlatIP(dimension)
+    
+    # ID-mapped so incremental updates can remove and replace single chunks
+    index = faiss.IndexIDMap2(inner)
+    if num_vectors:
+        index.add_with_ids(embeddings, np.asarray(ids, dtype='int64'))
+    return index
+
+def dense_index_type(faiss_index) -> str:
+    """Actual type of a built index ("flat", "hnsw" or "ivfpq")"""
+    inner = faiss.downcast_index(faiss_index.index) if isinstance(faiss_index, faiss.IndexIDMap) else faiss_index
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivfpq"
+    return "flat"
+
+def mutable_index_copy(faiss_index, index_path: Optional[str] = None):
+    """
+    In-memory copy of an index that can be added to and removed from.
+    clone_index cannot copy memory-mapped data (IVF lists mapped with
+    IO_FLAG_MMAP raise, IO_FLAG_MMAP_IFC data crashes the process), so the
+    index is round-tripped through serialize_index; if even that fails, the
+    persisted index at index_path is re-read without mmap. Raises
+    RuntimeError when no copy can be made.
+    """
+    try:
+        return faiss.deserialize_index(faiss.serialize_index(faiss_index))
+    except RuntimeError:
+        if index_path is None or not os.path.exists(index_path):
+            raise
+    copy = faiss.read_index(index_path)
+    if copy.ntotal != faiss_index.ntotal:
+        raise RuntimeError(f"{index_path} was rewritten since the index was loaded")
+    return copy
+
+def dense_search_params(faiss_index, n: int, selector=None, search_params: Optional[Dict[str, int]] = None):
+    """
+    FAISS SearchParameters for one search: the type filter selector plus
+    nprobe (IVF) or efSearch (HNSW), per-request values overriding the
+    Config defaults. None when a plain search will do.
+    """
+    search_params = search_params or {}
+    kwargs = {"sel": selector} if selector is not None else {}
+    index_type = dense_index_type(faiss_index)
+    if index_type == "hnsw":
+        # efSearch below n cannot return n neighbours
+        ef_search = search_params.get("ef_search") or Config.HNSW_EF_SEARCH
+        return faiss.SearchParametersHNSW(efSearch=max(ef_search, n), **kwargs)
+    if index_type == "ivfpq":
+        nprobe = search_params.get("nprobe") or Config.IVF_NPROBE
+        return faiss.SearchParametersIVF(nprobe=max(1, nprobe), **kwargs)
+    if kwargs:
+        return faiss.SearchParameters(**kwargs)
+    return None
+
+# ============================================================================
+# INDEX ARTIFACT (persisted FAISS index + chunk store)
+# ============================================================================
+
+INDEX_ARTIFACT_VERSION = 3
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.jsonl"  # one chunk per line, sorted by id
+CHUNK_IDS_FILE = "chunk_ids.npy"
+CHUNK_OFFSETS_FILE = "chunk_offsets.npy"
+BM25_FILE = "bm25.json"
+MANIFEST_FILE = "manifest.json"
+
+# Paths whose interprocess lock this thread already holds (the lock is re-entrant per thread)
+_held_locks = threading.local()
+
+@contextmanager
+def interprocess_lock(path: str):
+    """
+    Exclusive lock on `<path>.lock` across worker processes, so one worker
+    builds or rewrites an artifact while the others wait. No-op without fcntl.
+    """
+    path = os.path.abspath(path)
+    held = getattr(_held_locks, "paths", None)
+    if held is None:
+        held = _held_locks.paths = set()
+    if fcntl is None or path in held:
+        yield
+        return
+    
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        held.add(path)
+        try:
+            yield
+        finally:
+            held.discard(path)
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+class MmapChunkStore:
+    """
+    Read-only chunk store over an artifact's chunks.jsonl, memory-mapped so
+    all worker processes share one copy in the page cache. Acts as both the
+    chunk list (len, iteration) and the id → chunk dict (get, [], in);
+    chunks are decoded on access.
+    """
+    
+    def __init__(self, artifact_dir: str):
+        self.ids = np.load(os.path.join(artifact_dir, CHUNK_IDS_FILE), mmap_mode='r')
+        self.offsets = np.load(os.path.join(artifact_dir, CHUNK_OFFSETS_FILE), mmap_mode='r')
+        self._file = open(os.path.join(artifact_dir, CHUNKS_FILE), 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        # mmap cannot map an empty file
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def _row(self, chunk_id: int) -> Optional[int]:
+        row = int(np.searchsorted(self.ids, chunk_id))
+        if row < len(self.ids) and int(self.ids[row]) == chunk_id:
+            return row
+        return None
+    
+    def _decode(self, row: int) -> Dict[str, Any]:
+        return json.loads(self._data[int(self.offsets[row]):int(self.offsets[row + 1])])
+    
+    def get(self, chunk_id: int, default=None):
+        row = self._row(chunk_id)
+        return self._decode(row) if row is not None else default
+    
+    def __getitem__(self, chunk_id: int) -> Dict[str, Any]:
+        row = self._row(chunk_id)
+        if row is None:
+            raise KeyError(chunk_id)
+        return self._decode(row)
+    
+    def __contains__(self, chunk_id: int) -> bool:
+        return self._row(chunk_id) is not None
+    
+    def __iter__(self):
+        for row in range(len(self.ids)):
+            yield self._decode(row)
+    
+    def values(self):
+        return iter(self)
+
+def write_chunk_store(directory: str, chunks):
+    """chunks.jsonl sorted by id plus the id and byte-offset arrays MmapChunkStore needs"""
+    ordered = sorted(chunks, key=lambda c: c['id'])
+    offsets = [0]
+    with open(os.path.join(directory, CHUNKS_FILE), 'wb') as f:
+        for chunk in ordered:
+            line = json.dumps(chunk, ensure_ascii=False).encode('utf-8') + b"\n"
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+    np.save(os.path.join(directory, CHUNK_IDS_FILE), np.array([c['id'] for c in ordered], dtype='int64'))
+    np.save(os.path.join(directory, CHUNK_OFFSETS_FILE), np.array(offsets, dtype='int64'))
+
+def compute_file_hash(path: str) -> str:
+    """SHA-256 of a file's bytes, used to detect corpus changes"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def index_artifact_dir(json_path: str) -> str:
+    """Directory holding the persisted index for a corpus JSON file"""
+    if Config.INDEX_CACHE_DIR:
+        path = os.path.abspath(json_path)
+        base = os.path.splitext(os.path.basename(path))[0]
+        # Corpora uploaded under the same file name (uploads/<corpus>/laws.json) need separate artifacts
+        path_hash = hashlib.sha1(path.encode('utf-8')).hexdigest()[:12]
+        return os.path.join(Config.INDEX_CACHE_DIR, f"{base}-{path_hash}.index")
+    return f"{json_path}.index"
+
+def index_mmap_flags() -> int:
+    """
+    read_index flags for INDEX_MMAP. IO_FLAG_MMAP_IFC maps the vectors of
+    flat, HNSW and IVF indexes read-only, so workers share one copy in the
+    page cache. Older FAISS only has IO_FLAG_MMAP, which maps IVF inverted
+    lists alone: flat and HNSW vectors are then copied into every worker.
+    """
+    flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if flag is None:
+        flag = faiss.IO_FLAG_MMAP
+    return flag | faiss.IO_FLAG_READ_ONLY
+
+def index_mmap_mode() -> str:
+    """What INDEX_MMAP actually shares between workers, for /info"""
+    if not Config.INDEX_MMAP:
+        return "off"
+    return "all" if hasattr(faiss, "IO_FLAG_MMAP_IFC") else "ivf-lists"
+
+def process_memory_mb() -> Dict[str, float]:
+    """
+    Resident memory of this process from /proc (Linux): rss_anon is private
+    to the worker, rss_file is file-backed and shared with other workers
+    mapping the same artifact. Empty where /proc is unavailable.
+    """
+    fields = {"VmRSS:": "rss", "RssAnon:": "rss_anon", "RssFile:": "rss_file"}
+    memory = {}
+    try:
+        with open("/proc/self/status", 'r') as f:
+            for line in f:
+                parts = line.split()
+                if parts and parts[0] in fields:
+                    memory[fields[parts[0]]] = round(int(parts[1]) / 1024, 1)
+    except OSError:
+        pass
+    return memory
+
+def previous_artifact_dir(artifact_dir: str) -> str:
+    """Where write_index_artifact parks the artifact it is replacing"""
+    return f"{artifact_dir}.previous"
+
+def read_index_artifact(artifact_dir: str):
+    """
+    Load a persisted index if it was built with the current embedding model.
+    Returns (faiss_index, chunks, manifest, bm25) or None when missing or
+    unusable; chunks is a memory-mapped MmapChunkStore and bm25 is None if
+    the artifact has no sparse index.
+    The caller compares manifest["source_hash"] to decide whether the chunks
+    need an incremental refresh.
+    """
+    previous = previous_artifact_dir(artifact_dir)
+    if not os.path.isdir(artifact_dir) and os.path.isdir(previous):
+        # A writer crashed between parking the old artifact and moving the new one in
+        print(f"♻️ Restoring interrupted index artifact swap in {artifact_dir}")
+        os.replace(previous, artifact_dir)
+    
+    manifest_path = os.path.join(artifact_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Ignoring unreadable index manifest {manifest_path}: {e}")
+        return None
+    
+    if manifest.get("format_version") != INDEX_ARTIFACT_VERSION:
+        print("♻️ Index artifact format changed, rebuilding")
+        return None
+    if manifest.get("embedding_model") != embedding_model_id():
+        print(f"♻️ Embedding model changed ({manifest.get('embedding_model')} → {embedding_model_id()}), rebuilding")
+        return None
+    if manifest.get("index_spec", {"type": "flat"}) != dense_index_spec():
+        print(f"♻️ Index type changed ({manifest.get('index_spec')} → {dense_index_spec()}), rebuilding")
+        return None
+    
+    index_path = os.path.join(artifact_dir, INDEX_FILE)
+    try:
+        if Config.INDEX_MMAP:
+            try:
+                faiss_index = faiss.read_index(index_path, index_mmap_flags())
+            except RuntimeError:
+                # Not every index type supports mmap; fall back to a regular read
+                faiss_index = faiss.read_index(index_path)
+        else:
+            faiss_index = faiss.read_index(index_path)
+        
+        chunks = MmapChunkStore(artifact_dir)
+        
+        bm25 = None
+        bm25_path = os.path.join(artifact_dir, BM25_FILE)
+        if os.path.exists(bm25_path):
+            with open(bm25_path, 'r', encoding='utf-8') as f:
+                bm25_data = json.load(f)
+            # A stale tokenizer version is simply rebuilt from the chunks
+            if bm25_data.get("version") == BM25Index.VERSION:
+                bm25 = BM25Index.from_dict(bm25_data)
+    except (OSError, RuntimeError, ValueError, KeyError) as e:
+        print(f"⚠️ Ignoring corrupt index artifact in {artifact_dir}: {e}")
+        return None
+    
+    if faiss_index.ntotal != len(chunks):
+        print("⚠️ Index artifact is inconsistent (vector/chunk count mismatch), rebuilding")
+        return None
+    
+    return faiss_index, chunks, manifest, bm25
+
+def write_index_artifact(artifact_dir: str, faiss_index, chunks: List[Dict[str, Any]], source_hash: str,
+                         next_chunk_id: int, extra: Optional[Dict[str, Any]] = None, bm25=None):
+    """
+    Write the index into a temp dir, then swap it in with renames: the old
+    artifact is parked at <artifact_dir>.previous, the new one moved into
+    place, and only then is the old one deleted. A crash mid-swap leaves the
+    previous artifact, which read_index_artifact restores. Callers hold
+    interprocess_lock(artifact_dir), so readers never see the swap itself.
+    """
+    parent = os.path.dirname(os.path.abspath(artifact_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".index-", dir=parent)
+    
+    try:
+        faiss.write_index(faiss_index, os.path.join(tmp_dir, INDEX_FILE))
+        write_chunk_store(tmp_dir, chunks)
+        if bm25 is not None:
+            with open(os.path.join(tmp_dir, BM25_FILE), 'w', encoding='utf-8') as f:
+                json.dump(bm25.to_dict(), f)
+        
+        manifest = {
+            "format_version": INDEX_ARTIFACT_VERSION,
+            "embedding_model": embedding_model_id(),
+            "source_hash": source_hash,
+            "chunker": chunker_fingerprint(),
+            "num_chunks": len(chunks),
+            "next_chunk_id": next_chunk_id,
+            "dimension": faiss_index.d,
+            "index_spec": dense_index_spec(),
+            "index_type": dense_index_type(faiss_index),
+            "created_at": time.time(),
+            **(extra or {})
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    
+    previous = previous_artifact_dir(artifact_dir)
+    if os.path.isdir(artifact_dir):
+        # A stale .previous can only be left over from an earlier crash
+        shutil.rmtree(previous, ignore_errors=True)
+        os.replace(artifact_dir, previous)
+    try:
+        os.replace(tmp_dir, artifact_dir)
+    except OSError:
+        if os.path.isdir(previous):
+            os.replace(previous, artifact_dir)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    # Open mmaps of the old files stay valid after the directory is removed
+    shutil.rmtree(previous, ignore_errors=True)
+
+def chunk_text_hash(text: str) -> str:
+    """Short content hash used to detect edited chunks"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+# ============================================================================
+# QUERY MICRO-BATCHING
+# ============================================================================
+
+class QueryEmbeddingBatcher:
+    """
+    Coalesces questions that arrive within a short window (or until max_batch
+    is reached) into a single embedder.encode call and a single batched FAISS
+    search, then fans each row back to the waiting request.
+    """
+    
+    def __init__(self, search_fn, executor, window_ms: float = 5, max_batch: int = 32):
+        self.search_fn = search_fn
+        self.executor = executor
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._pending = []
+        self._timer = None
+        self._tasks = set()  # keep references so running batches are not GC'd
+        self.batches_run = 0
+        self.questions_batched = 0
+    
+    async def submit(self, question: str, n: int, type_filter: Optional[frozenset] = None,
+                     search_params: Optional[Dict[str, int]] = None):
+        """Queue a question; resolves to (q_embedding, scores, indices, id_to_chunk)"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((question, n, (type_filter, search_params), future))
+        
+        if len(self._pending) >= self.max_batch:
+            self._flush(loop)
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush, loop)
+        
+        return await future
+    
+    def _flush(self, loop):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = loop.create_task(self._run_batch(loop, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _run_batch(self, loop, batch):
+        questions = [question for question, _, _, _ in batch]
+        type_filters = [options[0] for _, _, options, _ in batch]
+        search_params = [options[1] for _, _, options, _ in batch]
+        n = max(n for _, n, _, _ in batch)
+        
+        try:
+            q_embeddings, scores, indices, id_to_chunk = await loop.run_in_executor(
+                self.executor, self.search_fn, questions, n, type_filters, search_params
+            )
+        except Exception as e:
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        self.batches_run += 1
+        self.questions_batched += len(batch)
+        
+        for i, (_, row_n, _, future) in enumerate(batch):
+            # A request may have been cancelled (timeout) while waiting
+            if not future.done():
+                future.set_result((q_embeddings[i], scores[i][:row_n], indices[i][:row_n], id_to_chunk))
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches_run": self.batches_run,
+            "questions_batched": self.questions_batched,
+            "avg_batch_size": round(self.questions_batched / self.batches_run, 2) if self.batches_run else 0.0
+        }
+
+# ============================================================================
+# SEMANTIC ANSWER CACHE
+# ============================================================================
+
+LLM_ERROR_PREFIXES = ("Error", "Rate limit", "Max retries")
 
-class StatusResponse(BaseModel):
-    """Response model for system status"""
-    status: str
-    message: str
-    json_loaded: bool
-    model_loaded: bool
+def normalize_question(question: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace for exact-match caching"""
+    return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
 
-# Helper Functions
-def call_gemini_with_retry(client, prompt, max_retries=Config.MAX_RETRIES):
-    """Call Gemini API with exponential backoff for rate limiting"""
-    for attempt in range(max_retries):
-        try:
-            if USING_NEW_SDK:
-                response = client.models.generate_content(
-                    model=Config.GEMINI_MODEL,
-                    contents=prompt
-                )
-                return response.text.strip()
-            else:
-                response = client.generate_content(prompt)
-                return response.text.strip()
-        except Exception as e:
-            error_msg = str(e).lower()
+class SemanticAnswerCache:
+    """
+    LRU + TTL cache of final answers. A lookup hits on the normalized question
+    text, or on cosine similarity >= `similarity` against earlier question
+    embeddings held in a small per-scope FAISS index. Scopes separate corpus
+    versions, k and query type so a hit never crosses those boundaries.
+    """
+    
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600, similarity: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries = OrderedDict()  # entry id -> entry, oldest first
+        self._exact = {}  # (scope, normalized question) -> entry id
+        self._indexes = {}  # scope -> IndexIDMap2 of question embeddings
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        self._exact.pop((entry["scope"], entry["text"]), None)
+        index = self._indexes.get(entry["scope"])
+        if index is not None:
+            index.remove_ids(np.array([entry_id], dtype='int64'))
+            if index.ntotal == 0:
+                del self._indexes[entry["scope"]]
+    
+    def _live(self, entry_id: int):
+        """Return the entry if present and fresh, refreshing its LRU position"""
+        entry = self._entries.get(entry_id)
+        if entry is None:
+            return None
+        if time.time() - entry["created_at"] > self.ttl:
+            self._remove(entry_id)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(entry_id)
+        return entry
+    
+    def get_exact(self, question: str, scope):
+        """Exact hit on normalized text; misses are not counted here"""
+        with self._lock:
+            entry_id = self._exact.get((scope, normalize_question(question)))
+            entry = self._live(entry_id) if entry_id is not None else None
+            if entry is None:
+                return None
+            self.hits_exact += 1
+            return entry["value"]
+    
+    def get_similar(self, q_embedding, scope):
+        """Nearest previously answered question in the same scope"""
+        with self._lock:
+            index = self._indexes.get(scope)
+            if index is not None and index.ntotal > 0:
+                query = np.ascontiguousarray(q_embedding, dtype='float32').reshape(1, -1)
+                scores, ids = index.search(query, 1)
+                if ids[0][0] >= 0 and scores[0][0] >= self.similarity:
+                    entry = self._live(int(ids[0][0]))
+                    if entry is not None:
+                        self.hits_semantic += 1
+                        return entry["value"]
+            self.misses += 1
+            return None
+    
+    def put(self, question: str, q_embedding, scope, value):
+        with self._lock:
+            key = (scope, normalize_question(question))
+            if key in self._exact:
+                self._remove(self._exact[key])
             
-            if 'resource_exhausted' in error_msg or 'rate limit' in error_msg or '429' in error_msg:
-                if attempt < max_retries - 1:
-                    wait_time = Config.RETRY_DELAY * (2 ** attempt)
-                    print(f"⚠️ Rate limit hit. Waiting {wait_time}s before retry {attempt + 1}/{max_retries}...")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    return "Rate limit exceeded. Please wait a moment and try again."
-            else:
-                print(f"❌ Gemini API Error: {str(e)}")
-                return f"Error: {str(e)}"
+            while len(self._entries) >= self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self.evictions += 1
+            
+            entry_id = self._next_id
+            self._next_id += 1
+            embedding = np.ascontiguousarray(q_embedding, dtype='float32').reshape(1, -1)
+            index = self._indexes.get(scope)
+            if index is None:
+                index = faiss.IndexIDMap2(faiss.IndexFlatIP(embedding.shape[1]))
+                self._indexes[scope] = index
+            index.add_with_ids(embedding, np.array([entry_id], dtype='int64'))
+            
+            self._entries[entry_id] = {
+                "scope": scope,
+                "text": key[1],
+                "value": value,
+                "created_at": time.time()
+            }
+            self._exact[key] = entry_id
     
-    return "Max retries reached. Please try again later."
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits_exact + self.hits_semantic + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "similarity_threshold": self.similarity,
+                "hits_exact": self.hits_exact,
+                "hits_semantic": self.hits_semantic,
+                "misses": self.misses,
+                "hit_ratio": round((self.hits_exact + self.hits_semantic) / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
 
-# ImprovedGraphRAGSystem Class - PRESERVED WITHOUT MODIFICATION
+# ImprovedGraphRAGSystem Class
 class ImprovedGraphRAGSystem:
     """
     Improved GraphRAG with better chunking strategy
     Preserves all JSON fields and creates contextual chunks
     """
     
-    def __init__(self, json_path: str, embedder, gemini_client):
+    def __init__(self, json_path: str, embedder, llm_backend, progress=None):
         self.json_path = json_path
         self.chunks_with_meta = []
+        self.id_to_chunk = {}
         self.faiss_index = None
-        self.gemini_client = gemini_client
+        self.bm25 = None
+        self.chunk_filters = ChunkFilterIndex([])
+        self.next_chunk_id = 0
+        # Guards the (faiss_index, id_to_chunk, bm25, chunk_filters) set swapped by incremental updates
+        self._index_lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self.llm_backend = llm_backend
         self.embedder = embedder
+        self.source_hash = compute_file_hash(json_path)
+        self.artifact_dir = index_artifact_dir(json_path)
+        self.loaded_from_cache = False
+        self.schema_report = None
+        self.normalization_report = None
+        self._batcher = None
+        # progress(stage, fraction) callback, used by the corpus registry to report builds
+        self.progress = progress
+        
+        if not Config.INDEX_CACHE_ENABLED:
+            self._build_from_json()
+            return
         
-        # Load and process JSON
+        # Reuse the persisted index when it is still valid. With several
+        # workers, one builds the artifact while the others wait, then mmap it.
+        with interprocess_lock(self.artifact_dir):
+            self._report("loading artifact")
+            if self._load_index_artifact():
+                return
+            self._build_from_json()
+            self._report("saving")
+            self._save_index_artifact()
+    
+    def _build_from_json(self):
+        """Chunk and embed the corpus JSON from scratch"""
+        self._report("chunking")
         self._load_and_chunk_json()
         self._build_faiss_index()
+        self.bm25 = self._build_sparse_index(self.chunks_with_meta)
+        self.chunk_filters = ChunkFilterIndex(self.chunks_with_meta)
+    
+    def _report(self, stage: str, fraction: Optional[float] = None, progress=None):
+        """Forward build progress to the callback, if any"""
+        progress = progress or self.progress
+        if progress is not None:
+            progress(stage, fraction)
+    
+    def _load_index_artifact(self) -> bool:
+        """Load chunks and FAISS index from disk instead of re-embedding"""
+        start = time.time()
+        artifact = read_index_artifact(self.artifact_dir)
+        if artifact is None:
+            return False
+        
+        faiss_index, chunks, manifest, bm25 = artifact
+        self._swap_index(faiss_index, chunks, bm25)
+        self.next_chunk_id = manifest.get("next_chunk_id", len(chunks))
+        self.schema_report = manifest.get("schema_report")
+        self.normalization_report = manifest.get("normalization_report")
+        print(f"✅ Loaded index artifact with {len(chunks)} chunks from {self.artifact_dir} in {time.time() - start:.2f}s")
+        
+        if manifest.get("source_hash") != self.source_hash or manifest.get("chunker") != chunker_fingerprint():
+            print("♻️ Corpus JSON or chunking schema changed since the index was built, applying incremental update")
+            self.update_from_json(self.json_path)
+        else:
+            self.loaded_from_cache = True
+        return True
+    
+    def _save_index_artifact(self):
+        """Persist chunks and FAISS index next to the corpus"""
+        try:
+            write_index_artifact(
+                self.artifact_dir, self.faiss_index, self.chunks_with_meta,
+                self.source_hash, self.next_chunk_id,
+                extra={"schema_report": self.schema_report, "normalization_report": self.normalization_report},
+                bm25=self.bm25
+            )
+            print(f"💾 Index artifact written to {self.artifact_dir}")
+        except OSError as e:
+            # A read-only corpus location should not stop the server from serving
+            print(f"⚠️ Could not write index artifact to {self.artifact_dir}: {e}")
+    
+    def _swap_index(self, faiss_index, chunks: List[Dict[str, Any]], bm25=None):
+        """Atomically replace the indexes and chunk store seen by queries"""
+        # A memory-mapped store already answers id lookups; don't copy it into a dict
+        id_to_chunk = chunks if isinstance(chunks, MmapChunkStore) else {c['id']: c for c in chunks}
+        chunk_filters = ChunkFilterIndex(chunks)
+        if not Config.HYBRID_RETRIEVAL:
+            bm25 = None
+        elif bm25 is None:
+            bm25 = self._build_sparse_index(chunks)
+        with self._index_lock:
+            self.faiss_index = faiss_index
+            self.bm25 = bm25
+            self.chunk_filters = chunk_filters
+            self.chunks_with_meta = chunks
+            self.id_to_chunk = id_to_chunk
+    
+    def _build_sparse_index(self, chunks: List[Dict[str, Any]]):
+        """BM25 over the same chunks as the dense index (None when hybrid is off)"""
+        if not Config.HYBRID_RETRIEVAL:
+            return None
+        return BM25Index.from_chunks(chunks, k1=Config.BM25_K1, b=Config.BM25_B)
+    
+    def _get_batcher(self, executor):
+        """Lazily create the query micro-batcher (needs a running event loop)"""
+        if self._batcher is None:
+            self._batcher = QueryEmbeddingBatcher(
+                self._search_batch,
+                executor,
+                window_ms=Config.QUERY_BATCH_WINDOW_MS,
+                max_batch=Config.QUERY_BATCH_MAX
+            )
+        return self._batcher
+    
+    def _index_snapshot(self):
+        """Consistent (faiss_index, id_to_chunk, bm25, chunk_filters) set for one query"""
+        with self._index_lock:
+            return self.faiss_index, self.id_to_chunk, self.bm25, self.chunk_filters
+    
+    def _embed_texts(self, texts: List[str], progress=None):
+        """Encode texts into L2-normalized float32 vectors"""
+        if progress is not None and len(texts) > Config.EMBED_PROGRESS_BATCH:
+            # Encode in slices so a background build can report how far it got
+            parts = []
+            for start in range(0, len(texts), Config.EMBED_PROGRESS_BATCH):
+                batch = texts[start:start + Config.EMBED_PROGRESS_BATCH]
+                parts.append(self.embedder.encode(batch, show_progress_bar=False))
+                self._report("embedding", (start + len(batch)) / len(texts), progress)
+            embeddings = np.vstack(parts)
+        else:
+            self._report("embedding", 0.0, progress)
+            embeddings = self.embedder.encode(texts, show_progress_bar=len(texts) > 100)
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+        faiss.normalize_L2(embeddings)
+        return embeddings
+    
+    def update_from_json(self, json_path: str, progress=None) -> Dict[str, Any]:
+        """
+        Incrementally re-index against a new version of the corpus.
+        Chunks are matched by chunk_key (law + type + ordinal); only new or
+        edited chunks are embedded and stale vectors are removed by id. The
+        new index is built on a copy and swapped in, so queries keep running.
+        """
+        progress = progress or self.progress
+        with self._update_lock:
+            start = time.time()
+            self._report("chunking", progress=progress)
+            new_chunks = self._chunk_corpus(json_path)
+            
+            with self._index_lock:
+                base_index = self.faiss_index
+                current = {c['chunk_key']: c for c in self.chunks_with_meta}
+            
+            to_embed = []
+            stale_ids = []
+            unchanged = 0
+            for chunk in new_chunks:
+                old = current.pop(chunk['chunk_key'], None)
+                if old is None:
+                    chunk['id'] = self.next_chunk_id
+                    self.next_chunk_id += 1
+                    to_embed.append(chunk)
+                elif old['text_hash'] != chunk['text_hash']:
+                    chunk['id'] = old['id']
+                    stale_ids.append(old['id'])
+                    to_embed.append(chunk)
+                else:
+                    chunk['id'] = old['id']
+                    unchanged += 1
+            # Whatever is left in `current` no longer exists in the corpus
+            removed = len(current)
+            stale_ids.extend(c['id'] for c in current.values())
+            
+            embeddings = self._embed_texts([c['text'] for c in to_embed], progress) if to_embed else None
+            self._report("indexing", progress=progress)
+            if dense_index_type(base_index) == "hnsw":
+                new_index = self._rebuild_hnsw(base_index, new_chunks, to_embed, embeddings)
+            else:
+                try:
+                    new_index = mutable_index_copy(base_index, os.path.join(self.artifact_dir, INDEX_FILE))
+                    if stale_ids:
+                        new_index.remove_ids(np.array(stale_ids, dtype='int64'))
+                    if to_embed:
+                        new_index.add_with_ids(embeddings, np.array([c['id'] for c in to_embed], dtype='int64'))
+                except RuntimeError as e:
+                    print(f"⚠️ Could not update the {dense_index_type(base_index)} index in place ({e}), rebuilding it")
+                    new_index = self._rebuild_dense_index(new_chunks, to_embed, embeddings, progress)
+            
+            self._swap_index(new_index, new_chunks)
+            self.json_path = json_path
+            self.source_hash = compute_file_hash(json_path)
+            self.artifact_dir = index_artifact_dir(json_path)
+            
+            if Config.INDEX_CACHE_ENABLED:
+                self._report("saving", progress=progress)
+                with interprocess_lock(self.artifact_dir):
+                    self._save_index_artifact()
+            
+            stats = {
+                "embedded": len(to_embed),
+                "removed": removed,
+                "unchanged": unchanged,
+                "total_chunks": len(new_chunks),
+                "seconds": round(time.time() - start, 3)
+            }
+            print(f"✅ Incremental re-index: {stats}")
+            return stats
+    
+    def _rebuild_hnsw(self, base_index, new_chunks: List[Dict[str, Any]], to_embed: List[Dict[str, Any]], embeddings):
+        """
+        HNSW graphs cannot drop vectors, so an update rebuilds the graph.
+        Unchanged vectors are read back from the old index (HNSWFlat stores
+        them uncompressed); only new or edited chunks were embedded.
+        """
+        embedded_ids = {c['id'] for c in to_embed}
+        kept_ids = [c['id'] for c in new_chunks if c['id'] not in embedded_ids]
+        parts, ids = [], []
+        if kept_ids:
+            parts.append(np.vstack([base_index.reconstruct(int(chunk_id)) for chunk_id in kept_ids]))
+            ids.extend(kept_ids)
+        if to_embed:
+            parts.append(embeddings)
+            ids.extend(c['id'] for c in to_embed)
+        vectors = np.ascontiguousarray(np.vstack(parts), dtype='float32') if parts else np.zeros((0, base_index.d), dtype='float32')
+        return build_dense_index(vectors, ids, "hnsw")
+    
+    def _rebuild_dense_index(self, new_chunks: List[Dict[str, Any]], to_embed: List[Dict[str, Any]], embeddings,
+                             progress=None):
+        """
+        Fallback when the live index cannot be copied: embed the chunks that
+        were not re-embedded for this update and build a fresh index.
+        """
+        embedded_ids = {c['id'] for c in to_embed}
+        kept = [c for c in new_chunks if c['id'] not in embedded_ids]
+        parts, ids = [], []
+        if kept:
+            parts.append(self._embed_texts([c['text'] for c in kept], progress))
+            ids.extend(c['id'] for c in kept)
+        if to_embed:
+            parts.append(embeddings)
+            ids.extend(c['id'] for c in to_embed)
+        vectors = np.ascontiguousarray(np.vstack(parts), dtype='float32') if parts else np.zeros((0, self.faiss_index.d), dtype='float32')
+        return build_dense_index(vectors, ids)
     
     def _load_and_chunk_json(self):
         """Load JSON and create smart chunks with metadata"""
-        with open(self.json_path, 'r', encoding='utf-8') as f:
+        all_chunks = self._chunk_corpus(self.json_path)
+        for chunk in all_chunks:
+            chunk['id'] = self.next_chunk_id
+            self.next_chunk_id += 1
+        
+        self.chunks_with_meta = all_chunks
+        self.id_to_chunk = {c['id']: c for c in all_chunks}
+        print(f"✅ Created {len(all_chunks)} contextual chunks")
+    
+    def _chunk_corpus(self, json_path: str) -> List[Dict[str, Any]]:
+        """
+        Parse a corpus JSON file into typed, keyed chunks (without index ids)
+        following CORPUS_SCHEMA. Validation results (unmapped fields, type
+        mismatches, laws without a title) are stored in self.schema_report.
+        """
+        with open(json_path, 'r', encoding='utf-8') as f:
             data = json.load(f)
         
+        schema = CORPUS_SCHEMA
+        field_map = schema["fields"]
         all_chunks = []
+        ordinals = {}
+        unmapped = {}
+        type_errors = []
+        missing_title = 0
+        norm_stats = {"strings": 0, "changed": 0, "bytes_before": 0, "bytes_after": 0,
+                      "tokens_before": 0, "tokens_after": 0}
         
         for law in data.get("laws", []):
-            law_name = law.get("name", "Unknown Law")
-            law_desc = law.get("description", "")
+            law_start = len(all_chunks)
+            if Config.NORMALIZE_TEXT:
+                law = self._normalize_value(law, norm_stats)
+            law_name = next((law[f] for f in schema["title_fields"] if law.get(f)), None)
+            if law_name is None:
+                missing_title += 1
+                law_name = "Unknown Law"
+            law_key = str(law.get("law_number", law_name))
             
-            # Create law overview chunk
-            overview_text = f"Law: {law_name}\n\nDescription: {law_desc}"
-            all_chunks.append({
-                "text": overview_text,
-                "law": law_name,
-                "type": "overview",
-                "metadata": {}
-            })
+            header = f"Law: {law_name}"
+            full_title = law.get(schema["full_title_field"])
+            if full_title:
+                header += f"\nFull Title: {full_title}"
             
-            # Process sections
-            for section in law.get("sections", []):
-                section_num = section.get("section_number", "")
-                section_title = section.get("title", "")
-                section_desc = section.get("description", "")
-                
-                section_text = f"Law: {law_name}\nSection {section_num}: {section_title}\n\n{section_desc}"
-                
-                all_chunks.append({
-                    "text": section_text,
-                    "law": law_name,
-                    "type": "section",
-                    "metadata": {
-                        "section_number": section_num,
-                        "section_title": section_title
-                    }
-                })
+            for field in law:
+                if field not in field_map and field not in schema["identity_fields"]:
+                    unmapped[field] = unmapped.get(field, 0) + 1
             
-            # Process case studies
-            for case in law.get("case_studies", []):
-                case_name = case.get("case_name", "")
-                facts = case.get("facts", "")
-                outcome = case.get("outcome", "")
-                significance = case.get("significance", "")
-                
-                case_text = f"""Law: {law_name}
-Case Study: {case_name}
-
-Facts: {facts}
-
-Outcome: {outcome}
-
-Significance: {significance}"""
-                
-                all_chunks.append({
-                    "text": case_text,
-                    "law": law_name,
-                    "type": "case_study",
-                    "metadata": {
-                        "case_name": case_name
-                    }
-                })
+            # Every law gets an overview chunk, even without a description
+            has_overview = any(law.get(f) for f, spec in field_map.items() if spec["type"] == "overview")
+            if not has_overview:
+                all_chunks.append(self._make_chunk(header, law_name, law_key, "overview", {}))
             
-            # Process penalties
-            for penalty in law.get("penalties", []):
-                offense = penalty.get("offense", "")
-                penalty_desc = penalty.get("penalty", "")
+            for field, spec in field_map.items():
+                value = law.get(field)
+                if not value:
+                    continue
                 
-                penalty_text = f"Law: {law_name}\nOffense: {offense}\nPenalty: {penalty_desc}"
+                mode = spec["mode"]
+                if mode == "records" and not (isinstance(value, list) and all(isinstance(v, dict) for v in value)):
+                    type_errors.append(f"law {law_key}: '{field}' should be a list of objects")
+                    mode = "text"
+                if mode == "steps" and not isinstance(value, list):
+                    mode = "text"
                 
-                all_chunks.append({
-                    "text": penalty_text,
-                    "law": law_name,
-                    "type": "penalty",
-                    "metadata": {
-                        "offense": offense
-                    }
-                })
-            
-            # Process procedures
-            for proc in law.get("procedures", []):
-                step = proc.get("step", "")
-                action = proc.get("action", "")
+                if mode == "text":
+                    text = " ".join(str(v) for v in value) if isinstance(value, list) else str(value)
+                    all_chunks.append(self._make_chunk(
+                        f"{header}\n\n{spec['label']}: {text}", law_name, law_key, spec["type"], {"field": field}
+                    ))
                 
-                proc_text = f"Law: {law_name}\nProcedure Step {step}: {action}"
+                elif mode == "steps":
+                    steps = "\n".join(f"Step {i}: {step}" for i, step in enumerate(value, start=1))
+                    all_chunks.append(self._make_chunk(
+                        f"{header}\n{spec['label']}:\n{steps}", law_name, law_key, spec["type"],
+                        {"field": field, "steps": len(value)}
+                    ))
                 
-                all_chunks.append({
-                    "text": proc_text,
-                    "law": law_name,
-                    "type": "procedure",
-                    "metadata": {
-                        "step": step
-                    }
-                })
+                else:
+                    for record in value:
+                        record_title = record.get(spec["title_field"], "")
+                        lines = [f"{header}\n{spec['label']}: {record_title}"]
+                        for key, label in spec["record_fields"].items():
+                            if record.get(key):
+                                lines.append(f"{label}: {record[key]}")
+                        all_chunks.append(self._make_chunk(
+                            "\n\n".join(lines), law_name, law_key, spec["type"],
+                            {"field": field, spec["title_field"]: record_title}
+                        ))
+            
+            # Stable keys let incremental updates match chunks across versions
+            for chunk in all_chunks[law_start:]:
+                ordinal_key = (law_key, chunk['type'])
+                ordinal = ordinals.get(ordinal_key, 0)
+                ordinals[ordinal_key] = ordinal + 1
+                chunk['chunk_key'] = f"{law_key}:{chunk['type']}:{ordinal}"
+                chunk['text_hash'] = chunk_text_hash(chunk['text'])
         
-        self.chunks_with_meta = all_chunks
-        print(f"✅ Created {len(all_chunks)} contextual chunks")
+        chunks_by_type = {}
+        for chunk in all_chunks:
+            chunks_by_type[chunk['type']] = chunks_by_type.get(chunk['type'], 0) + 1
+        
+        self.schema_report = {
+            "laws": len(data.get("laws", [])),
+            "chunks_by_type": chunks_by_type,
+            "unmapped_fields": unmapped,
+            "type_errors": type_errors,
+            "laws_without_title": missing_title
+        }
+        if Config.NORMALIZE_TEXT:
+            saved = norm_stats["bytes_before"] - norm_stats["bytes_after"]
+            norm_stats["bytes_saved"] = saved
+            norm_stats["tokens_saved"] = norm_stats["tokens_before"] - norm_stats["tokens_after"]
+            norm_stats["bytes_saved_pct"] = round(100.0 * saved / norm_stats["bytes_before"], 1) if norm_stats["bytes_before"] else 0.0
+            self.normalization_report = norm_stats
+            print(f"🧹 Normalized corpus text: {norm_stats['changed']}/{norm_stats['strings']} strings cleaned, "
+                  f"{saved} bytes ({norm_stats['bytes_saved_pct']}%) and {norm_stats['tokens_saved']} tokens saved")
+        
+        if unmapped:
+            print(f"⚠️ Unmapped corpus fields (ignored): {unmapped}")
+        if type_errors:
+            print(f"⚠️ Corpus schema mismatches: {type_errors[:5]}{' ...' if len(type_errors) > 5 else ''}")
+        if missing_title:
+            print(f"⚠️ {missing_title} law(s) have no title field ({', '.join(schema['title_fields'])})")
+        print(f"📑 Chunk types: {chunks_by_type}")
+        
+        return all_chunks
+    
+    def _normalize_value(self, value, stats: Dict[str, int]):
+        """Recursively normalize every string in a law record, tallying savings"""
+        if isinstance(value, str):
+            cleaned = normalize_corpus_text(value)
+            stats["strings"] += 1
+            stats["bytes_before"] += len(value.encode('utf-8'))
+            stats["bytes_after"] += len(cleaned.encode('utf-8'))
+            if cleaned != value:
+                stats["changed"] += 1
+                stats["tokens_before"] += self._count_tokens(value)
+                stats["tokens_after"] += self._count_tokens(cleaned)
+            return cleaned
+        if isinstance(value, list):
+            return [self._normalize_value(v, stats) for v in value]
+        if isinstance(value, dict):
+            return {k: self._normalize_value(v, stats) for k, v in value.items()}
+        return value
+    
+    def _count_tokens(self, text: str) -> int:
+        """Token count with the embedder's tokenizer, or a chars/4 estimate"""
+        tokenizer = getattr(self.embedder, "tokenizer", None)
+        if tokenizer is not None:
+            return len(tokenizer.encode(text, add_special_tokens=False))
+        return len(text) // 4
+    
+    def _make_chunk(self, text: str, law_name: str, law_key: str, chunk_type: str, metadata: Dict[str, Any]):
+        return {
+            "text": text,
+            "law": law_name,
+            "type": chunk_type,
+            "metadata": {"law_number": law_key, **metadata}
+        }
     
     def _build_faiss_index(self):
         """Build FAISS index from chunks"""
         chunk_texts = [c['text'] for c in self.chunks_with_meta]
-        embeddings = self.embedder.encode(chunk_texts, show_progress_bar=True)
+        embeddings = self._embed_texts(chunk_texts, self.progress)
         
-        dimension = embeddings.shape[1]
-        self.faiss_index = faiss.IndexFlatIP(dimension)
-        
-        # Normalize embeddings for cosine similarity
-        faiss.normalize_L2(embeddings)
-        self.faiss_index.add(embeddings)
+        self._report("indexing")
+        self.faiss_index = build_dense_index(embeddings, [c['id'] for c in self.chunks_with_meta])
         
-        print(f"✅ FAISS index built with {len(chunk_texts)} chunks")
+        print(f"✅ FAISS {dense_index_type(self.faiss_index)} index built with {len(chunk_texts)} chunks")
     
     def _analyze_query(self, question: str) -> Dict[str, bool]:
         """Analyze what type of information the query needs"""
@@ -297,71 +2507,151 @@ Significance: {significance}"""
             'is_situational': is_situational
         }
     
-    def query(self, question: str, k: int = 5):
-        """Query the system with smart retrieval based on query type"""
-        try:
-            # Analyze query
-            query_info = self._analyze_query(question)
-            
-            # Encode question
-            q_embedding = self.embedder.encode([question])
-            faiss.normalize_L2(q_embedding)
-            
-            # Retrieve chunks
-            scores, indices = self.faiss_index.search(q_embedding, k * 2)
-            
-            retrieved_chunks = []
-            seen_laws = set()
-            sources = set()
-            
-            # Smart filtering based on query type
-            for idx in indices[0]:
-                if idx >= len(self.chunks_with_meta):
-                    continue
-                
-                chunk = self.chunks_with_meta[idx]
-                chunk_type = chunk['type']
-                law_name = chunk['law']
-                
-                # Type-based filtering
-                if query_info['needs_procedure'] and chunk_type != 'procedure':
-                    continue
-                if query_info['needs_cases'] and chunk_type != 'case_study':
-                    continue
-                if query_info['needs_penalties'] and chunk_type != 'penalty':
-                    continue
-                
-                retrieved_chunks.append(chunk)
-                seen_laws.add(law_name)
-                sources.add(law_name)
-                
-                if len(retrieved_chunks) >= k:
-                    break
-            
-            # If we didn't get enough chunks, add more without filtering
-            if len(retrieved_chunks) < k:
-                for idx in indices[0]:
-                    if idx >= len(self.chunks_with_meta):
-                        continue
-                    chunk = self.chunks_with_meta[idx]
-                    if chunk not in retrieved_chunks:
-                        retrieved_chunks.append(chunk)
-                        sources.add(chunk['law'])
-                        if len(retrieved_chunks) >= k:
-                            break
+    def _search_batch(self, questions: List[str], n: int, type_filters: Optional[List[Optional[frozenset]]] = None,
+                      search_params: Optional[List[Optional[Dict[str, int]]]] = None):
+        """
+        Encode several questions in one forward pass and run one batched
+        FAISS search per distinct (type filter, search params) group, fused
+        with BM25 when hybrid retrieval is on. Filters are applied inside the
+        search, so each row holds the best n chunks of its requested types,
+        topped up from an unfiltered search only when fewer than n exist.
+        Returns (q_embeddings, scores, indices, id_to_chunk).
+        """
+        with STAGE_SECONDS.time(stage="embedding"):
+            q_embeddings = self._embed_texts(questions)
+        search_started = time.perf_counter()
+        faiss_index, id_to_chunk, bm25, chunk_filters = self._index_snapshot()
+        if n <= 0:
+            # Nothing to search for; empty rows also have no last slot to test for -1
+            return (q_embeddings, np.zeros((len(questions), 0), dtype='float32'),
+                    np.full((len(questions), 0), -1, dtype='int64'), id_to_chunk)
+        if type_filters is None:
+            type_filters = [None] * len(questions)
+        if search_params is None:
+            search_params = [None] * len(questions)
+        
+        groups = {}
+        for row, (types, params) in enumerate(zip(type_filters, search_params)):
+            allowed = chunk_filters.allowed(types) if types else None
+            key = (types if allowed is not None else None, tuple(sorted((params or {}).items())))
+            groups.setdefault(key, (allowed, params, []))[2].append(row)
+        
+        scores = np.zeros((len(questions), n), dtype='float32')
+        indices = np.full((len(questions), n), -1, dtype='int64')
+        for allowed, params, rows in groups.values():
+            group_questions = [questions[row] for row in rows]
+            allowed_ids, selector = allowed if allowed is not None else (None, None)
+            group_scores, group_indices = self._search_rows(
+                group_questions, q_embeddings[rows], n, faiss_index, bm25, selector, allowed_ids, params
+            )
             
-            sources = sorted(list(sources))
+            short = [i for i, row_indices in enumerate(group_indices) if row_indices[-1] < 0]
+            if allowed is not None and short:
+                extra_scores, extra_indices = self._search_rows(
+                    [group_questions[i] for i in short], q_embeddings[[rows[i] for i in short]], n,
+                    faiss_index, bm25, search_params=params
+                )
+                for j, i in enumerate(short):
+                    self._top_up(group_scores[i], group_indices[i], extra_scores[j], extra_indices[j])
             
-            # Build context
-            context_parts = []
-            for chunk in retrieved_chunks:
-                context_parts.append(f"[{chunk['type'].upper()}]\n{chunk['text']}")
+            scores[rows] = group_scores
+            indices[rows] = group_indices
+        STAGE_SECONDS.observe(time.perf_counter() - search_started, stage="search")
+        return q_embeddings, scores, indices, id_to_chunk
+    
+    def _search_rows(self, questions: List[str], q_embeddings, n: int, faiss_index, bm25,
+                     selector=None, allowed_ids=None, search_params: Optional[Dict[str, int]] = None):
+        """Dense search (restricted to selector when given), fused with BM25 if present"""
+        params = dense_search_params(faiss_index, n, selector, search_params)
+        if params is not None:
+            scores, indices = faiss_index.search(q_embeddings, n, params=params)
+        else:
+            scores, indices = faiss_index.search(q_embeddings, n)
+        if bm25 is not None:
+            scores, indices = self._fuse_with_sparse(questions, indices, bm25, n, allowed_ids)
+        return scores, indices
+    
+    @staticmethod
+    def _top_up(scores, indices, extra_scores, extra_indices):
+        """Fill the empty (-1) tail of a filtered result row, in place, from an unfiltered row"""
+        present = {int(idx) for idx in indices if idx >= 0}
+        col = len(present)
+        for score, idx in zip(extra_scores, extra_indices):
+            if col >= len(indices):
+                break
+            if idx < 0 or int(idx) in present:
+                continue
+            indices[col] = idx
+            scores[col] = score
+            present.add(int(idx))
+            col += 1
+    
+    def _fuse_with_sparse(self, questions: List[str], dense_indices, bm25, n: int, allowed_ids=None):
+        """Reciprocal-rank fusion of dense and BM25 rankings, same shape as a FAISS result"""
+        fused_scores = np.zeros((len(questions), n), dtype='float32')
+        fused_indices = np.full((len(questions), n), -1, dtype='int64')
+        for row, question in enumerate(questions):
+            dense_ranking = [int(i) for i in dense_indices[row] if i >= 0]
+            sparse_ranking = [chunk_id for chunk_id, _ in bm25.search(question, n, allowed_ids)]
+            fused = reciprocal_rank_fusion([dense_ranking, sparse_ranking], k=Config.RRF_K)[:n]
+            for col, (chunk_id, score) in enumerate(fused):
+                fused_indices[row, col] = chunk_id
+                fused_scores[row, col] = score
+        return fused_scores, fused_indices
+    
+    def _retrieve(self, question: str, k: int = 5, search_params: Optional[Dict[str, int]] = None):
+        """Analyze, embed and search; returns (retrieved_chunks, sources, query_info)"""
+        # Analyze query
+        with STAGE_SECONDS.time(stage="analysis"):
+            query_info = self._analyze_query(question)
+        
+        # Encode question and retrieve chunks of the types the query asks for
+        try:
+            _, _, indices, id_to_chunk = self._search_batch(
+                [question], k, [chunk_type_filter(query_info)], [search_params]
+            )
+        except Exception:
+            QUERY_ERRORS.inc(kind="retrieval_error")
+            raise
+        retrieved_chunks, sources = self._select_chunks(indices[0], id_to_chunk, k)
+        
+        return retrieved_chunks, sources, query_info
+    
+    def _select_chunks(self, indices, id_to_chunk: Dict[int, Dict[str, Any]], k: int):
+        """Resolve one row of (already type-filtered) search results to chunks"""
+        retrieved_chunks = []
+        seen_ids = set()
+        sources = set()
+        
+        for idx in indices:
+            idx = int(idx)
+            chunk = id_to_chunk.get(idx)
+            if chunk is None or idx in seen_ids:
+                continue
             
-            context = "\n\n" + "=" * 60 + "\n\n".join(context_parts)
+            seen_ids.add(idx)
+            retrieved_chunks.append(chunk)
+            sources.add(chunk['law'])
             
-            # Select prompt based on query type
-            if query_info['needs_comparison']:
-                system_instruction = """You are SurakshaSetu, a legal awareness assistant.
+            if len(retrieved_chunks) >= k:
+                break
+        
+        sources = sorted(list(sources))
+        
+        return retrieved_chunks, sources
+    
+    def _build_prompt(self, question: str, retrieved_chunks: List[Dict[str, Any]], query_info: Dict[str, bool]) -> str:
+        """Assemble the LLM prompt from retrieved chunks"""
+        # Build context
+        context_parts = []
+        for chunk in retrieved_chunks:
+            context_parts.append(f"[{chunk['type'].upper()}]\n{chunk['text']}")
+        
+        context = "\n\n" + "=" * 60 + "\n\n".join(context_parts)
+        
+        # Select prompt based on query type
+        if query_info['needs_comparison']:
+            system_instruction = """You are SurakshaSetu, a legal awareness assistant.
 
 YOUR MISSION: Compare and contrast different laws clearly and accurately.
 
@@ -401,9 +2691,9 @@ CRITICAL RULES:
 - Use ONLY information from the provided context
 - Do NOT mix up different laws
 - Be very clear about which information belongs to which law"""
-            
-            else:
-                system_instruction = """You are SurakshaSetu, a legal awareness assistant for women and child protection laws.
+        
+        else:
+            system_instruction = """You are SurakshaSetu, a legal awareness assistant for women and child protection laws.
 
 YOUR MISSION:
 - Explain laws in simple, clear language
@@ -443,9 +2733,9 @@ CRITICAL RULES:
 - Do NOT give legal advice
 - If context has case examples, USE THEM
 - If asked for advice, say "consult a qualified lawyer" """
-            
-            # Create full prompt
-            full_prompt = f"""{system_instruction}
+        
+        # Create full prompt
+        full_prompt = f"""{system_instruction}
 
 {"="*80}
 LEGAL CONTEXT FROM DATABASE:
@@ -458,21 +2748,457 @@ USER QUESTION: {question}
 {"="*80}
 
 Provide a clear, helpful answer following ALL the rules above:"""
+        
+        return full_prompt
+    
+    def _add_sources_footer(self, answer: str, sources: List[str]) -> str:
+        """Append the sources footer unless the LLM call failed"""
+        if sources and not answer.startswith("Error") and not answer.startswith("Rate limit"):
+            answer += f"\n\n{'─'*60}\n📚 **Sources**: {', '.join(sources)}"
+        return answer
+    
+    async def query_async(self, question: str, k: int = 5, executor=None, answer_cache=None,
+                          search_params: Optional[Dict[str, int]] = None, governor=None,
+                          deadline: Optional[float] = None):
+        """
+        Answer a question: embedding and FAISS search run in `executor`
+        (a bounded thread pool), the LLM call uses the SDK's async client so the
+        event loop is never blocked by generation or rate-limit backoff.
+        When `answer_cache` is given, cached answers skip generation entirely.
+        `search_params` ({"nprobe": .., "ef_search": ..}) tune ANN indexes.
+        The LLM call goes through `governor`, which raises LLMOverloadedError
+        when it cannot start before `deadline` (time.monotonic()).
+        """
+        try:
+            with STAGE_SECONDS.time(stage="analysis"), trace_span("analysis"):
+                query_info = self._analyze_query(question)
+            
+            # Cache scope: corpus version, k, query type and search params must all match
+            cache_scope = self._cache_scope(query_info, k, search_params)
+            if answer_cache is not None:
+                cached = answer_cache.get_exact(question, cache_scope)
+                if cached is not None:
+                    self._mark_cached()
+                    return cached
             
-            # Call Gemini with retry handling
-            answer = call_gemini_with_retry(self.gemini_client, full_prompt)
+            with trace_span("retrieval"):
+                q_embedding, retrieved_chunks, sources = await self._retrieve_async(
+                    question, query_info, k, executor, search_params
+                )
+            
+            if answer_cache is not None:
+                cached = answer_cache.get_similar(q_embedding, cache_scope)
+                if cached is not None:
+                    self._mark_cached()
+                    return cached
             
-            # Add sources
-            if sources and not answer.startswith("Error") and not answer.startswith("Rate limit"):
-                answer += f"\n\n{'─'*60}\n📚 **Sources**: {', '.join(sources)}"
+            full_prompt = self._assemble_context(question, retrieved_chunks, query_info)
+            
+            with STAGE_SECONDS.time(stage="llm"), trace_span("generation"):
+                answer = await call_llm_with_retry_async(
+                    self.llm_backend, full_prompt, governor=governor, deadline=deadline
+                )
+            failed = answer.startswith(LLM_ERROR_PREFIXES)
+            answer = self._add_sources_footer(answer, sources)
             
-            return answer, sources, query_info, len(retrieved_chunks)
+            result = (answer, sources, query_info, len(retrieved_chunks))
+            if answer_cache is not None and not failed:
+                answer_cache.put(question, q_embedding, cache_scope, result)
+            return result
         
+        except (asyncio.CancelledError, LLMOverloadedError):
+            raise
         except Exception as e:
             import traceback
             error_details = traceback.format_exc()
             print(f"❌ Error in query method:\n{error_details}")
             raise Exception(f"Error querying database: {str(e)}")
+    
+    @staticmethod
+    def _mark_cached():
+        trace = current_trace()
+        if trace is not None:
+            trace.attributes["cached"] = True
+    
+    def _assemble_context(self, question: str, retrieved_chunks: List[Dict[str, Any]], query_info: Dict[str, bool]) -> str:
+        """_build_prompt, timed and traced (with the prompt's token count on verbose traces)"""
+        with STAGE_SECONDS.time(stage="prompt_build"), trace_span("context_assembly") as span:
+            full_prompt = self._build_prompt(question, retrieved_chunks, query_info)
+            if span is not None and span.trace.verbose:
+                span.set(prompt_tokens=self._count_tokens(full_prompt), prompt_chars=len(full_prompt))
+        return full_prompt
+    
+    def _cache_scope(self, query_info: Dict[str, bool], k: int, search_params: Optional[Dict[str, int]] = None):
+        return (self.source_hash, k, tuple(sorted(query_info.items())), tuple(sorted((search_params or {}).items())))
+    
+    async def _retrieve_async(self, question: str, query_info: Dict[str, bool], k: int, executor=None,
+                              search_params: Optional[Dict[str, int]] = None):
+        """Embed + search off the event loop; returns (q_embedding, retrieved_chunks, sources)"""
+        type_filter = chunk_type_filter(query_info)
+        try:
+            if Config.QUERY_BATCHING:
+                # Coalesce with other in-flight questions into one encode + search
+                q_embedding, scores, indices, id_to_chunk = await self._get_batcher(executor).submit(
+                    question, k, type_filter, search_params
+                )
+            else:
+                loop = asyncio.get_running_loop()
+                q_embeddings, batch_scores, batch_indices, id_to_chunk = await loop.run_in_executor(
+                    executor, self._search_batch, [question], k, [type_filter], [search_params]
+                )
+                q_embedding, scores, indices = q_embeddings[0], batch_scores[0], batch_indices[0]
+        except Exception:
+            QUERY_ERRORS.inc(kind="retrieval_error")
+            raise
+        
+        retrieved_chunks, sources = self._select_chunks(indices, id_to_chunk, k)
+        span = _current_span.get()
+        if span is not None and span.name == "retrieval":
+            # Hybrid search returns reciprocal-rank fusion scores, not similarities
+            score_field = "rrf_score" if self.bm25 is not None else "similarity"
+            span.set(
+                batched=Config.QUERY_BATCHING,
+                type_filter=sorted(type_filter) if type_filter else None,
+                chunks=[
+                    {"id": int(idx), score_field: round(float(score), 5),
+                     "law": id_to_chunk[int(idx)]["law"], "type": id_to_chunk[int(idx)]["type"]}
+                    for idx, score in zip(indices, scores) if idx >= 0 and int(idx) in id_to_chunk
+                ][:k]
+            )
+        return q_embedding, retrieved_chunks, sources
+    
+    async def query_stream(self, question: str, k: int = 5, executor=None, answer_cache=None,
+                           max_retries=Config.MAX_RETRIES, search_params: Optional[Dict[str, int]] = None,
+                           governor=None, deadline: Optional[float] = None):
+        """
+        Streaming variant of query_async. Yields (event, payload) pairs:
+        "metadata" as soon as retrieval is done, then "token" fragments from
+        the LLM's streaming API, then "sources" with the footer. Rate limits
+        are retried only until the first token has been sent; a shed call
+        ends with an "error" carrying retry_after.
+        """
+        with STAGE_SECONDS.time(stage="analysis"), trace_span("analysis"):
+            query_info = self._analyze_query(question)
+        cache_scope = self._cache_scope(query_info, k, search_params)
+        
+        cached = answer_cache.get_exact(question, cache_scope) if answer_cache is not None else None
+        if cached is None:
+            with trace_span("retrieval"):
+                q_embedding, retrieved_chunks, sources = await self._retrieve_async(
+                    question, query_info, k, executor, search_params
+                )
+            if answer_cache is not None:
+                cached = answer_cache.get_similar(q_embedding, cache_scope)
+        
+        if cached is not None:
+            self._mark_cached()
+            answer, sources, query_info, chunks_retrieved = cached
+            yield "metadata", {
+                "sources": sources,
+                "query_type": classify_query_type(query_info),
+                "chunks_retrieved": chunks_retrieved,
+                "cached": True
+            }
+            yield "token", {"text": answer}
+            return
+        
+        yield "metadata", {
+            "sources": sources,
+            "query_type": classify_query_type(query_info),
+            "chunks_retrieved": len(retrieved_chunks),
+            "cached": False
+        }
+        
+        full_prompt = self._assemble_context(question, retrieved_chunks, query_info)
+        parts = []
+        llm_started = time.perf_counter()
+        tokens = stream_llm_with_retry(
+            lambda: self.llm_backend.stream_generate_async(full_prompt), full_prompt,
+            max_retries=max_retries, governor=governor, deadline=deadline
+        )
+        with trace_span("generation"):
+            try:
+                # aclosing: a disconnected client releases the governor slot right away
+                async with aclosing(tokens):
+                    async for text in tokens:
+                        parts.append(text)
+                        yield "token", {"text": text}
+            except LLMOverloadedError as e:
+                yield "error", {"detail": str(e), "retry_after": math.ceil(e.retry_after)}
+                return
+            except Exception as e:
+                print(f"❌ LLM streaming error: {str(e)}")
+                QUERY_ERRORS.inc(kind="rate_limit" if is_rate_limit_error(e) else "llm_error")
+                yield "error", {"detail": f"Error: {str(e)}"}
+                return
+        # Includes time the client took to consume tokens, like any streamed response
+        STAGE_SECONDS.observe(time.perf_counter() - llm_started, stage="llm")
+        
+        answer = "".join(parts).strip()
+        footer = self._add_sources_footer(answer, sources)[len(answer):]
+        if footer:
+            yield "sources", {"text": footer}
+        
+        if answer_cache is not None and answer:
+            answer_cache.put(question, q_embedding, cache_scope, (answer + footer, sources, query_info, len(retrieved_chunks)))
+
+# ============================================================================
+# CORPUS REGISTRY (named corpora, background builds, hot swap)
+# ============================================================================
+
+DEFAULT_CORPUS = "default"
+CORPUS_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+class SharedCorpusState:
+    """
+    corpora.json in SHARED_STATE_DIR: the source each corpus was last built
+    from, so a reload on one worker process is picked up by all the others.
+    """
+    
+    FILE = "corpora.json"
+    
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(os.path.abspath(directory), self.FILE)
+    
+    def read(self) -> Dict[str, Dict[str, Any]]:
+        """name -> {"json_path", "source_hash", "updated_at"}; {} if nothing is published"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def publish(self, name: str, json_path: str, source_hash: str):
+        with interprocess_lock(self.path):
+            state = self.read()
+            state[name] = {
+                "json_path": os.path.abspath(json_path),
+                "source_hash": source_hash,
+                "updated_at": time.time()
+            }
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+class CorpusRegistry:
+    """
+    Named corpora (e.g. "central_acts", "state_rules"), each served by its
+    own ImprovedGraphRAGSystem. New versions are built in the background
+    and swapped in only once ready; until then queries keep hitting the
+    version that is already loaded. With a SharedCorpusState, successful
+    builds are published so other worker processes can follow them.
+    """
+    
+    def __init__(self, executor, shared_state: Optional[SharedCorpusState] = None):
+        self.executor = executor
+        self.shared_state = shared_state
+        self._lock = threading.Lock()
+        # name -> {"system", "json_path", "version", "loaded_at", "build"}
+        self._corpora = {}
+        # name -> (json_path, source_hash) last followed from the shared state
+        self._synced = {}
+    
+    def get(self, name: str):
+        """Live system for a corpus, or None if it has never finished building"""
+        with self._lock:
+            entry = self._corpora.get(name)
+            return entry["system"] if entry is not None else None
+    
+    def names(self) -> List[str]:
+        with self._lock:
+            return sorted(self._corpora)
+    
+    def is_building(self, name: str) -> bool:
+        with self._lock:
+            entry = self._corpora.get(name)
+            return entry is not None and entry["build"] is not None and entry["build"]["state"] == "building"
+    
+    def start_build(self, name: str, json_path: str, embedder, llm_backend, incremental: bool = False,
+                    publish: bool = True):
+        """
+        Schedule a build of `name` from `json_path` on the build executor.
+        Incremental builds re-embed only changed chunks of the live version
+        (a full build is used when there is none). Returns an asyncio future
+        resolving to the incremental update stats, or None for a full build.
+        """
+        with self._lock:
+            entry = self._corpora.setdefault(name, {
+                "system": None, "json_path": None, "version": 0, "loaded_at": None, "build": None
+            })
+            if entry["build"] is not None and entry["build"]["state"] == "building":
+                raise RuntimeError(f"Corpus '{name}' is already building")
+            live = entry["system"] if incremental else None
+            build = {
+                "state": "building",
+                "mode": "incremental" if live is not None else "full",
+                "json_path": json_path,
+                "stage": "queued",
+                "progress": 0.0,
+                "started_at": time.time(),
+                "finished_at": None,
+                "error": None,
+                "update": None
+            }
+            entry["build"] = build
+        
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self.executor, self._build, name, build, json_path, embedder, llm_backend, live, publish
+        )
+        # Failures are recorded in the build status; don't warn when nobody awaits
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return future
+    
+    def _build(self, name: str, build: Dict[str, Any], json_path: str, embedder, llm_backend, live,
+               publish: bool = True):
+        def progress(stage: str, fraction: Optional[float] = None):
+            build["stage"] = stage
+            if fraction is not None:
+                build["progress"] = round(fraction, 3)
+        
+        print(f"🔧 Building corpus '{name}' ({build['mode']}) from {json_path}...")
+        try:
+            if live is not None:
+                stats = live.update_from_json(json_path, progress=progress)
+                system = live
+            else:
+                stats = None
+                system = ImprovedGraphRAGSystem(json_path, embedder, llm_backend, progress=progress)
+                system.progress = None
+        except Exception as e:
+            import traceback
+            print(f"❌ Building corpus '{name}' failed:\n{traceback.format_exc()}")
+            with self._lock:
+                build.update(state="failed", error=str(e), finished_at=time.time())
+            raise
+        
+        # Swap: from here on new queries see the new version
+        with self._lock:
+            entry = self._corpora[name]
+            entry["system"] = system
+            entry["json_path"] = json_path
+            entry["version"] += 1
+            entry["loaded_at"] = time.time()
+            build.update(state="ready", stage="ready", progress=1.0, finished_at=time.time(), update=stats)
+            version = entry["version"]
+            self._synced[name] = (os.path.abspath(json_path), system.source_hash)
+        print(f"✅ Corpus '{name}' v{version} ready ({len(system.chunks_with_meta)} chunks, "
+              f"{build['finished_at'] - build['started_at']:.1f}s)")
+        if publish and self.shared_state is not None:
+            self.shared_state.publish(name, json_path, system.source_hash)
+        return stats
+    
+    def sync_from_shared(self, embedder, llm_backend) -> List[str]:
+        """
+        Start builds for corpora another worker has published a different
+        source for. The publisher already wrote the index artifact, so these
+        builds map it from disk instead of re-embedding. Returns their futures.
+        """
+        if self.shared_state is None:
+            return []
+        started = []
+        for name, published in self.shared_state.read().items():
+            target = (published["json_path"], published["source_hash"])
+            with self._lock:
+                if self._synced.get(name) == target:
+                    continue
+                entry = self._corpora.get(name)
+                if entry is not None and entry["build"] is not None and entry["build"]["state"] == "building":
+                    continue
+                # Remember the attempt even if it fails, so a bad source isn't retried every poll
+                self._synced[name] = target
+            print(f"♻️ Corpus '{name}' changed in another worker, reloading from {target[0]}")
+            started.append(self.start_build(name, target[0], embedder, llm_backend, publish=False))
+        return started
+    
+    def status(self, name: str) -> Optional[Dict[str, Any]]:
+        """Serving version and last build of one corpus, or None if unknown"""
+        with self._lock:
+            entry = self._corpora.get(name)
+            if entry is None:
+                return None
+            system = entry["system"]
+            build = dict(entry["build"]) if entry["build"] is not None else None
+            return {
+                "name": name,
+                "ready": system is not None,
+                "version": entry["version"],
+                "json_path": entry["json_path"],
+                "loaded_at": entry["loaded_at"],
+                "num_chunks": len(system.chunks_with_meta) if system is not None else 0,
+                "source_hash": system.source_hash if system is not None else None,
+                "index_type": dense_index_type(system.faiss_index) if system is not None else None,
+                "build": build
+            }
+    
+    def all_status(self) -> List[Dict[str, Any]]:
+        return [self.status(name) for name in self.names()]
+
+async def watch_shared_corpora():
+    """Follow corpus reloads published by other worker processes"""
+    registry = app_state["corpora"]
+    while True:
+        await asyncio.sleep(Config.RELOAD_POLL_SECONDS)
+        try:
+            registry.sync_from_shared(app_state["embedder"], app_state["llm_backend"])
+        except Exception as e:
+            print(f"⚠️ Shared corpus sync failed: {e}")
+
+def get_corpus_system(name: str):
+    """Live system for a corpus, or the HTTP error explaining why there is none"""
+    registry = app_state["corpora"]
+    system = registry.get(name)
+    if system is not None:
+        return system
+    if registry.is_building(name):
+        raise HTTPException(
+            status_code=503,
+            detail=f"Corpus '{name}' is still building. Poll /corpora/{name} for progress."
+        )
+    if name == DEFAULT_CORPUS:
+        raise HTTPException(
+            status_code=400,
+            detail="Legal database not loaded. Please set JSON path or upload JSON file first."
+        )
+    raise HTTPException(status_code=404, detail=f"Corpus '{name}' not found")
+
+def require_models():
+    """503 until the background loader has the embedder and LLM backend ready"""
+    if app_state["embedder"] is None or app_state["llm_backend"] is None:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Models are still loading ({app_state['startup']['state']}). Check /ready."
+        )
+
+def validate_corpus_name(name: str):
+    if not CORPUS_NAME_PATTERN.match(name):
+        raise HTTPException(status_code=400, detail="Corpus name must be 1-64 letters, digits, '_' or '-'")
+    if app_state["corpora"].is_building(name):
+        raise HTTPException(status_code=409, detail=f"Corpus '{name}' is already building")
+
+def classify_query_type(query_info: Dict[str, bool]) -> str:
+    """Map _analyze_query flags to the query_type reported to clients"""
+    if query_info.get('is_situational'):
+        return "situational"
+    elif query_info.get('needs_comparison'):
+        return "comparison"
+    elif query_info.get('needs_procedure'):
+        return "procedure"
+    elif query_info.get('needs_cases'):
+        return "case_based"
+    return "general"
+
+def search_params_from_request(request: QueryRequest) -> Optional[Dict[str, int]]:
+    """Per-request ANN search parameters that were set, or None for the defaults"""
+    params = {"nprobe": request.nprobe, "ef_search": request.ef_search}
+    params = {name: value for name, value in params.items() if value is not None}
+    return params or None
+
+def format_sse(event: str, payload: Dict[str, Any]) -> str:
+    """Encode one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
 
 # ============================================================================
 # API ENDPOINTS - ORIGINAL FUNCTIONALITY PRESERVED
@@ -484,27 +3210,45 @@ async def root():
     return {
         "status": "online",
         "message": "SurakshaSetu Legal RAG API is running on port 3000",
-        "json_loaded": app_state["graphrag_system"] is not None,
-        "model_loaded": app_state["embedder"] is not None and app_state["gemini_client"] is not None
+        "json_loaded": app_state["corpora"].get(DEFAULT_CORPUS) is not None,
+        "model_loaded": app_state["embedder"] is not None and app_state["llm_backend"] is not None
     }
 
 @app.post("/set-json-path", response_model=StatusResponse)
-async def set_json_path(config: ConfigRequest):
-    """Set the path to the legal JSON database"""
+async def set_json_path(config: ConfigRequest, response: Response):
+    """
+    Set the path to the legal JSON database of a corpus. The current version
+    keeps serving queries until the new one is built; with wait=false the
+    build runs in the background (poll /corpora/{name}).
+    """
+    require_models()
+    if not os.path.exists(config.json_path):
+        raise HTTPException(status_code=404, detail=f"JSON file not found at: {config.json_path}")
+    validate_corpus_name(config.corpus)
+    
     try:
-        if not os.path.exists(config.json_path):
-            raise HTTPException(status_code=404, detail=f"JSON file not found at: {config.json_path}")
-        
-        Config.JSON_DATA_PATH = config.json_path
-        app_state["graphrag_system"] = ImprovedGraphRAGSystem(
+        if config.corpus == DEFAULT_CORPUS:
+            Config.JSON_DATA_PATH = config.json_path
+        build = app_state["corpora"].start_build(
+            config.corpus,
             config.json_path,
             app_state["embedder"],
-            app_state["gemini_client"]
+            app_state["llm_backend"]
         )
         
+        if not config.wait:
+            response.status_code = 202
+            return {
+                "status": "building",
+                "message": f"Building corpus '{config.corpus}' from {config.json_path} in the background",
+                "json_loaded": app_state["corpora"].get(config.corpus) is not None,
+                "model_loaded": True
+            }
+        
+        await build
         return {
             "status": "success",
-            "message": f"Legal database loaded successfully from {config.json_path}",
+            "message": f"Legal database '{config.corpus}' loaded successfully from {config.json_path}",
             "json_loaded": True,
             "model_loaded": True
         }
@@ -513,75 +3257,198 @@ async def set_json_path(config: ConfigRequest):
         raise HTTPException(status_code=500, detail=f"Error loading JSON: {str(e)}")
 
 @app.post("/upload-json")
-async def upload_json(file: UploadFile = File(...)):
-    """Upload a JSON file and load it into the system"""
+async def upload_json(response: Response, file: UploadFile = File(...), corpus: str = DEFAULT_CORPUS, wait: bool = True):
+    """
+    Upload a JSON file and load it into a corpus (?corpus=name, default
+    "default"). A loaded corpus is updated incrementally; with ?wait=false
+    the build runs in the background while the old version keeps serving.
+    """
+    require_models()
+    validate_corpus_name(corpus)
     try:
         # Save uploaded file
-        upload_dir = "uploads"
+        upload_dir = "uploads" if corpus == DEFAULT_CORPUS else os.path.join("uploads", corpus)
         os.makedirs(upload_dir, exist_ok=True)
         
-        file_path = os.path.join(upload_dir, file.filename)
+        file_path = os.path.join(upload_dir, os.path.basename(file.filename))
         
         with open(file_path, "wb") as f:
             content = await file.read()
             f.write(content)
         
-        # Load into GraphRAG system
-        Config.JSON_DATA_PATH = file_path
-        app_state["graphrag_system"] = ImprovedGraphRAGSystem(
+        # Load into GraphRAG system: re-embed only changed chunks if already loaded
+        if corpus == DEFAULT_CORPUS:
+            Config.JSON_DATA_PATH = file_path
+        build = app_state["corpora"].start_build(
+            corpus,
             file_path,
             app_state["embedder"],
-            app_state["gemini_client"]
+            app_state["llm_backend"],
+            incremental=True
         )
         
+        if not wait:
+            response.status_code = 202
+            return {
+                "status": "building",
+                "message": f"JSON file '{file.filename}' uploaded; building corpus '{corpus}' in the background",
+                "json_loaded": app_state["corpora"].get(corpus) is not None,
+                "model_loaded": True,
+                "file_path": file_path,
+                "corpus": corpus
+            }
+        
+        update_stats = await build
         return {
             "status": "success",
             "message": f"JSON file '{file.filename}' uploaded and loaded successfully",
             "json_loaded": True,
             "model_loaded": True,
-            "file_path": file_path
+            "file_path": file_path,
+            "corpus": corpus,
+            "update": update_stats
         }
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading JSON: {str(e)}")
 
+@app.get("/corpora")
+async def list_corpora():
+    """Serving version and build status/progress of every corpus"""
+    return {"corpora": app_state["corpora"].all_status()}
+
+@app.get("/corpora/{name}")
+async def get_corpus(name: str):
+    """Serving version and build status/progress of one corpus"""
+    status = app_state["corpora"].status(name)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Corpus '{name}' not found")
+    return status
+
 @app.post("/query", response_model=QueryResponse)
-async def query_legal_database(request: QueryRequest):
-    """Query the legal database with a question"""
-    if app_state["graphrag_system"] is None:
-        raise HTTPException(
-            status_code=400,
-            detail="Legal database not loaded. Please set JSON path or upload JSON file first."
-        )
+async def query_legal_database(request: QueryRequest, response: Response):
+    """
+    Query the legal database with a question. Every request is traced
+    (X-Trace-Id); with `debug` the response also carries per-stage timings,
+    the retrieved chunk ids with scores and the prompt token count.
+    """
+    system = get_corpus_system(request.corpus)
+    trace = start_trace("query", verbose=request.debug, corpus=request.corpus, k=request.k)
+    response.headers["X-Trace-Id"] = trace.trace_id
+    status = "error"
+    deadline = time.monotonic() + Config.QUERY_TIMEOUT
     
     try:
-        answer, sources, query_info, chunks_retrieved = app_state["graphrag_system"].query(
-            request.question,
-            k=request.k
+        answer, sources, query_info, chunks_retrieved = await asyncio.wait_for(
+            system.query_async(
+                request.question,
+                k=request.k,
+                executor=app_state["query_executor"],
+                answer_cache=app_state["answer_cache"],
+                search_params=search_params_from_request(request),
+                governor=app_state["llm_governor"],
+                deadline=deadline
+            ),
+            timeout=Config.QUERY_TIMEOUT
         )
-        
-        query_type = "general"
-        if query_info.get('is_situational'):
-            query_type = "situational"
-        elif query_info.get('needs_comparison'):
-            query_type = "comparison"
-        elif query_info.get('needs_procedure'):
-            query_type = "procedure"
-        elif query_info.get('needs_cases'):
-            query_type = "case_based"
+        status = "ok"
         
         return {
             "answer": answer,
             "sources": sources,
-            "query_type": query_type,
-            "chunks_retrieved": chunks_retrieved
+            "query_type": classify_query_type(query_info),
+            "chunks_retrieved": chunks_retrieved,
+            "trace_id": trace.trace_id,
+            "debug": trace.debug_summary() if request.debug else None
         }
     
+    except LLMOverloadedError as e:
+        status = "overloaded"
+        raise HTTPException(
+            status_code=503,
+            detail=f"{e}. Please retry after {math.ceil(e.retry_after)}s.",
+            headers={"Retry-After": str(math.ceil(e.retry_after)), "X-Trace-Id": trace.trace_id}
+        )
+    except asyncio.TimeoutError:
+        QUERY_ERRORS.inc(kind="timeout")
+        status = "timeout"
+        raise HTTPException(
+            status_code=504,
+            detail=f"Query timed out after {Config.QUERY_TIMEOUT:.0f}s. Please try again.",
+            headers={"X-Trace-Id": trace.trace_id}
+        )
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
         print(f"❌ Error processing query:\n{error_details}")
-        raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing query: {str(e)}",
+            headers={"X-Trace-Id": trace.trace_id}
+        )
+    finally:
+        finish_trace(trace, status)
+
+@app.post("/query/stream")
+async def query_legal_database_stream(request: QueryRequest):
+    """
+    Stream the answer as server-sent events: `metadata` (sources, query_type,
+    chunks_retrieved) right after retrieval, `token` events while the LLM
+    generates, then `sources` (footer) and `done`. Failures arrive as `error`.
+    """
+    system = get_corpus_system(request.corpus)
+    trace_id = uuid.uuid4().hex
+    
+    async def event_stream():
+        deadline = time.monotonic() + Config.QUERY_TIMEOUT
+        # Started here, not in the endpoint: the body is iterated in its own context
+        trace = start_trace("query_stream", verbose=request.debug, trace_id=trace_id, corpus=request.corpus, k=request.k)
+        status = "error"
+        stream = system.query_stream(
+            request.question,
+            k=request.k,
+            executor=app_state["query_executor"],
+            answer_cache=app_state["answer_cache"],
+            search_params=search_params_from_request(request),
+            governor=app_state["llm_governor"],
+            deadline=deadline
+        )
+        try:
+            async with aclosing(stream):
+                while True:
+                    # Bound every step, not just the gaps between yields: a stalled
+                    # retrieval or first token would otherwise never hit the deadline
+                    try:
+                        event, payload = await asyncio.wait_for(stream.__anext__(), timeout=max(deadline - time.monotonic(), 0))
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        QUERY_ERRORS.inc(kind="timeout")
+                        status = "timeout"
+                        yield format_sse("error", {"detail": f"Query timed out after {Config.QUERY_TIMEOUT:.0f}s. Please try again."})
+                        return
+                    yield format_sse(event, payload)
+                    if event == "error":
+                        if "retry_after" in payload:
+                            status = "overloaded"
+                        return
+            status = "ok"
+            done = {"trace_id": trace_id}
+            if request.debug:
+                done["debug"] = trace.debug_summary()
+            yield format_sse("done", done)
+        except Exception as e:
+            import traceback
+            print(f"❌ Error processing streamed query:\n{traceback.format_exc()}")
+            yield format_sse("error", {"detail": f"Error processing query: {str(e)}"})
+        finally:
+            finish_trace(trace, status)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Trace-Id": trace_id}
+    )
 
 @app.get("/status", response_model=StatusResponse)
 async def get_status():
@@ -589,15 +3456,37 @@ async def get_status():
     return {
         "status": "online",
         "message": "System operational",
-        "json_loaded": app_state["graphrag_system"] is not None,
-        "model_loaded": app_state["embedder"] is not None and app_state["gemini_client"] is not None
+        "json_loaded": app_state["corpora"].get(DEFAULT_CORPUS) is not None,
+        "model_loaded": app_state["embedder"] is not None and app_state["llm_backend"] is not None
     }
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
+    """Liveness probe: answers as soon as the process is up, before models load"""
     return {"status": "healthy", "port": 3000}
 
+@app.get("/ready")
+async def readiness_check(response: Response):
+    """Readiness probe: 200 once models (and JSON_DATA_PATH, if set) are loaded, 503 until then"""
+    startup = app_state["startup"]
+    ready = startup["state"] == "ready"
+    if not ready:
+        response.status_code = 503
+    return {
+        "ready": ready,
+        "state": startup["state"],
+        "error": startup["error"]
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus scrape endpoint: request and error counters, per-stage query
+    latency histograms, LLM retries/backoff and per-corpus index gauges.
+    Each worker process reports its own metrics.
+    """
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # ============================================================================
 # ADDITIONAL TEST ENDPOINTS (from testing_file.py functionality)
 # ============================================================================
@@ -717,36 +3606,116 @@ async def get_server_info():
     Get detailed server information
     Provides information about the running server, loaded models, and configuration
     """
+    system = app_state["corpora"].get(DEFAULT_CORPUS)
     return {
         "server": {
             "title": "SurakshaSetu Legal RAG API - Combined Backend",
             "version": "2.0.0",
             "port": 3000,
-            "host": "localhost"
+            "host": "localhost",
+            "pid": os.getpid(),
+            "shared_state_dir": Config.SHARED_STATE_DIR,
+            "index_mmap": index_mmap_mode(),
+            "memory_mb": process_memory_mb()
         },
         "models": {
             "embedding_model": Config.EMBEDDING_MODEL,
+            "embedding_backend": Config.EMBEDDING_BACKEND,
             "llm_model": Config.GEMINI_MODEL,
-            "sdk_version": "new" if USING_NEW_SDK else "legacy"
+            "llm_backend": Config.LLM_BACKEND,
+            "sdk_version": (
+                "not loaded" if USING_NEW_SDK is None
+                else "new" if USING_NEW_SDK else "legacy" if genai is not None else "none"
+            )
+        },
+        "startup": {
+            **app_state["startup"],
+            "heavy_imports_seconds": dict(IMPORT_TIMES)
         },
+        "query_pipeline": {
+            "workers": Config.QUERY_WORKERS,
+            "timeout_seconds": Config.QUERY_TIMEOUT,
+            "batching": {
+                "enabled": Config.QUERY_BATCHING,
+                "window_ms": Config.QUERY_BATCH_WINDOW_MS,
+                "max_batch": Config.QUERY_BATCH_MAX,
+                **(
+                    system._batcher.stats()
+                    if system is not None and system._batcher is not None
+                    else {}
+                )
+            }
+        },
+        "answer_cache": (
+            app_state["answer_cache"].stats()
+            if app_state["answer_cache"] is not None else {"enabled": False}
+        ),
+        "llm_governor": app_state["llm_governor"].stats(),
+        "tracing": {
+            "trace_file": Config.TRACE_FILE,
+            "max_mb": Config.TRACE_FILE_MAX_MB
+        },
+        "corpora": app_state["corpora"].all_status(),
         "state": {
             "embedder_loaded": app_state["embedder"] is not None,
-            "gemini_loaded": app_state["gemini_client"] is not None,
-            "database_loaded": app_state["graphrag_system"] is not None,
-            "database_path": Config.JSON_DATA_PATH
+            "llm_loaded": app_state["llm_backend"] is not None,
+            "database_loaded": system is not None,
+            "database_path": Config.JSON_DATA_PATH,
+            "index_artifact": (
+                system.artifact_dir
+                if system is not None and Config.INDEX_CACHE_ENABLED else None
+            ),
+            "index_loaded_from_cache": (
+                system.loaded_from_cache
+                if system is not None else False
+            ),
+            "corpus_schema": (
+                system.schema_report
+                if system is not None else None
+            ),
+            "hybrid_retrieval": {
+                "enabled": Config.HYBRID_RETRIEVAL,
+                "rrf_k": Config.RRF_K,
+                "bm25_terms": (
+                    len(system.bm25.postings)
+                    if system is not None and system.bm25 is not None else 0
+                )
+            },
+            "text_normalization": (
+                system.normalization_report
+                if system is not None else None
+            ),
+            "chunk_types": (
+                system.chunk_filters.counts()
+                if system is not None else None
+            ),
+            "dense_index": {
+                "configured": dense_index_spec(),
+                "type": (
+                    dense_index_type(system.faiss_index)
+                    if system is not None else None
+                ),
+                "default_nprobe": Config.IVF_NPROBE,
+                "default_ef_search": Config.HNSW_EF_SEARCH
+            }
         },
         "endpoints": {
             "main": {
                 "GET /": "Check API status",
-                "GET /health": "Health check",
-                "GET /status": "System status"
+                "GET /health": "Liveness check",
+                "GET /ready": "Readiness check (models and index loaded)",
+                "GET /status": "System status",
+                "GET /metrics": "Prometheus metrics (counters, stage latency histograms, index gauges)"
             },
             "data_management": {
                 "POST /set-json-path": "Set JSON database path",
-                "POST /upload-json": "Upload JSON database file"
+                "POST /upload-json": "Upload JSON database file",
+                "GET /corpora": "Per-corpus version and build progress",
+                "GET /corpora/{name}": "One corpus' version and build progress"
             },
             "query": {
-                "POST /query": "Query the legal database"
+                "POST /query": "Query the legal database",
+                "POST /query/stream": "Query with a server-sent event stream of answer tokens"
             },
             "testing": {
                 "GET /test/all-endpoints": "Test all endpoints",
@@ -770,6 +3739,8 @@ async def get_server_info():
         }
     }
 
+app_state["startup"]["module_import_seconds"] = round(time.perf_counter() - MODULE_IMPORT_STARTED, 3)
+
 # ============================================================================
 # SERVER STARTUP
 # ============================================================================
@@ -781,15 +3752,18 @@ if __name__ == "__main__":
     print("="*80)
     print("\n📋 Available endpoints:")
     print("   • http://localhost:3000/          - API Status")
-    print("   • http://localhost:3000/health    - Health Check")
+    print("   • http://localhost:3000/health    - Health Check (liveness)")
+    print("   • http://localhost:3000/ready     - Readiness Check")
     print("   • http://localhost:3000/status    - System Status")
     print("   • http://localhost:3000/info      - Server Info")
+    print("   • http://localhost:3000/metrics   - Prometheus Metrics")
     print("   • http://localhost:3000/docs      - API Documentation (Swagger)")
     print("\n🧪 Testing endpoints:")
     print("   • http://localhost:3000/test/all-endpoints  - Run all tests")
     print("   • http://localhost:3000/test/sample-queries - Get sample queries")
     print("\n💬 Query endpoint:")
     print("   • POST http://localhost:3000/query - Ask legal questions")
+    print("   • POST http://localhost:3000/query/stream - Ask with streamed (SSE) answers")
     print("\n" + "="*80 + "\n")
     
     uvicorn.run(app, host="0.0.0.0", port=3000)
@@ -0,0 +1,222 @@
+"""
+ONNX Embedding Export for SurakshaSetu Legal RAG System
+Exports the sentence-transformers embedding model to ONNX (fp32 and int8
+dynamic-quantized) for EMBEDDING_BACKEND=onnx / onnx-int8, checks that its
+embeddings match PyTorch (cosine similarity floor) and benchmarks load time,
+encode latency and memory of each backend in a fresh process.
+
+Usage:
+    python export_onnx_embedder.py                 # export, parity, bench
+    python export_onnx_embedder.py export
+    python export_onnx_embedder.py parity --floor 0.98
+    python export_onnx_embedder.py bench --output embedder_bench.json
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from typing import Dict, Any, List
+
+import numpy as np
+
+from combined_backend import (
+    Config, EMBEDDING_BACKENDS, ONNX_FILE, ONNX_INT8_FILE, ONNX_META_FILE,
+    create_embedder, onnx_model_dir
+)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(HERE, "RAG_SurakshaSetu_FULL.json")
+DEFAULT_QUERIES = os.path.join(HERE, "benchmark_queries.json")
+
+def export(out_dir: str, opset: int = 14):
+    """Export the transformer to ONNX, save the tokenizer, then int8-quantize it"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    
+    os.makedirs(out_dir, exist_ok=True)
+    model = SentenceTransformer(Config.EMBEDDING_MODEL, device="cpu")
+    transformer = model[0].auto_model.eval()
+    
+    pooling = model[1]
+    if not getattr(pooling, "pooling_mode_mean_tokens", False):
+        raise SystemExit(f"❌ {Config.EMBEDDING_MODEL} does not use mean pooling; OnnxEmbedder cannot reproduce it")
+    
+    sample = model.tokenizer(["export sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    
+    fp32_path = os.path.join(out_dir, ONNX_FILE)
+    print(f"🔧 Exporting {Config.EMBEDDING_MODEL} to {fp32_path}...")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset
+        )
+    model.tokenizer.save_pretrained(out_dir)
+    
+    meta = {
+        "model": Config.EMBEDDING_MODEL,
+        "max_seq_length": model.max_seq_length,
+        "dimension": model.get_sentence_embedding_dimension(),
+        "normalize": any(type(module).__name__ == "Normalize" for module in model),
+        "opset": opset,
+        "exported_at": time.time()
+    }
+    with open(os.path.join(out_dir, ONNX_META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    
+    int8_path = os.path.join(out_dir, ONNX_INT8_FILE)
+    print(f"🔧 Quantizing weights to int8 → {int8_path}...")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    
+    for path in (fp32_path, int8_path):
+        print(f"✅ {os.path.basename(path)}: {os.path.getsize(path) / (1024 * 1024):.1f} MB")
+
+def sample_texts(corpus_path: str, queries_path: str, limit: int) -> List[str]:
+    """Benchmark questions plus corpus passages (short and long) to compare embeddings on"""
+    with open(queries_path, 'r', encoding='utf-8') as f:
+        texts = [item["question"] for item in json.load(f)["questions"]]
+    with open(corpus_path, 'r', encoding='utf-8') as f:
+        laws = json.load(f)["laws"]
+    for law in laws:
+        for field in ("description", "punishments", "protection_orders", "who_can_file"):
+            value = law.get(field)
+            if isinstance(value, str) and value.strip():
+                texts.append(value)
+    return texts[:limit]
+
+def parity(texts: List[str], floor: float) -> Dict[str, Any]:
+    """Cosine similarity of each onnx backend's embeddings against PyTorch's"""
+    reference = np.asarray(create_embedder("torch").encode(texts), dtype='float32')
+    reference /= np.linalg.norm(reference, axis=1, keepdims=True)
+    
+    report = {"texts": len(texts), "floor": floor, "backends": {}}
+    for backend in EMBEDDING_BACKENDS[1:]:
+        embeddings = create_embedder(backend).encode(texts)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        cosine = (embeddings * reference).sum(axis=1)
+        report["backends"][backend] = {
+            "min_cosine": round(float(cosine.min()), 5),
+            "mean_cosine": round(float(cosine.mean()), 5),
+            "p1_cosine": round(float(np.percentile(cosine, 1)), 5),
+            "passed": bool(cosine.min() >= floor)
+        }
+        status = "✅" if cosine.min() >= floor else "❌"
+        print(f"{status} {backend}: min cosine {cosine.min():.5f}, mean {cosine.mean():.5f} (floor {floor})")
+    return report
+
+def current_rss_mb() -> float:
+    """Resident set size now (Linux), or peak RSS elsewhere"""
+    try:
+        with open("/proc/self/status", 'r') as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 if sys.platform != "darwin" else 1024 * 1024)
+
+def measure(backend: str, texts: List[str], repeat: int) -> Dict[str, Any]:
+    """Load one backend and time it; meant to run in its own process so RSS is not shared"""
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    embedder = create_embedder(backend)
+    load_s = time.perf_counter() - start
+    rss_loaded = current_rss_mb()
+    
+    embedder.encode(texts[:1])  # warm-up
+    single_ms = []
+    for _ in range(repeat):
+        for text in texts:
+            start = time.perf_counter()
+            embedder.encode([text])
+            single_ms.append((time.perf_counter() - start) * 1000)
+    
+    start = time.perf_counter()
+    embedder.encode(texts, batch_size=32)
+    batch_s = time.perf_counter() - start
+    
+    values = np.array(single_ms)
+    return {
+        "backend": backend,
+        "load_seconds": round(load_s, 3),
+        "rss_model_mb": round(rss_loaded - rss_before, 1),
+        "rss_total_mb": round(current_rss_mb(), 1),
+        "single_ms": {
+            "p50": round(float(np.percentile(values, 50)), 3),
+            "p95": round(float(np.percentile(values, 95)), 3),
+            "p99": round(float(np.percentile(values, 99)), 3)
+        },
+        "batch_texts_per_second": round(len(texts) / batch_s, 1)
+    }
+
+def bench(args) -> List[Dict[str, Any]]:
+    """Run `measure` for every backend in a fresh interpreter"""
+    results = []
+    for backend in EMBEDDING_BACKENDS:
+        print(f"🔧 Measuring {backend}...")
+        output = subprocess.check_output([
+            sys.executable, os.path.abspath(__file__), "measure", "--backend", backend,
+            "--out-dir", args.out_dir, "--corpus", args.corpus, "--queries", args.queries,
+            "--limit", str(args.limit), "--repeat", str(args.repeat)
+        ], cwd=HERE)
+        results.append(json.loads(output.decode().strip().splitlines()[-1]))
+    
+    print("\n" + "=" * 80)
+    print(f"{'backend':<12}{'load s':>10}{'model MB':>10}{'p50 ms':>10}{'p95 ms':>10}{'batch/s':>12}")
+    for r in results:
+        print(f"{r['backend']:<12}{r['load_seconds']:>10}{r['rss_model_mb']:>10}"
+              f"{r['single_ms']['p50']:>10}{r['single_ms']['p95']:>10}{r['batch_texts_per_second']:>12}")
+    print("=" * 80)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Export, verify and benchmark the ONNX embedding backends")
+    parser.add_argument("command", nargs="?", default="all", choices=["all", "export", "parity", "bench", "measure"])
+    parser.add_argument("--out-dir", default=onnx_model_dir(), help="Export directory (defaults to ONNX_MODEL_DIR)")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="Corpus JSON used for sample passages")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES, help="Question set used for sample queries")
+    parser.add_argument("--limit", type=int, default=256, help="Number of sample texts")
+    parser.add_argument("--floor", type=float, default=0.98, help="Minimum cosine similarity to PyTorch per text")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the sample texts for latency")
+    parser.add_argument("--backend", choices=EMBEDDING_BACKENDS, help="Backend for the internal `measure` command")
+    parser.add_argument("--output", default="embedder_bench.json", help="Where to save parity + bench results")
+    args = parser.parse_args()
+    
+    Config.ONNX_MODEL_DIR = args.out_dir
+    # Export alone does not need the corpus
+    texts = sample_texts(args.corpus, args.queries, args.limit) if args.command != "export" else []
+    
+    if args.command == "measure":
+        print(json.dumps(measure(args.backend, texts, args.repeat)))
+        return
+    
+    results = {"model": Config.EMBEDDING_MODEL, "model_dir": args.out_dir}
+    if args.command in ("all", "export"):
+        export(args.out_dir)
+    if args.command in ("all", "parity"):
+        results["parity"] = parity(texts, args.floor)
+    if args.command in ("all", "bench"):
+        results["bench"] = bench(args)
+    
+    if args.command != "export":
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results saved to {args.output}")
+    
+    if "parity" in results and not all(b["passed"] for b in results["parity"]["backends"].values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Multi-worker launcher for the SurakshaSetu Legal RAG API
+Runs N uvicorn worker processes on one port. Workers share the on-disk
+index artifact (memory-mapped, built once under a file lock), follow each
+other's corpus reloads through SHARED_STATE_DIR and, with --embed-server,
+use a single embedding model process instead of loading one each.
+
+Index vectors are only shared on FAISS versions with IO_FLAG_MMAP_IFC;
+older ones map IVF lists alone, so each worker holds its own copy of flat
+and HNSW vectors. GET /info reports the mode and each worker's rss_anon
+(private) and rss_file (shared) memory.
+
+Usage:
+    python serve_workers.py --workers 4
+    python serve_workers.py --workers 4 --embed-server --embed-threads 4
+"""
+
+import argparse
+import multiprocessing
+import os
+import secrets
+import time
+
+import uvicorn
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def start_embedding_server(address: str, authkey: str, backend: str, threads: int) -> multiprocessing.Process:
+    """Start the shared embedding process and wait until it accepts connections"""
+    from combined_backend import EmbeddingManager, parse_address, run_embedding_server
+    
+    process = multiprocessing.Process(
+        target=run_embedding_server,
+        args=(address, authkey.encode(), backend, threads),
+        name="embedding-server",
+        daemon=True
+    )
+    process.start()
+    
+    EmbeddingManager.register("embedder")
+    while True:
+        if not process.is_alive():
+            raise SystemExit(f"❌ Embedding server exited with code {process.exitcode}")
+        try:
+            EmbeddingManager(address=parse_address(address), authkey=authkey.encode()).connect()
+            return process
+        except (ConnectionError, OSError):
+            time.sleep(0.5)
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the combined backend with multiple worker processes")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WORKERS", "2")), help="Uvicorn worker processes")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=3000)
+    parser.add_argument("--shared-dir", default=os.getenv("SHARED_STATE_DIR", os.path.join(HERE, ".shared_state")),
+                        help="Directory where workers publish corpus reloads")
+    parser.add_argument("--embed-server", action="store_true",
+                        help="Load the embedding model once in a separate process shared by all workers")
+    parser.add_argument("--embed-backend", default=os.getenv("EMBEDDING_BACKEND", "torch"),
+                        help="Embedding backend the shared server runs")
+    parser.add_argument("--embed-address", default=os.getenv("EMBED_SERVER_ADDRESS", "127.0.0.1:3100"))
+    parser.add_argument("--embed-threads", type=int, default=int(os.getenv("EMBED_SERVER_THREADS", "4")),
+                        help="Concurrent encodes on the embedding server")
+    args = parser.parse_args()
+    
+    # Workers re-import combined_backend, so configuration goes through the environment
+    os.environ["INDEX_CACHE_ENABLED"] = "1"
+    os.environ["INDEX_MMAP"] = "1"
+    os.environ["SHARED_STATE_DIR"] = os.path.abspath(args.shared_dir)
+    
+    embed_server = None
+    if args.embed_server:
+        authkey = secrets.token_hex(16)
+        print(f"🔧 Starting shared embedding server ({args.embed_backend}) on {args.embed_address}...")
+        embed_server = start_embedding_server(args.embed_address, authkey, args.embed_backend, args.embed_threads)
+        os.environ.update({
+            "EMBEDDING_BACKEND": "remote",
+            "EMBED_SERVER_ADDRESS": args.embed_address,
+            "EMBED_SERVER_AUTHKEY": authkey,
+            "EMBED_SERVER_BACKEND": args.embed_backend
+        })
+    
+    print(f"🚀 Starting {args.workers} workers on http://{args.host}:{args.port}")
+    try:
+        uvicorn.run("combined_backend:app", host=args.host, port=args.port, workers=args.workers, app_dir=HERE)
+    finally:
+        if embed_server is not None:
+            embed_server.terminate()
+
+if __name__ == "__main__":
+    main()
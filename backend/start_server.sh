@@ -54,8 +54,10 @@ fi
 echo "✅ All required packages are installed"
 echo ""
 
-# Check for Gemini API key
-if [ -z "$GEMINI_API_KEY" ]; then
+# Check for Gemini API key (not needed for the local stub backend)
+if [ "$LLM_BACKEND" = "stub" ]; then
+    echo "LLM_BACKEND=stub: using the local stub LLM, no API key required"
+elif [ -z "$GEMINI_API_KEY" ]; then
     echo "GEMINI_API_KEY environment variable not set"
     read -p "Enter your Gemini API key (or press Enter to use default): " api_key
     if [ -n "$api_key" ]; then
@@ -81,5 +83,9 @@ echo ""
 echo "=========================================="
 echo ""
 
-# Start the server
-python3 combined_backend.py
+# Start the server (WORKERS>1: several processes sharing the index, see serve_workers.py)
+if [ "${WORKERS:-1}" -gt 1 ]; then
+    python3 serve_workers.py --workers "$WORKERS" ${EMBED_SERVER:+--embed-server}
+else
+    python3 combined_backend.py
+fi
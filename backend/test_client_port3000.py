@@ -6,6 +6,7 @@ Includes comprehensive error handling and status checks
 
 import requests
 import json
+import time
 from typing import Dict, Any, Optional
 import sys
 
@@ -46,15 +47,20 @@ class LegalRAGClient:
         response = requests.get(f"{self.base_url}/")
         return self._handle_response(response)
     
-    def set_json_path(self, json_path: str) -> Dict[str, Any]:
+    def set_json_path(self, json_path: str, corpus: str = "default", wait: bool = True) -> Dict[str, Any]:
         """Set the path to the legal JSON database"""
         print(f"📂 Setting JSON path: {json_path}")
         response = requests.post(
             f"{self.base_url}/set-json-path",
-            json={"json_path": json_path}
+            json={"json_path": json_path, "corpus": corpus, "wait": wait}
         )
         return self._handle_response(response)
     
+    def get_corpora(self) -> Dict[str, Any]:
+        """Version and build progress of every corpus"""
+        response = requests.get(f"{self.base_url}/corpora")
+        return self._handle_response(response)
+    
     def upload_json(self, file_path: str) -> Dict[str, Any]:
         """Upload a JSON file to the server"""
         print(f"📤 Uploading JSON file: {file_path}")
@@ -72,17 +78,40 @@ class LegalRAGClient:
         except Exception as e:
             raise Exception(f"Error uploading file: {str(e)}")
     
-    def query(self, question: str, k: int = 5) -> Dict[str, Any]:
-        """Query the legal database"""
+    def query(self, question: str, k: int = 5, corpus: str = "default", debug: bool = False) -> Dict[str, Any]:
+        """Query the legal database (debug=True adds stage timings and retrieved chunk scores)"""
         response = requests.post(
             f"{self.base_url}/query",
             json={
                 "question": question,
-                "k": k
+                "k": k,
+                "corpus": corpus,
+                "debug": debug
             }
         )
         return self._handle_response(response)
     
+    def query_stream(self, question: str, k: int = 5, corpus: str = "default"):
+        """Query the legal database and yield (event, data) pairs from the SSE stream"""
+        response = requests.post(
+            f"{self.base_url}/query/stream",
+            json={
+                "question": question,
+                "k": k,
+                "corpus": corpus
+            },
+            stream=True
+        )
+        if response.status_code != 200:
+            self._handle_response(response)
+        
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                yield event, json.loads(line[len("data: "):])
+    
     def get_system_status(self) -> Dict[str, Any]:
         """Get detailed system status"""
         print("📊 Getting system status...")
@@ -94,6 +123,16 @@ class LegalRAGClient:
         response = requests.get(f"{self.base_url}/health")
         return self._handle_response(response)
     
+    def wait_until_ready(self, timeout: float = 300, interval: float = 2) -> Dict[str, Any]:
+        """Poll /ready until the server has loaded its models (503 until then)"""
+        deadline = time.time() + timeout
+        while True:
+            response = requests.get(f"{self.base_url}/ready")
+            ready = response.json()
+            if response.status_code == 200 or ready.get("state") == "failed" or time.time() > deadline:
+                return ready
+            time.sleep(interval)
+    
     def get_server_info(self) -> Dict[str, Any]:
         """Get detailed server information"""
         print("ℹ️  Getting server info...")
@@ -143,6 +182,19 @@ def display_answer(result: Dict[str, Any]):
     if result.get('chunks_retrieved') is not None:
         print(f"📊 Chunks Retrieved: {result['chunks_retrieved']}")
     
+    if result.get('trace_id'):
+        print(f"🔎 Trace ID: {result['trace_id']}")
+    
+    debug = result.get('debug')
+    if debug:
+        timings = ", ".join(f"{stage} {ms:.1f}ms" for stage, ms in debug['timings_ms'].items())
+        print(f"⏱️  Timings: {timings}")
+        if debug.get('prompt_tokens') is not None:
+            print(f"🧮 Prompt Tokens: {debug['prompt_tokens']}")
+        for chunk in debug.get('chunks', []):
+            score_field = 'rrf_score' if 'rrf_score' in chunk else 'similarity'
+            print(f"   #{chunk['id']} {score_field} {chunk[score_field]:.4f} [{chunk['type']}] {chunk['law']}")
+    
     print("=" * 80)
 
 def main():
@@ -167,7 +219,18 @@ def main():
         print("   uvicorn combined_backend:app --reload --host 0.0.0.0 --port 3000")
         return
     
-    # 2. Get server info
+    # 2. Wait for models to load (the server is live before it is ready)
+    print("\n⏳ Waiting for the server to become ready...")
+    try:
+        ready = client.wait_until_ready()
+        if ready.get("ready"):
+            print("   ✅ Ready")
+        else:
+            print(f"   ⚠️  Not ready: {ready.get('state')} {ready.get('error') or ''}")
+    except Exception as e:
+        print(f"   ⚠️  Could not check readiness: {str(e)}")
+    
+    # 3. Get server info
     print("\nℹ️  Getting server information...")
     try:
         info = client.get_server_info()
@@ -179,7 +242,7 @@ def main():
     except Exception as e:
         print(f"   ⚠️  Could not get server info: {str(e)}")
     
-    # 3. Check status
+    # 4. Check status
     print("\n📊 Checking API status...")
     try:
         status = client.check_status()
@@ -194,7 +257,7 @@ def main():
         print(f"   ❌ Status check failed: {str(e)}")
         return
     
-    # 4. Set JSON path (or upload JSON file)
+    # 5. Set JSON path (or upload JSON file)
     if not status.get('json_loaded'):
         print_section("Loading Legal Database")
         print("Choose an option:")
@@ -229,7 +292,7 @@ def main():
     else:
         print("\n✅ Legal database already loaded!")
     
-    # 5. Show sample queries
+    # 6. Show sample queries
     print_section("Sample Queries Available")
     try:
         samples = client.get_sample_queries()
@@ -242,7 +305,7 @@ def main():
         print("   • What are the penalties under POCSO?")
         print("   • How do I file a complaint for domestic violence?")
     
-    # 6. Interactive query loop
+    # 7. Interactive query loop
     print_section("Query Mode - Ask Legal Questions")
     print("\nType 'quit', 'exit', or 'q' to exit")
     
@@ -0,0 +1,68 @@
+"""
+Shared fixtures for the backend tests: a small corpus in the real corpus
+format and a deterministic embedder, so indexes can be built without
+downloading a sentence-transformers model.
+"""
+
+import hashlib
+import json
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("faiss")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DIMENSION = 384
+
+class HashEmbedder:
+    """Bag-of-words embedder: each token maps to a fixed random vector"""
+    
+    def __init__(self, dimension: int = DIMENSION):
+        self.dimension = dimension
+        self.calls = 0
+    
+    def _token_vector(self, token: str):
+        seed = int(hashlib.sha1(token.encode('utf-8')).hexdigest()[:8], 16)
+        return np.random.default_rng(seed).standard_normal(self.dimension)
+    
+    def encode(self, texts, batch_size: int = 32, show_progress_bar: bool = False, **kwargs):
+        self.calls += 1
+        vectors = np.zeros((len(texts), self.dimension), dtype='float32')
+        for row, text in enumerate(texts):
+            for token in text.lower().split():
+                vectors[row] += self._token_vector(token)
+        return vectors
+    
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+def make_corpus(num_laws: int = 12):
+    """Corpus JSON in the RAG_SurakshaSetu_FULL.json layout"""
+    laws = []
+    for number in range(1, num_laws + 1):
+        laws.append({
+            "law_number": number,
+            "title": f"Protection Law {number}",
+            "description": f"Law {number} protects women and children from offence type {number} in every state.",
+            "punishments": f"Imprisonment of up to {number} years and a fine for offence type {number}.",
+            "filing_process": [f"Visit police station {number}", f"Submit complaint form {number}"],
+            "who_can_file": f"Any victim of offence type {number} or a relative."
+        })
+    return {"metadata": {"source": "test fixture"}, "laws": laws}
+
+def write_corpus(path, corpus):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(corpus, f)
+    return str(path)
+
+@pytest.fixture
+def embedder():
+    return HashEmbedder()
+
+@pytest.fixture
+def corpus_path(tmp_path):
+    return write_corpus(tmp_path / "laws.json", make_corpus())
@@ -0,0 +1,45 @@
+"""Sample texts and parity report of export_onnx_embedder.py"""
+
+import json
+
+import pytest
+
+import export_onnx_embedder
+from conftest import HashEmbedder, make_corpus, write_corpus
+
+@pytest.fixture
+def queries_path(tmp_path):
+    path = tmp_path / "queries.json"
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"questions": [{"question": "What is the punishment for stalking?"},
+                                 {"question": "How do I file a complaint?"}]}, f)
+    return str(path)
+
+def test_sample_texts_reads_questions_then_law_fields(tmp_path, queries_path):
+    corpus_path = write_corpus(tmp_path / "laws.json", make_corpus(3))
+    
+    texts = export_onnx_embedder.sample_texts(corpus_path, queries_path, limit=100)
+    
+    assert texts[:2] == ["What is the punishment for stalking?", "How do I file a complaint?"]
+    # description, punishments and who_can_file of each law; filing_process is a list and skipped
+    assert len(texts) == 2 + 3 * 3
+    assert export_onnx_embedder.sample_texts(corpus_path, queries_path, limit=4) == texts[:4]
+
+def test_parity_compares_every_onnx_backend_to_torch(tmp_path, queries_path, monkeypatch):
+    corpus_path = write_corpus(tmp_path / "laws.json", make_corpus(3))
+    texts = export_onnx_embedder.sample_texts(corpus_path, queries_path, limit=100)
+    created = []
+    
+    def create_embedder(backend):
+        created.append(backend)
+        return HashEmbedder()
+    monkeypatch.setattr(export_onnx_embedder, "create_embedder", create_embedder)
+    
+    report = export_onnx_embedder.parity(texts, floor=0.98)
+    
+    assert created == list(export_onnx_embedder.EMBEDDING_BACKENDS)
+    assert report["texts"] == len(texts)
+    assert set(report["backends"]) == set(export_onnx_embedder.EMBEDDING_BACKENDS[1:])
+    for result in report["backends"].values():
+        assert result["passed"]
+        assert result["min_cosine"] == pytest.approx(1.0, abs=1e-5)
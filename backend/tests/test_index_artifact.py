@@ -0,0 +1,88 @@
+"""Persisted index artifacts: reloading from disk and incremental updates"""
+
+import json
+
+import faiss
+import numpy as np
+import pytest
+
+import combined_backend as cb
+from conftest import make_corpus, write_corpus
+
+@pytest.fixture
+def ivfpq_config(monkeypatch):
+    """IVF-PQ small enough to train on the fixture corpus"""
+    monkeypatch.setattr(cb.Config, "INDEX_TYPE", "ivfpq")
+    monkeypatch.setattr(cb.Config, "IVF_NLIST", 4)
+    monkeypatch.setattr(cb.Config, "IVF_NPROBE", 4)
+    monkeypatch.setattr(cb.Config, "PQ_M", 16)
+    monkeypatch.setattr(cb.Config, "PQ_NBITS", 4)
+    monkeypatch.setattr(cb.Config, "INDEX_CACHE_ENABLED", True)
+    monkeypatch.setattr(cb.Config, "INDEX_MMAP", True)
+
+def index_ids(faiss_index):
+    return set(faiss.vector_to_array(faiss_index.id_map).tolist())
+
+def test_ivfpq_update_after_reload_from_disk(ivfpq_config, corpus_path, embedder):
+    built = cb.ImprovedGraphRAGSystem(corpus_path, embedder, None)
+    assert cb.dense_index_type(built.faiss_index) == "ivfpq"
+    
+    reloaded = cb.ImprovedGraphRAGSystem(corpus_path, embedder, None)
+    assert reloaded.loaded_from_cache
+    assert cb.dense_index_type(reloaded.faiss_index) == "ivfpq"
+    
+    corpus = make_corpus()
+    corpus["laws"][0]["description"] = "Law 1 now also covers online harassment of women."
+    corpus["laws"].append({"law_number": 99, "title": "New Law", "description": "A newly added law on acid attacks."})
+    write_corpus(corpus_path, corpus)
+    
+    stats = reloaded.update_from_json(corpus_path)
+    
+    assert stats["embedded"] == 2
+    assert reloaded.faiss_index.ntotal == len(reloaded.chunks_with_meta)
+    assert index_ids(reloaded.faiss_index) == {c['id'] for c in reloaded.chunks_with_meta}
+    
+    edited = next(c for c in reloaded.chunks_with_meta if "online harassment" in c['text'])
+    query = reloaded._embed_texts([edited['text']])
+    _, indices = reloaded.faiss_index.search(query, 5)
+    assert edited['id'] in indices[0]
+    
+    # The updated artifact reloads cleanly as well
+    with open(corpus_path, 'r', encoding='utf-8') as f:
+        assert len(json.load(f)["laws"]) == 13
+    again = cb.ImprovedGraphRAGSystem(corpus_path, embedder, None)
+    assert again.loaded_from_cache
+    assert again.faiss_index.ntotal == reloaded.faiss_index.ntotal
+
+def test_update_rebuilds_when_index_cannot_be_copied(ivfpq_config, corpus_path, embedder, monkeypatch):
+    system = cb.ImprovedGraphRAGSystem(corpus_path, embedder, None)
+    
+    def fail(*args, **kwargs):
+        raise RuntimeError("clone not supported")
+    monkeypatch.setattr(cb, "mutable_index_copy", fail)
+    
+    corpus = make_corpus()
+    corpus["laws"][3]["punishments"] = "Life imprisonment."
+    write_corpus(corpus_path, corpus)
+    stats = system.update_from_json(corpus_path)
+    
+    assert stats["embedded"] == 1
+    assert index_ids(system.faiss_index) == {c['id'] for c in system.chunks_with_meta}
+
+def test_same_named_corpora_keep_separate_artifacts(tmp_path, embedder, monkeypatch):
+    monkeypatch.setattr(cb.Config, "INDEX_CACHE_ENABLED", True)
+    monkeypatch.setattr(cb.Config, "INDEX_CACHE_DIR", str(tmp_path / "index_cache"))
+    
+    paths = {}
+    for corpus, num_laws in (("alpha", 3), ("beta", 5)):
+        (tmp_path / "uploads" / corpus).mkdir(parents=True)
+        paths[corpus] = write_corpus(tmp_path / "uploads" / corpus / "laws.json", make_corpus(num_laws))
+    
+    built = {corpus: cb.ImprovedGraphRAGSystem(path, embedder, None) for corpus, path in paths.items()}
+    assert built["alpha"].artifact_dir != built["beta"].artifact_dir
+    
+    for corpus, path in paths.items():
+        reloaded = cb.ImprovedGraphRAGSystem(path, embedder, None)
+        assert reloaded.loaded_from_cache
+        assert reloaded.faiss_index.ntotal == len(built[corpus].chunks_with_meta)
+        assert {c['chunk_key'] for c in reloaded.chunks_with_meta} == {c['chunk_key'] for c in built[corpus].chunks_with_meta}
@@ -0,0 +1,55 @@
+"""Memory actually shared between workers that map the same index artifact"""
+
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+import combined_backend as cb
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loads the artifact in a fresh interpreter and prints the private memory it added
+MEASURE = textwrap.dedent("""
+    import sys
+    import combined_backend as cb
+    cb.Config.INDEX_MMAP = sys.argv[2] == "1"
+    cb.faiss.load_module()
+    before = cb.process_memory_mb()["rss_anon"]
+    faiss_index, chunks, manifest, bm25 = cb.read_index_artifact(sys.argv[1])
+    faiss_index.search(faiss_index.reconstruct(0).reshape(1, -1), 5)
+    print(cb.process_memory_mb()["rss_anon"] - before)
+""")
+
+pytestmark = pytest.mark.skipif(
+    not os.path.exists("/proc/self/status") or not hasattr(cb.faiss, "IO_FLAG_MMAP_IFC"),
+    reason="needs /proc memory stats and FAISS with IO_FLAG_MMAP_IFC"
+)
+
+def private_mb_after_load(artifact_dir: str, mmap: bool) -> float:
+    output = subprocess.check_output(
+        [sys.executable, "-c", MEASURE, artifact_dir, "1" if mmap else "0"], cwd=BACKEND_DIR
+    )
+    return float(output.decode().strip().splitlines()[-1])
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_mmapped_index_vectors_are_not_private_memory(tmp_path, monkeypatch, index_type):
+    monkeypatch.setattr(cb.Config, "HNSW_EF_CONSTRUCTION", 16)
+    np = cb.np
+    num_vectors, dimension = 20000, 384
+    vectors = np.random.default_rng(0).standard_normal((num_vectors, dimension)).astype('float32')
+    cb.faiss.normalize_L2(vectors)
+    faiss_index = cb.build_dense_index(vectors, np.arange(num_vectors), index_type)
+    chunks = [{"id": i, "text": "", "type": "overview"} for i in range(num_vectors)]
+    artifact_dir = str(tmp_path / "laws.json.index")
+    cb.write_index_artifact(artifact_dir, faiss_index, chunks, "hash", num_vectors)
+    vectors_mb = vectors.nbytes / (1024 * 1024)
+    
+    heap_mb = private_mb_after_load(artifact_dir, mmap=False)
+    mapped_mb = private_mb_after_load(artifact_dir, mmap=True)
+    
+    # A regular read copies every vector into the worker; a mapped one leaves them in the page cache
+    assert heap_mb > 0.8 * vectors_mb
+    assert mapped_mb < 0.1 * vectors_mb
@@ -0,0 +1,119 @@
+"""Retries, backoff and governor accounting shared by /query and /query/stream"""
+
+import asyncio
+import time
+
+import pytest
+
+import combined_backend as cb
+from conftest import HashEmbedder
+
+RATE_LIMIT = "429 RESOURCE_EXHAUSTED"
+
+class ScriptedBackend(cb.LLMBackend):
+    """Each call takes the next failure from `script`: None succeeds, "mid" fails after the first token"""
+    name = "scripted"
+    
+    def __init__(self, script, tokens=("Answer", " text")):
+        self.script = list(script)
+        self.tokens = tokens
+        self.calls = 0
+    
+    def _next(self):
+        self.calls += 1
+        return self.script.pop(0) if self.script else None
+    
+    async def generate_async(self, prompt: str) -> str:
+        failure = self._next()
+        if failure is not None:
+            raise RuntimeError(failure)
+        return "".join(self.tokens)
+    
+    async def stream_generate_async(self, prompt: str):
+        failure = self._next()
+        if failure is not None and failure != "mid":
+            raise RuntimeError(failure)
+        for i, token in enumerate(self.tokens):
+            if failure == "mid" and i == 1:
+                raise RuntimeError(RATE_LIMIT)
+            yield token
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(cb.Config, "RETRY_DELAY", 0.001)
+
+def test_rate_limits_are_retried_through_the_governor():
+    backend = ScriptedBackend([RATE_LIMIT, RATE_LIMIT, None])
+    governor = cb.LLMRateGovernor(max_concurrency=4)
+    
+    answer = asyncio.run(cb.call_llm_with_retry_async(backend, "prompt", governor=governor))
+    
+    assert answer == "Answer text"
+    assert backend.calls == 3
+    stats = governor.stats()
+    assert (stats["admitted"], stats["rate_limited"], stats["in_flight"]) == (3, 2, 0)
+
+def test_other_errors_are_returned_as_error_text():
+    answer = asyncio.run(cb.call_llm_with_retry_async(ScriptedBackend(["500 INTERNAL"]), "prompt"))
+    assert answer.startswith("Error: 500 INTERNAL")
+
+def test_retries_stop_at_the_deadline():
+    backend = ScriptedBackend([RATE_LIMIT] * 10)
+    with pytest.raises(cb.LLMOverloadedError):
+        asyncio.run(cb.call_llm_with_retry_async(backend, "prompt", deadline=time.monotonic()))
+    assert backend.calls == 1
+
+def test_streams_are_not_retried_after_the_first_token():
+    backend = ScriptedBackend(["mid"])
+    received = []
+    
+    async def consume():
+        async for text in cb.stream_llm_with_retry(lambda: backend.stream_generate_async("prompt"), "prompt"):
+            received.append(text)
+    
+    with pytest.raises(RuntimeError, match="429"):
+        asyncio.run(consume())
+    assert received == ["Answer"]
+    assert backend.calls == 1
+
+@pytest.fixture
+def system(corpus_path, monkeypatch):
+    monkeypatch.setattr(cb.Config, "INDEX_CACHE_ENABLED", False)
+    monkeypatch.setattr(cb.Config, "QUERY_BATCHING", False)
+    return cb.ImprovedGraphRAGSystem(corpus_path, HashEmbedder(), ScriptedBackend([]))
+
+def collect(system, governor, limit=None):
+    async def run():
+        events = []
+        stream = system.query_stream("What is the punishment for offence type 2?", governor=governor)
+        async for event in stream:
+            events.append(event)
+            if limit is not None and len(events) == limit:
+                await stream.aclose()
+                break
+        return events
+    return asyncio.run(run())
+
+def test_query_stream_retries_before_the_first_token(system):
+    system.llm_backend = ScriptedBackend([RATE_LIMIT, None])
+    governor = cb.LLMRateGovernor()
+    
+    events = collect(system, governor)
+    
+    assert [name for name, _ in events] == ["metadata", "token", "token", "sources"]
+    assert governor.stats()["admitted"] == 2
+
+def test_query_stream_reports_errors_after_the_first_token(system):
+    system.llm_backend = ScriptedBackend(["mid"])
+    
+    events = collect(system, cb.LLMRateGovernor())
+    
+    assert [name for name, _ in events] == ["metadata", "token", "error"]
+    assert "429" in events[-1][1]["detail"]
+
+def test_disconnected_stream_releases_its_governor_slot(system):
+    governor = cb.LLMRateGovernor()
+    
+    collect(system, governor, limit=2)
+    
+    assert governor.stats()["in_flight"] == 0
@@ -1,51 +1,775 @@
-from fastapi import FastAPI, Query
-from gnews import GNews
-
-app = FastAPI()
-
-google_news = GNews(max_results=10)
-
-
-DEFAULT_QUERIES = [
-    "Female and child assault cases",
-    "Child trafficking and exploitation",
-    "Legal cases about women's rights violations",
-    "Child labour and child protection news",
-    "Domestic abuse affecting women and children"
-]
-Category_map={
-    "trafficking":"Child trafficking and exploitation",
-    "assault":"Female and child assault cases",
-    "abuse":"Domestic abuse affecting women and children",
-    "labour":"Child labour and child protection news",
-    "rightviolations":"Legal cases about women's rights violations"
-}
-
-@app.get("/")
-def home():
-    return {"message": " api running idiot"}
-
-@app.get("/news")
-def get_news(search: str | None = Query(None),category: str | None = Query(None)) :
-    if category and category in Category_map:
-        queries=[Category_map[category]]
-    elif search : queries = [search] 
-    else:
-        queries = [DEFAULT_QUERIES]
-    all_results = []
-    for q in queries:
-        news = google_news.get_news(q)
-        for article in news:
-            data = {
-                "query": q,
-                "title": article.get("title"),
-                "description": article.get("description"),
-                "url": article.get("url"),
-                "publisher": article.get("publisher"),
-                "published_date": article.get("published date"),
-            }
-            all_results.append(data)
-    return {
-        "total_articles": len(all_results),
-        "articles": all_results
-    }
+import base64
+import gzip
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import feedparser
+import requests
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from gnews import GNews
+from gnews.utils.constants import USER_AGENT
+
+try:
+    import brotli  # optional: br responses for clients that accept them
+except ImportError:
+    brotli = None
+
+# Category queries are fetched concurrently; a query slower than
+# UPSTREAM_TIMEOUT is left out of the response instead of stalling it
+FETCH_WORKERS = int(os.getenv("NEWS_FETCH_WORKERS", "8"))
+UPSTREAM_TIMEOUT = float(os.getenv("NEWS_UPSTREAM_TIMEOUT", "8"))
+# Results are fresh for CACHE_TTL seconds, then served stale (while being
+# refreshed in the background) for up to CACHE_STALE_TTL more
+CACHE_TTL = float(os.getenv("NEWS_CACHE_TTL", "300"))
+CACHE_STALE_TTL = float(os.getenv("NEWS_CACHE_STALE_TTL", "3600"))
+CACHE_MAX_ENTRIES = int(os.getenv("NEWS_CACHE_MAX_ENTRIES", "256"))
+# Categories are re-fetched (and ingested into the store) this often, so they never go stale (0 = off)
+INGEST_INTERVAL = float(os.getenv("NEWS_INGEST_INTERVAL", os.getenv("NEWS_PREWARM_INTERVAL", "240")))
+# Article history in SQLite; category pages are served from it once it has data ("" = disabled)
+STORE_PATH = os.getenv("NEWS_STORE_PATH", "news.db")
+STORE_READ_LIMIT = int(os.getenv("NEWS_STORE_READ_LIMIT", "500"))  # newest articles per category read
+RETENTION_DAYS = float(os.getenv("NEWS_RETENTION_DAYS", "30"))
+COMPACT_INTERVAL = float(os.getenv("NEWS_COMPACT_INTERVAL", "86400"))  # seconds between retention + vacuum
+# "gnews" (Google News) or "stub" (local synthetic articles, no network)
+NEWS_FETCHER = os.getenv("NEWS_FETCHER", "gnews")
+STUB_LATENCY_MS = float(os.getenv("NEWS_STUB_LATENCY_MS", "200"))
+MAX_PAGE_SIZE = int(os.getenv("NEWS_MAX_PAGE_SIZE", "100"))
+COMPRESS_MIN_BYTES = int(os.getenv("NEWS_COMPRESS_MIN_BYTES", "1024"))  # smaller bodies aren't worth it
+GZIP_LEVEL = int(os.getenv("NEWS_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("NEWS_BROTLI_QUALITY", "5"))
+
+fetch_pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="gnews")
+
+class TimeoutGNews(GNews):
+    """
+    GNews whose feed downloads give up after UPSTREAM_TIMEOUT. GNews reads
+    feeds through feedparser/urllib without a timeout, so a fetch that
+    fetch_all had stopped waiting for kept its pool thread blocked.
+    """
+
+    def _fetch_feed(self, url):
+        response = requests.get(url, headers={"User-Agent": USER_AGENT}, proxies=self.proxy, timeout=UPSTREAM_TIMEOUT)
+        feed = feedparser.parse(response.content)
+        feed["status"] = response.status_code  # GNews checks it for 429s
+        return feed
+
+# No 429 retries: GNews would sleep in a pool thread past UPSTREAM_TIMEOUT; the cache refreshes later instead
+google_news = TimeoutGNews(max_results=10, max_retries=0)
+
+
+DEFAULT_QUERIES = [
+    "Female and child assault cases",
+    "Child trafficking and exploitation",
+    "Legal cases about women's rights violations",
+    "Child labour and child protection news",
+    "Domestic abuse affecting women and children"
+]
+Category_map={
+    "trafficking":"Child trafficking and exploitation",
+    "assault":"Female and child assault cases",
+    "abuse":"Domestic abuse affecting women and children",
+    "labour":"Child labour and child protection news",
+    "rightviolations":"Legal cases about women's rights violations"
+}
+
+def fetch_query(q):
+    news = google_news.get_news(q)
+    results = []
+    for article in news:
+        data = {
+            "query": q,
+            "title": article.get("title"),
+            "description": article.get("description"),
+            "url": article.get("url"),
+            "publisher": article.get("publisher"),
+            "published_date": article.get("published date"),
+        }
+        results.append(data)
+    return results
+
+STUB_HEADLINE_WORDS = (
+    "police", "court", "arrested", "rescued", "minors", "women", "district", "hearing", "bail", "probe",
+    "survivors", "rights", "commission", "orders", "report", "shelter", "helpline", "accused", "families",
+    "activists", "ruling", "complaint", "officials", "school", "village", "factory", "network", "charges"
+)
+
+def stub_fetch_query(q):
+    """Stand-in for Google News with the same article shape (load tests, local runs)"""
+    time.sleep(STUB_LATENCY_MS / 1000.0 * random.uniform(0.5, 1.5))
+    slug = "-".join(q.lower().split())
+    return [
+        {
+            "query": q,
+            # Distinct headlines per (query, i), so deduplication sees realistic input
+            "title": " ".join(random.Random(f"{q}/{i}").sample(STUB_HEADLINE_WORDS, 7)).capitalize(),
+            "description": f"Synthetic article {i + 1} for '{q}'.",
+            "url": f"https://news.example.com/{slug}/{i + 1}",
+            "publisher": {"href": "https://news.example.com", "title": "Example News"},
+            "published_date": time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() - i * 3600)),
+        }
+        for i in range(10)
+    ]
+
+class NewsCache:
+    """
+    Articles per normalized query, with a TTL and stale-while-revalidate:
+    a stale entry is returned immediately while one background fetch
+    refreshes it. Concurrent misses for a query share a single fetch.
+    `fetch` is the upstream call (query -> articles), so a stub can stand in.
+    """
+
+    def __init__(self, fetch, pool, ttl, stale_ttl, max_entries):
+        self.fetch = fetch
+        self.pool = pool
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (articles, fetched_at), oldest use first
+        self._inflight = {}  # key -> Future of the running fetch
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.fetch_errors = 0
+
+    @staticmethod
+    def key(q):
+        return " ".join(q.lower().split())
+
+    def get(self, q):
+        """Cached articles (fresh or stale), or None on a miss; stale ones trigger a refresh"""
+        key = self.key(q)
+        with self._lock:
+            entry = self._entries.get(key)
+            age = time.time() - entry[1] if entry is not None else None
+            if age is None or age >= self.ttl + self.stale_ttl:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if age < self.ttl:
+                self.hits += 1
+                return entry[0]
+            self.stale_hits += 1
+        self.load(q)
+        return entry[0]
+
+    def load(self, q):
+        """Start (or join) a fetch of `q`; returns its Future. The result is cached when it lands."""
+        key = self.key(q)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            future = self.pool.submit(self.fetch, q)
+            self._inflight[key] = future
+            if key in self._entries:
+                self.refreshes += 1
+        future.add_done_callback(lambda f: self._store(key, f))
+        return future
+
+    def _store(self, key, future):
+        with self._lock:
+            self._inflight.pop(key, None)
+            if future.cancelled() or future.exception() is not None:
+                self.fetch_errors += 1
+                return
+            self._entries[key] = (future.result(), time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            now = time.time()
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "stale_ttl_seconds": self.stale_ttl,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+                "refreshes": self.refreshes,
+                "fetch_errors": self.fetch_errors,
+                "inflight": len(self._inflight),
+                "entry_age_seconds": {
+                    key: round(now - fetched_at, 1) for key, (_, fetched_at) in self._entries.items()
+                }
+            }
+
+news_cache = NewsCache(
+    stub_fetch_query if NEWS_FETCHER == "stub" else fetch_query,
+    fetch_pool,
+    ttl=CACHE_TTL,
+    stale_ttl=CACHE_STALE_TTL,
+    max_entries=CACHE_MAX_ENTRIES
+)
+
+def fetch_all(queries):
+    """Serve each query from the cache, fetching misses at once; returns (article lists in query order, timed out, failed)"""
+    cached, pending = {}, []
+    for q in queries:
+        articles = news_cache.get(q)
+        if articles is not None:
+            cached[q] = articles
+        else:
+            pending.append((q, news_cache.load(q)))
+    # One deadline for all misses. Abandoned fetches still hold a pool thread until their
+    # own request times out (also UPSTREAM_TIMEOUT), so a slow upstream can delay later fetches
+    if pending:
+        wait([future for _, future in pending], timeout=UPSTREAM_TIMEOUT)
+
+    sources, timed_out, failed = [], [], []
+    futures = dict(pending)
+    for q in queries:
+        if q in cached:
+            sources.append(cached[q])
+            continue
+        future = futures[q]
+        if not future.done():
+            # Still running: it finishes in the background and lands in the cache
+            timed_out.append(q)
+        elif future.exception() is not None:
+            print(f"news fetch failed for {q!r}: {future.exception()}")
+            failed.append(q)
+        else:
+            sources.append(future.result())
+    return sources, timed_out, failed
+
+# Articles whose titles' estimated Jaccard similarity (character shingles) is at least this are one story
+DEDUP_THRESHOLD = float(os.getenv("NEWS_DEDUP_THRESHOLD", "0.6"))
+SHINGLE_SIZE = 5
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16  # LSH: titles sharing any band of 4 hashes are compared
+MERSENNE_PRIME = (1 << 61) - 1
+_minhash_rng = random.Random(1)
+MINHASH_PARAMS = [
+    (_minhash_rng.randrange(1, MERSENNE_PRIME), _minhash_rng.randrange(0, MERSENNE_PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+TRACKING_PARAMS = ("fbclid", "gclid", "ocid", "cmpid", "smid", "ref", "ref_src", "cid")
+
+def canonical_url(url):
+    """URL without tracking parameters, fragment, www. or trailing slash, so reposts compare equal"""
+    if not url:
+        return ""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    params = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+    ]
+    scheme = "https" if parts.scheme in ("http", "https") else parts.scheme
+    return urlunsplit((scheme, host, parts.path.rstrip("/") or "/", urlencode(sorted(params)), ""))
+
+def normalized_title(article):
+    """Lowercased title words without the " - Publisher" suffix Google News appends"""
+    title = article.get("title") or ""
+    publisher = (article.get("publisher") or {}).get("title")
+    if publisher and title.endswith(f" - {publisher}"):
+        title = title[:-len(publisher) - 3]
+    return " ".join(re.findall(r"\w+", title.lower()))
+
+@lru_cache(maxsize=4096)
+def title_signature(title):
+    """MinHash signature of the title's character shingles (titles repeat across requests, hence the cache)"""
+    shingles = {title[i:i + SHINGLE_SIZE] for i in range(max(1, len(title) - SHINGLE_SIZE + 1))}
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "little") for s in shingles]
+    return tuple(min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in MINHASH_PARAMS)
+
+def published_timestamp(article):
+    """`published_date` (RFC 2822, as Google News sends it) as a Unix timestamp, or None"""
+    try:
+        return parsedate_to_datetime(article.get("published_date")).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+def dedupe_articles(articles):
+    """
+    Collapse the same story from several queries or publishers: equal
+    canonical URLs or near-duplicate titles (MinHash + LSH banding) form a
+    cluster. Keeps one article per cluster (with a description, newest
+    first) and orders the result newest first. Returns (articles, collapsed).
+    """
+    parent = list(range(len(articles)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        parent[find(i)] = find(j)
+
+    by_url, buckets, signatures = {}, {}, []
+    rows = MINHASH_PERMUTATIONS // MINHASH_BANDS
+    for i, article in enumerate(articles):
+        url = canonical_url(article.get("url"))
+        if url:
+            if url in by_url:
+                union(i, by_url[url])
+            by_url.setdefault(url, i)
+        title = normalized_title(article)
+        signature = title_signature(title) if title else None
+        signatures.append(signature)
+        if signature is None:
+            continue
+        for band in range(MINHASH_BANDS):
+            key = (band, signature[band * rows:(band + 1) * rows])
+            for j in buckets.setdefault(key, []):
+                if find(i) != find(j):
+                    matches = sum(x == y for x, y in zip(signature, signatures[j]))
+                    if matches / MINHASH_PERMUTATIONS >= DEDUP_THRESHOLD:
+                        union(i, j)
+            buckets[key].append(i)
+
+    clusters = {}
+    for i in range(len(articles)):
+        clusters.setdefault(find(i), []).append(i)
+
+    results = []
+    for members in clusters.values():
+        timestamps = {i: published_timestamp(articles[i]) for i in members}
+        best = max(members, key=lambda i: (bool(articles[i].get("description")), timestamps[i] or 0.0))
+        article = dict(articles[best])
+        article["duplicates"] = len(members) - 1
+        article["also_published_by"] = sorted({
+            (articles[i].get("publisher") or {}).get("title") for i in members if i != best
+        } - {None, (article.get("publisher") or {}).get("title")})
+        article["published_ts"] = int(timestamps[best]) if timestamps[best] is not None else None
+        results.append(article)
+
+    results.sort(key=article_order)
+    return results, len(articles) - len(results)
+
+def article_order(article):
+    """Sort key: newest first (undated last), canonical URL breaking ties so cursors are stable"""
+    ts = article.get("published_ts")
+    return (ts is None, -(ts or 0), canonical_url(article.get("url")))
+
+# Deduplicated sets per combination of cached query results, reused until one of them is refreshed
+_merged = OrderedDict()
+_merged_lock = threading.Lock()
+MERGED_MAX_ENTRIES = 64
+
+def merged_articles(sources):
+    """dedupe_articles over the concatenated per-query lists, memoized on the lists' identity"""
+    key = tuple(id(articles) for articles in sources)
+    with _merged_lock:
+        entry = _merged.get(key)
+        # The entry holds the lists, so their ids can't be reused while it exists
+        if entry is not None and all(a is b for a, b in zip(entry[0], sources)):
+            _merged.move_to_end(key)
+            return entry[1], entry[2]
+    articles, collapsed = dedupe_articles([article for articles in sources for article in articles])
+    with _merged_lock:
+        _merged[key] = (tuple(sources), articles, collapsed)
+        while len(_merged) > MERGED_MAX_ENTRIES:
+            _merged.popitem(last=False)
+    return articles, collapsed
+
+class ArticleStore:
+    """
+    SQLite history of every article ingested for a category, keyed by
+    canonical URL, so articles outlive GNews' top-10 window and category
+    pages are read locally instead of from the upstream. `version` changes
+    whenever the contents do, so derived views can be memoized on it.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS articles (
+            canonical_url TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            query TEXT,
+            title TEXT,
+            description TEXT,
+            publisher TEXT,
+            published_date TEXT,
+            published_ts INTEGER,
+            first_seen INTEGER NOT NULL,
+            last_seen INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_articles_published ON articles (published_ts DESC);
+        CREATE TABLE IF NOT EXISTS article_categories (
+            category TEXT NOT NULL,
+            canonical_url TEXT NOT NULL,
+            published_ts INTEGER,
+            PRIMARY KEY (category, canonical_url)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_categories_published ON article_categories (category, published_ts DESC);
+        CREATE INDEX IF NOT EXISTS idx_categories_url ON article_categories (canonical_url);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # A database created without incremental auto-vacuum only switches on a full VACUUM
+            conn.execute("VACUUM")
+        self.version = 0
+        self.last_ingest = None
+        self.last_compaction = None
+        self.ingested = 0
+
+    def _conn(self):
+        """One connection per thread (request handlers run in a thread pool)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            # Lets compact() return freed pages to the OS; must precede WAL and the first table
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            # WAL: readers never wait for the ingester
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def has_articles(self):
+        """False when empty, e.g. once retention removed everything, so /news falls back to the upstream"""
+        return self._conn().execute("SELECT 1 FROM articles LIMIT 1").fetchone() is not None
+
+    def ingest(self, batches):
+        """Upsert {category: articles}; returns how many articles were new"""
+        now = int(time.time())
+        conn = self._conn()
+        seen = set()
+        with self._write_lock, conn:
+            before = conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+            changes = conn.total_changes
+            for category, articles in batches.items():
+                for article in articles:
+                    url = canonical_url(article.get("url"))
+                    if not url:
+                        continue
+                    ts = published_timestamp(article)
+                    ts = int(ts) if ts is not None else None
+                    seen.add(url)
+                    # Rows are only rewritten when something a reader sees changed
+                    conn.execute(
+                        """
+                        INSERT INTO articles (canonical_url, url, query, title, description, publisher,
+                                              published_date, published_ts, first_seen, last_seen)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (canonical_url) DO UPDATE SET
+                            title = excluded.title,
+                            description = COALESCE(NULLIF(excluded.description, ''), articles.description),
+                            published_date = COALESCE(excluded.published_date, articles.published_date),
+                            published_ts = COALESCE(excluded.published_ts, articles.published_ts)
+                        WHERE articles.title IS NOT excluded.title
+                            OR articles.description IS NOT COALESCE(NULLIF(excluded.description, ''), articles.description)
+                            OR articles.published_date IS NOT COALESCE(excluded.published_date, articles.published_date)
+                            OR articles.published_ts IS NOT COALESCE(excluded.published_ts, articles.published_ts)
+                        """,
+                        (url, article.get("url"), article.get("query"), article.get("title"),
+                         article.get("description"), json.dumps(article.get("publisher")),
+                         article.get("published_date"), ts, now, now)
+                    )
+                    conn.execute(
+                        """
+                        INSERT INTO article_categories (category, canonical_url, published_ts) VALUES (?, ?, ?)
+                        ON CONFLICT (category, canonical_url) DO UPDATE SET published_ts = excluded.published_ts
+                        WHERE excluded.published_ts IS NOT NULL
+                            AND excluded.published_ts IS NOT article_categories.published_ts
+                        """,
+                        (category, url, ts)
+                    )
+            added = conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0] - before
+            # Unchanged ingests keep the version, so memoized pages and their ETags stay valid
+            if conn.total_changes != changes:
+                self.version += 1
+            conn.executemany("UPDATE articles SET last_seen = ? WHERE canonical_url = ?", [(now, url) for url in seen])
+            self.last_ingest = now
+            self.ingested += added
+        return added
+
+    def articles(self, category=None, limit=500):
+        """Newest `limit` articles of a category (None = all), in the shape fetch_query returns"""
+        conn = self._conn()
+        if category is None:
+            rows = conn.execute(
+                "SELECT * FROM articles ORDER BY published_ts DESC LIMIT ?", (limit,)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                """
+                SELECT a.* FROM article_categories c JOIN articles a USING (canonical_url)
+                WHERE c.category = ? ORDER BY c.published_ts DESC LIMIT ?
+                """,
+                (category, limit)
+            ).fetchall()
+        return [
+            {
+                "query": row["query"],
+                "title": row["title"],
+                "description": row["description"],
+                "url": row["url"],
+                "publisher": json.loads(row["publisher"]) if row["publisher"] else None,
+                "published_date": row["published_date"],
+            }
+            for row in rows
+        ]
+
+    def compact(self, retention_days):
+        """Drop articles older than the retention window, then reclaim space and refresh planner stats"""
+        cutoff = int(time.time() - retention_days * 86400)
+        conn = self._conn()
+        with self._write_lock:
+            with conn:
+                deleted = conn.execute(
+                    "DELETE FROM articles WHERE COALESCE(published_ts, last_seen) < ?", (cutoff,)
+                ).rowcount
+                conn.execute(
+                    "DELETE FROM article_categories WHERE canonical_url NOT IN (SELECT canonical_url FROM articles)"
+                )
+                if deleted:
+                    self.version += 1
+            # Frees one page per step, and execute() steps only once; executescript runs it to completion
+            conn.executescript("PRAGMA incremental_vacuum;")
+            conn.execute("PRAGMA optimize")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.last_compaction = int(time.time())
+        return deleted
+
+    def stats(self):
+        conn = self._conn()
+        per_category = {
+            row["category"]: row["n"]
+            for row in conn.execute("SELECT category, COUNT(*) AS n FROM article_categories GROUP BY category")
+        }
+        return {
+            "path": self.path,
+            "articles": conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0],
+            "per_category": per_category,
+            "size_bytes": sum(
+                os.path.getsize(path) for path in (self.path, f"{self.path}-wal") if os.path.exists(path)
+            ),
+            "version": self.version,
+            "ingested": self.ingested,
+            "last_ingest": self.last_ingest,
+            "last_compaction": self.last_compaction,
+            "retention_days": RETENTION_DAYS,
+        }
+
+article_store = ArticleStore(STORE_PATH) if STORE_PATH else None
+
+def stored_articles(category):
+    """Deduplicated store contents for a category (None = all), memoized per store version"""
+    key = ("store", category, article_store.version)
+    with _merged_lock:
+        entry = _merged.get(key)
+        if entry is not None:
+            _merged.move_to_end(key)
+            return entry[1], entry[2]
+    articles, collapsed = dedupe_articles(article_store.articles(category, STORE_READ_LIMIT))
+    with _merged_lock:
+        _merged[key] = (None, articles, collapsed)
+        while len(_merged) > MERGED_MAX_ENTRIES:
+            _merged.popitem(last=False)
+    return articles, collapsed
+
+def ingest_categories():
+    """Fetch every category (through the cache, which is refreshed too) and upsert the results"""
+    futures = {category: news_cache.load(q) for category, q in Category_map.items()}
+    wait(list(futures.values()), timeout=UPSTREAM_TIMEOUT)
+    batches = {
+        category: future.result() for category, future in futures.items()
+        if future.done() and not future.cancelled() and future.exception() is None
+    }
+    if article_store is not None and batches:
+        added = article_store.ingest(batches)
+        print(f"news ingest: {added} new articles from {len(batches)} categories")
+
+def background_refresh(stop):
+    """Keep categories fresh in memory and in the store; compact the store on its own interval"""
+    last_compaction = 0.0
+    while True:
+        try:
+            ingest_categories()
+            if article_store is not None and time.monotonic() - last_compaction >= COMPACT_INTERVAL:
+                deleted = article_store.compact(RETENTION_DAYS)
+                last_compaction = time.monotonic()
+                print(f"news store compacted: {deleted} articles past retention removed")
+        except Exception as e:
+            print(f"news refresh failed: {e}")
+        if stop.wait(INGEST_INTERVAL):
+            return
+
+ARTICLE_FIELDS = (
+    "query", "title", "description", "url", "publisher", "published_date", "published_ts",
+    "duplicates", "also_published_by"
+)
+
+def parse_fields(fields):
+    """`fields=` projection as a tuple of article keys (None = all); 400 on unknown names"""
+    if not fields:
+        return None
+    names = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in ARTICLE_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)} (expected any of {', '.join(ARTICLE_FIELDS)})"
+        )
+    return names
+
+def encode_cursor(article):
+    """Opaque cursor holding the article's sort key (published_ts, canonical URL)"""
+    ts, url = article.get("published_ts"), canonical_url(article.get("url"))
+    return base64.urlsafe_b64encode(json.dumps([ts, url]).encode()).decode().rstrip("=")
+
+def paginate(articles, cursor, limit):
+    """
+    Keyset pagination over the ordered set: the cursor is the sort key of
+    the last article sent, so refreshes between pages neither repeat nor
+    skip articles that were already ordered before it.
+    """
+    start = 0
+    if cursor:
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            ts, url = json.loads(base64.urlsafe_b64decode(padded))
+            if not (ts is None or (isinstance(ts, int) and not isinstance(ts, bool))) or not isinstance(url, str):
+                raise ValueError("cursor fields have the wrong types")
+            after = article_order({"published_ts": ts, "url": url})
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        start = bisect_right([article_order(article) for article in articles], after)
+    if limit is None:
+        return articles[start:], None
+    page = articles[start:start + limit]
+    more = start + limit < len(articles)
+    return page, encode_cursor(page[-1]) if more and page else None
+
+def accepted_encodings(header):
+    """Encodings from Accept-Encoding with a non-zero q value"""
+    accepted = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name and q > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+def encoded_json(request, payload):
+    """
+    JSON response with a weak ETag of its content (304 when If-None-Match
+    matches), compressed with brotli (if installed) or gzip when the client
+    accepts it and the body is worth compressing.
+    """
+    body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode()
+    etag = f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+
+    if len(body) >= COMPRESS_MIN_BYTES:
+        accepted = accepted_encodings(request.headers.get("accept-encoding"))
+        if brotli is not None and "br" in accepted:
+            body = brotli.compress(body, quality=BROTLI_QUALITY)
+            headers["Content-Encoding"] = "br"
+        elif "gzip" in accepted:
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+            headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@asynccontextmanager
+async def lifespan(app):
+    stop = threading.Event()
+    if INGEST_INTERVAL > 0:
+        threading.Thread(target=background_refresh, args=(stop,), name="news-ingest", daemon=True).start()
+    yield
+    stop.set()
+    fetch_pool.shutdown(wait=False, cancel_futures=True)
+
+app = FastAPI(lifespan=lifespan)
+
+@app.get("/")
+def home():
+    return {"message": " api running idiot"}
+
+@app.get("/cache/stats")
+def cache_stats():
+    return news_cache.stats()
+
+@app.get("/store/stats")
+def store_stats():
+    if article_store is None:
+        return {"enabled": False}
+    return {"enabled": True, **article_store.stats()}
+
+@app.get("/news")
+def get_news(
+    request: Request,
+    search: str | None = Query(None),
+    category: str | None = Query(None),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = Query(None),
+    fields: str | None = Query(None),
+):
+    """
+    Articles newest first. With `limit`, one page plus `next_cursor` to pass
+    back as `cursor`; `fields=title,url,...` trims each article. Responses
+    carry an ETag (If-None-Match -> 304) and are gzip/brotli compressed.
+    Category and default pages come from the article store once it has
+    been ingested into; searches (and an empty store) go to the upstream.
+    """
+    if category and category in Category_map:
+        queries=[Category_map[category]]
+    elif search : queries = [search]
+    else:
+        queries = list(DEFAULT_QUERIES)
+    projection = parse_fields(fields)
+    if not search and article_store is not None and article_store.has_articles():
+        source = "store"
+        timed_out, failed = [], []
+        articles, collapsed = stored_articles(category if category in Category_map else None)
+    else:
+        source = "live"
+        sources, timed_out, failed = fetch_all(queries)
+        articles, collapsed = merged_articles(sources)
+    page, next_cursor = paginate(articles, cursor, limit)
+    if projection is not None:
+        page = [{field: article.get(field) for field in projection} for article in page]
+    return encoded_json(request, {
+        "total_articles": len(articles),
+        "duplicates_collapsed": collapsed,
+        "articles": page,
+        "next_cursor": next_cursor,
+        "source": source,
+        "partial": bool(timed_out or failed),
+        "timed_out_queries": timed_out,
+        "failed_queries": failed
+    })
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# main.py reads its configuration at import: no default store file, no network
+os.environ.setdefault("NEWS_STORE_PATH", "")
+os.environ.setdefault("NEWS_FETCHER", "stub")
+os.environ.setdefault("NEWS_STUB_LATENCY_MS", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,69 @@
+import sqlite3
+import time
+
+import main
+from main import ArticleStore
+
+def articles(q, count=10, age_days=0):
+    batch = main.stub_fetch_query(q)[:count]
+    published = time.gmtime(time.time() - age_days * 86400)
+    for article in batch:
+        article["published_date"] = time.strftime("%a, %d %b %Y %H:%M:%S GMT", published)
+    return batch
+
+def test_new_store_uses_incremental_auto_vacuum(tmp_path):
+    store = ArticleStore(str(tmp_path / "news.db"))
+    assert store._conn().execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+def test_existing_database_is_switched_to_incremental_auto_vacuum(tmp_path):
+    path = str(tmp_path / "news.db")
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(ArticleStore.SCHEMA)
+    conn.close()
+
+    store = ArticleStore(path)
+    assert store._conn().execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+def test_compaction_drops_old_articles_and_shrinks_the_file(tmp_path):
+    store = ArticleStore(str(tmp_path / "news.db"))
+    for i in range(20):
+        batch = articles(f"old story {i}", age_days=60)
+        for article in batch:
+            article["description"] = "x" * 4000
+        store.ingest({"abuse": batch})
+    store.ingest({"abuse": articles("recent story")})
+    store._conn().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    pages_before = store._conn().execute("PRAGMA page_count").fetchone()[0]
+
+    assert store.compact(retention_days=30) == 200
+
+    assert store.stats()["articles"] == 10
+    assert store._conn().execute("PRAGMA freelist_count").fetchone()[0] == 0
+    assert store._conn().execute("PRAGMA page_count").fetchone()[0] < pages_before / 4
+
+def test_store_emptied_by_retention_reports_no_articles(tmp_path):
+    store = ArticleStore(str(tmp_path / "news.db"))
+    assert not store.has_articles()
+    store.ingest({"labour": articles("child labour", age_days=60)})
+    assert store.has_articles()
+
+    store.compact(retention_days=30)
+
+    assert not store.has_articles()
+
+def test_version_only_changes_when_contents_do(tmp_path):
+    store = ArticleStore(str(tmp_path / "news.db"))
+    batch = articles("trafficking")
+    store.ingest({"trafficking": batch})
+    version = store.version
+
+    assert store.ingest({"trafficking": batch}) == 0
+    assert store.version == version
+
+    batch[0]["title"] = "Updated headline"
+    store.ingest({"trafficking": batch})
+    assert store.version == version + 1
+
+    store.ingest({"assault": batch[:1]})
+    assert store.version == version + 2
@@ -0,0 +1,31 @@
+import base64
+import json
+
+import pytest
+from fastapi import HTTPException
+
+import main
+
+def cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+def ordered(count=5):
+    batch = [{"url": f"https://example.com/{i}", "published_ts": 1000 - i} for i in range(count)]
+    return sorted(batch, key=main.article_order)
+
+def test_cursor_resumes_after_last_article():
+    batch = ordered()
+    page, next_cursor = main.paginate(batch, None, 2)
+    rest, _ = main.paginate(batch, next_cursor, None)
+    assert page + rest == batch
+
+@pytest.mark.parametrize("value", [["x", 1], [True, "u"], [1.5, "u"], [1, None], [1, 2, 3], {"a": 1}])
+def test_malformed_cursor_is_a_400(value):
+    with pytest.raises(HTTPException) as exc:
+        main.paginate(ordered(), cursor(value), 2)
+    assert exc.value.status_code == 400
+
+def test_garbage_cursor_is_a_400():
+    with pytest.raises(HTTPException) as exc:
+        main.paginate(ordered(), "not-base64!", 2)
+    assert exc.value.status_code == 400